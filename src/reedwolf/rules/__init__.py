@@ -39,7 +39,9 @@ from .components import (
     BooleanField,
     ChoiceField,
     ChoiceOption,
+    ChoicesCache,
     DataVar,
+    DataVarCache,
     EnumField,
     Field,
     FieldTypeEnum,
@@ -54,6 +56,11 @@ from .validations import (
     Unique,
     )
 
+from .unique_index import (
+    MemoryUniqueIndex,
+    SqliteUniqueIndex,
+    )
+
 from .containers import (
     Extension,
     Rules,
@@ -86,7 +93,9 @@ __all__ = [
     "BooleanField",
     "ChoiceField",
     "ChoiceOption",
+    "ChoicesCache",
     "DataVar",
+    "DataVarCache",
     "EnumField",
     "Field",
     "FieldTypeEnum",
@@ -96,6 +105,8 @@ __all__ = [
     # predefined validations
     "Cardinality",
     "Unique",
+    "MemoryUniqueIndex",
+    "SqliteUniqueIndex",
 
     # Top containers
     "Extension",
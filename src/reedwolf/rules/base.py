@@ -1,11 +1,14 @@
 # Copied and adapted from Reedwolf project (project by robert.lujo@gmail.com - git@bitbucket.org:trebor74hr/reedwolf.git)
 from __future__ import annotations
 
+import weakref
 from enum import Enum
 from collections import namedtuple
-from typing import List, Any, Dict, get_type_hints, Union, Set
+from collections.abc import Awaitable as AbcAwaitable, Coroutine as AbcCoroutine
+from typing import List, Any, Callable, Dict, Mapping, get_args, get_origin, get_type_hints, Union, Set
 from dataclasses import dataclass, is_dataclass, Field as DcField, field
 from functools import partial
+from types import MappingProxyType
 
 from .namespaces import RubberObjectBase, ModelsNS
 from .types import STANDARD_TYPE_LIST
@@ -30,6 +33,7 @@ from .expressions import (
         ValueExpression,
         Operation,
         VExpStatusEnum,
+        simplify_value_expression,
         )
 
 # ------------------------------------------------------------
@@ -68,6 +72,66 @@ def list_to_strlist(args, before, after):
 
 # ------------------------------------------------------------
 
+class ClassMetaCache:
+    """
+    Process-wide cache of values resolved per class or function (type
+    hints). Keys are weak references - entry is removed when class is
+    garbage collected. Objects which can not be weakly referenced (e.g.
+    builtins) are not cached. Values are shared by all callers - load()
+    should return read-only value (e.g. MappingProxyType).
+
+    NOTE: value which references its class (e.g. type hints of
+          self-referencing class) keeps the class alive.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.values: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self):
+        return f"ClassMetaCache({self.name}, size={len(self.values)}, hits={self.hits}, misses={self.misses})"
+    __repr__ = __str__
+
+    def get(self, key: Any, load: Callable[[], Any]) -> Any:
+        try:
+            value = self.values[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # not hashable or no weak reference support
+            self.misses += 1
+            return load()
+        else:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = load()
+        self.values[key] = value
+        return value
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"size": len(self.values), "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        self.values.clear()
+        self.hits = self.misses = 0
+
+
+TYPE_HINTS_CACHE = ClassMetaCache("type_hints")
+
+
+def get_class_meta_cache_stats() -> Dict[str, Dict[str, int]]:
+    return {cache.name: cache.get_stats() for cache in (TYPE_HINTS_CACHE,)}
+
+
+def clear_class_meta_caches():
+    TYPE_HINTS_CACHE.clear()
+
+# ------------------------------------------------------------
+
 def extract_field_meta(inspect_object: Any, var_name: Optional[str]):
     """ returns th_field, fields - if var_name is None then th_field is None
     """
@@ -124,13 +188,19 @@ def extract_is_list_is_optional_and_type(py_type_hint: Any) -> Tuple(bool, bool,
     return is_list, is_optional, inner_type
 
 
+def _read_type_hints(inspect_object: Any) -> Mapping[str, Any]:
+    # read-only - cached value is shared by all callers
+    return MappingProxyType(get_type_hints(inspect_object))
+
+
 # TODO: add proper typing
 def extract_py_type_hints(inspect_object:Any, caller_name:str, strict=True) -> Any:
     # todo: check if module variable, class, class attribute, function or method.
     # NOTE: type_hint = function.__annotations__ - will not evalate types
     # NOTE: .get("return", None) - will get return function type hint
+    # resolved type hints are cached per class / function - see TYPE_HINTS_CACHE
     try:
-        return get_type_hints(inspect_object)
+        return TYPE_HINTS_CACHE.get(inspect_object, partial(_read_type_hints, inspect_object))
     except Exception as ex:
         if strict:
             # NOTE: sometimes there is NameError because some referenced types are not available in this place???
@@ -167,6 +237,117 @@ ComponentAttribute = namedtuple('ComponentAttribute', [
     'th_field',
     ])
 
+
+class TraverseActionEnum(Enum):
+    TRAVERSE        = 1
+    SKIP            = 2
+    # attribute is not a dataclass field or has init=False
+    ERROR_NOT_FIELD = 3
+    # field type is not component, container, value expression, ...
+    ERROR_TYPE      = 4
+
+
+class TraverseKindEnum(Enum):
+    SCALAR          = 1
+    LIST            = 2
+    DICT            = 3
+    # Union of list / dict and other types (or Any) - decided per value
+    ANY             = 4
+
+# how to treat component attribute in _get_subcomponents_list(), see _get_traverse_plan()
+TraverseStep = namedtuple("TraverseStep", ["action", "th_field", "kind"])
+
+# attributes which are not traversed - not subcomponents
+TRAVERSE_SKIP_NAMES = frozenset((
+        "owner", "owner_name", "owner_container", "owner_heap",
+        "name", "label", "datatype", "components", "type", "autocomplete", 
+        "heap", 
+        # NOTE: maybe in the future will have value expressions too
+        "evaluate", "error", "description", "hint", "enum",
+        # now is evaluated from bound_model, bound_model is processed
+        "models", "py_type_hint", "type_hint_field",
+        "bound_variable",
+        ))
+
+# field type should contain one of - otherwise field should be excluded from traversing
+TRAVERSE_TYPE_NAMES = ("Component", "Container", "ValueExpression", "Validation", "BoundModel", "Operation")
+
+
+def get_traverse_kind(type_hint: Any) -> TraverseKindEnum:
+    """ how values of attribute with type_hint are traversed - items of
+        list / tuple, values of dict or value itself. Optional[] is ignored.
+    """
+    if isinstance(type_hint, str):
+        # not resolved annotation (from __future__ import annotations) -
+        # names can not be resolved in every module, top level type is checked
+        type_hint = type_hint.replace("typing.", "")
+        if type_hint.startswith("Optional[") and type_hint.endswith("]"):
+            type_hint = type_hint[len("Optional["):-1]
+        if type_hint.startswith(("List[", "Tuple[")):
+            return TraverseKindEnum.LIST
+        if type_hint.startswith("Dict["):
+            return TraverseKindEnum.DICT
+        if type_hint=="Any" or type_hint.startswith("Union[") and ("List[" in type_hint or "Dict[" in type_hint):
+            return TraverseKindEnum.ANY
+        return TraverseKindEnum.SCALAR
+
+    if type_hint is Any:
+        return TraverseKindEnum.ANY
+    origin = get_origin(type_hint)
+    if origin is Union:
+        kinds = {get_traverse_kind(arg) for arg in get_args(type_hint) if arg is not type(None)}
+        return kinds.pop() if len(kinds)==1 else TraverseKindEnum.ANY
+    if origin in (list, tuple):
+        return TraverseKindEnum.LIST
+    if origin is dict:
+        return TraverseKindEnum.DICT
+    return TraverseKindEnum.SCALAR
+
+
+def is_type_hint_accepting(type_hint: Any, klass: type) -> bool:
+    """ type_hint is klass or Union / Optional with klass as one of the
+        types, e.g. Optional[Union[ValueExpression, bool]] accepts bool,
+        List[bool] or BoolFlag do not.
+    """
+    if isinstance(type_hint, str):
+        # not resolved annotation - Union / Optional arguments are compared by name
+        type_hint = type_hint.replace("typing.", "").strip()
+        for wrapper in ("Optional[", "Union["):
+            if type_hint.startswith(wrapper) and type_hint.endswith("]"):
+                return any([is_type_hint_accepting(arg, klass)
+                            for arg in _split_type_hint_args(type_hint[len(wrapper):-1])])
+        return type_hint==klass.__name__
+
+    if type_hint is klass:
+        return True
+    if get_origin(type_hint) is Union:
+        return any([is_type_hint_accepting(arg, klass) for arg in get_args(type_hint)])
+    return False
+
+
+def _split_type_hint_args(args: str) -> List[str]:
+    " 'A, List[B, C]' -> ['A', 'List[B, C]'] - split by top level commas "
+    out, depth, start = [], 0, 0
+    for nr, char in enumerate(args):
+        if char=="[":
+            depth += 1
+        elif char=="]":
+            depth -= 1
+        elif char=="," and depth==0:
+            out.append(args[start:nr].strip())
+            start = nr + 1
+    out.append(args[start:].strip())
+    return out
+
+
+def get_value_traverse_kind(value: Any) -> TraverseKindEnum:
+    " TraverseKindEnum.ANY attributes - kind of the value "
+    if isinstance(value, (list, tuple)):
+        return TraverseKindEnum.LIST
+    if isinstance(value, dict):
+        return TraverseKindEnum.DICT
+    return TraverseKindEnum.SCALAR
+
 # ------------------------------------------------------------
 
 
@@ -248,6 +429,18 @@ class TypeHintField:
         else:
             raise RuleSetupError(owner=self, msg=f"Currently only pydantic/dataclass parent classes are supported, got: {self.parent_object} / {type(self.parent_object)}")
 
+    def __getstate__(self):
+        # dataclass Field is not picklable (metadata is mappingproxy) - stored by name
+        state = self.__dict__.copy()
+        if self.th_field is not None:
+            state["th_field"] = self.th_field.name
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if isinstance(self.th_field, str):
+            self.th_field, _ = extract_field_meta(self.parent_object, var_name=self.th_field)
+
     def is_pydantic(self):
         return self.var_type==AttributeTypeEnum.PYD_FIELD
 
@@ -273,6 +466,11 @@ class TypeHintField:
 
         # e.g. Optional[List[SomeCustomClass]] or SomeCustomClass or ...
         py_type_hint = extract_py_type_hints(function, f"Function {name}").get("return", None)
+        # async def f() -> SomeClass is annotated with awaited type, but
+        # functions returning awaitables can be annotated as
+        # Awaitable[SomeClass] / Coroutine[Any, Any, SomeClass]
+        if getattr(py_type_hint, "__origin__", None) in (AbcAwaitable, AbcCoroutine):
+            py_type_hint = py_type_hint.__args__[-1]
         if not py_type_hint:
             raise RuleSetupNameError(item=function, msg=f"Variable FUNCTION '{name}' is not valid, it has no return type hint (annotations).")
         if py_type_hint in (None.__class__,):
@@ -371,6 +569,9 @@ class SetOwnerMixin:
 
 class ComponentBase(SetOwnerMixin):
 
+    # attributes whose values are used only as bool, see _simplify_value_expression()
+    TRUTH_VALUE_ATTR_NAMES = ("available", "required", "editable", "ensure")
+
     def as_str(self):
         return "\n".join(self.to_strlist())
 
@@ -510,6 +711,10 @@ class ComponentBase(SetOwnerMixin):
         from .components import Component
 
         called = False
+        if isinstance(subcomponent, ValueExpression) \
+                and subcomponent._status==VExpStatusEnum.INITIALIZED:
+            subcomponent = self._simplify_value_expression(subcomponent_name, subcomponent)
+
         if isinstance(subcomponent, (ValueExpression, Operation)):
             # copy_to_heap=copy_to_heap, 
             if subcomponent.GetNamespace()==ModelsNS \
@@ -532,61 +737,69 @@ class ComponentBase(SetOwnerMixin):
 
     # ------------------------------------------------------------
 
+    def _simplify_value_expression(self, subcomponent_name:str, vexp:ValueExpression) -> Any:
+        """ constant folding and algebraic simplification of Operation tree,
+            when result is different, attribute is replaced with it, e.g.:
+                Field(available=F.is_active | True) -> available=True
+            Literal result is set only when attribute accepts bool,
+            otherwise root ValueExpression is kept (only nested operands
+            are simplified).
+        """
+        th_field = getattr(self, "__dataclass_fields__", {}).get(subcomponent_name)
+        if not th_field or getattr(self, subcomponent_name, None) is not vexp:
+            # item in list/dict
+            return vexp
+
+        truth_value = (subcomponent_name in self.TRUTH_VALUE_ATTR_NAMES)
+        simplified = simplify_value_expression(vexp, truth_value=truth_value)
+        if simplified is vexp:
+            return vexp
+        if not isinstance(simplified, ValueExpression) \
+                and not (isinstance(simplified, bool) and is_type_hint_accepting(th_field.type, bool)):
+            return vexp
+        setattr(self, subcomponent_name, simplified)
+        return simplified
+
+    # ------------------------------------------------------------
+
     def setup(self, heap:'VariableHeap'):
         return self._setup(heap=heap)
 
     # ------------------------------------------------------------
     def _get_subcomponents_list(self) -> List[ComponentAttribute]:
         # returns name, subcomponent
-        _, fields = extract_field_meta(self.__class__, var_name=None)
+        traverse_plan = self._get_traverse_plan()
         output = []
 
         # NOTE: with vars() not the best way, other is to put metadata in field() 
         for subcomponent_name, subcomponent in vars(self).items():
-            # Skip procesing only following
-            # TODO: do this better - check type hint (init=False) and then decide 
-            # TODO: collect names once and store it internally on class instance level? 
-            # type_hint = type_hints.get(subcomponent_name)
-            th_field = fields.get(subcomponent_name)
+            step = traverse_plan.get(subcomponent_name, None)
+            if step is None:
+                step = self._add_traverse_step(traverse_plan, subcomponent_name)
+            action, th_field, kind = step
 
-            if th_field and th_field.metadata.get("skip_traverse", False):
+            if action==TraverseActionEnum.SKIP:
                 continue
-
             if is_function(subcomponent):
                 continue
-            if (subcomponent_name in ("owner", "owner_name", "owner_container", "owner_heap",
-                                      "name", "label", "datatype", "components", "type", "autocomplete", 
-                                      "heap", 
-                                      # NOTE: maybe in the future will have value expressions too
-                                      "evaluate", "error", "description", "hint", "enum",
-                                      # now is evaluated from bound_model, bound_model is processed
-                                      "models", "py_type_hint", "type_hint_field",
-                                      "bound_variable",
-                                      ) 
-                or subcomponent_name[0]=="_"):
-                continue
-
-            if not th_field or getattr(th_field, "init", True)==False:
+            if action==TraverseActionEnum.ERROR_NOT_FIELD:
                 # warn(f"TODO: _get_subcomponents_list: {self} -> {subcomponent_name} -> {th_field}")
                 raise RuleInternalError(owner=subcomponent, msg=f"Should '{subcomponent_name}' field be excluded from processing: {th_field}")
-
-            # TODO: models should not be dict()
-            if subcomponent_name not in ("models", "dataproviders") and th_field \
-                    and "Component" not in str(th_field.type) \
-                    and "Container" not in str(th_field.type) \
-                    and "ValueExpression" not in str(th_field.type) \
-                    and "Validation" not in str(th_field.type) \
-                    and "BoundModel" not in str(th_field.type) \
-                    and "Operation" not in str(th_field.type):
+            if action==TraverseActionEnum.ERROR_TYPE:
                 raise RuleInternalError(owner=subcomponent, msg=f"Should this field be excluded from processing: {subcomponent_name}: {th_field}")
-                
 
             # if subcomponent_name=="bind" and self.__class__.__name__=="EnumField":
             #     import pdb;pdb.set_trace() 
-            if isinstance(subcomponent, (list, tuple)):
+            if kind==TraverseKindEnum.ANY:
+                kind = get_value_traverse_kind(subcomponent)
+            if subcomponent is None:
+                # Optional[List[...]] not set
+                kind = TraverseKindEnum.SCALAR
+
+            if kind==TraverseKindEnum.LIST:
                 for nr, sub_subcomponent in enumerate(subcomponent):
                     output.append(ComponentAttribute(f"{subcomponent_name}__{nr}", f"{subcomponent_name}[{nr}]", sub_subcomponent, th_field))
-            elif isinstance(subcomponent, (dict,)):
+            elif kind==TraverseKindEnum.DICT:
                 for ss_name, sub_subcomponent in subcomponent.items():
                     # NOTE: bind_to_models case - key value will be used as
                     #       variable name - should be heap unique
@@ -595,6 +808,43 @@ class ComponentBase(SetOwnerMixin):
                 output.append(ComponentAttribute(subcomponent_name, subcomponent_name, subcomponent, th_field))
         return output
 
+    @classmethod
+    def _get_traverse_plan(cls) -> Dict[str, TraverseStep]:
+        """ attribute name -> TraverseStep, stored on class level (not
+            inherited) and filled on first occurence of attribute name
+            - checks are done once per class and not per instance.
+        """
+        traverse_plan = cls.__dict__.get("_traverse_plan", None)
+        if traverse_plan is None:
+            traverse_plan = {}
+            cls._traverse_plan = traverse_plan
+        return traverse_plan
+
+    @classmethod
+    def _add_traverse_step(cls, traverse_plan: Dict[str, TraverseStep], subcomponent_name: str) -> TraverseStep:
+        _, fields = extract_field_meta(cls, var_name=None)
+        # TODO: do this better - check type hint (init=False) and then decide 
+        th_field = fields.get(subcomponent_name)
+
+        if th_field and th_field.metadata.get("skip_traverse", False):
+            action = TraverseActionEnum.SKIP
+        elif subcomponent_name in TRAVERSE_SKIP_NAMES or subcomponent_name[0]=="_":
+            action = TraverseActionEnum.SKIP
+        elif not th_field or getattr(th_field, "init", True)==False:
+            action = TraverseActionEnum.ERROR_NOT_FIELD
+        # TODO: models should not be dict()
+        elif subcomponent_name not in ("models", "dataproviders") \
+                and not any(type_name in str(th_field.type) for type_name in TRAVERSE_TYPE_NAMES):
+            action = TraverseActionEnum.ERROR_TYPE
+        else:
+            action = TraverseActionEnum.TRAVERSE
+
+        # list / dict / scalar - decided once, per instance only for Union types
+        kind = get_traverse_kind(th_field.type) if action==TraverseActionEnum.TRAVERSE else None
+        step = TraverseStep(action, th_field, kind)
+        traverse_plan[subcomponent_name] = step
+        return step
+
     # ------------------------------------------------------------
 
     def _setup(self, heap:'VariableHeap'):
@@ -0,0 +1,206 @@
+# ------------------------------------------------------------
+# RUNTIME - PARALLEL BATCH VALIDATION WITH PROCESS POOL
+# ------------------------------------------------------------
+"""
+Validation of many instances against the same Rules in process pool.
+Set-up Rules are pickled once and loaded once per worker (see
+setup_cache.dump_rules()), instances are sent in chunks.
+
+Only limited number of chunks is in progress at the time (2 per worker),
+input is consumed lazily - memory depends on chunk_size and not on input
+size. Results are streamed back - in input order or as soon as chunks
+are done.
+
+Errors are sent back from workers as ValidationFailure data without
+owner components (would pickle whole Rules for each error), owner is found
+by its path (container names and component name - names are unique only
+within container) in parent process Rules. Validated instance is not sent
+back - failure item is the parent process instance, only extension items
+are pickled. Messages are not formatted in workers.
+
+NOTE: each worker validates with copy of Rules made when validate_batch()
+      starts. Unique.Global with MemoryUniqueIndex checks items against
+      keys stored at that time - add_saved() in parent process is not seen
+      by workers (SqliteUniqueIndex reads the shared file). As with
+      validate(), keys of validated instances are not added to index, so
+      duplicates across instances (and chunks) are not reported - use
+      Unique.Global.audit() for that.
+"""
+from __future__ import annotations
+
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .exceptions import RuleError, RuleValidationValueError
+from .containers import ContainerBase, Rules
+from .evaluation import (
+        validate_instance_failures,
+        FailureCodeEnum,
+        ValidationFailure,
+        ValidationResult,
+        )
+from .setup_cache import dump_rules, load_rules
+from .utils import UNDEFINED
+
+# ------------------------------------------------------------
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# chunks in progress per worker
+CHUNKS_PER_WORKER = 2
+
+# component path - container names and component name
+OwnerPath = Tuple[str, ...]
+
+# ValidationFailure without owner component - (code, owner path, item, args),
+# item is UNDEFINED when it is validated instance
+ErrorData = Tuple[FailureCodeEnum, OwnerPath, Any, Tuple]
+
+# set-up Rules in worker process and paths of its components by id(), see _init_worker()
+_worker_rules: Optional[Rules] = None
+_worker_owner_paths: Optional[Dict[int, OwnerPath]] = None
+
+# ------------------------------------------------------------
+
+def validate_batch(rules: Rules,
+                   instances: Iterable[Any],
+                   workers: Optional[int] = None,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   ordered: bool = True,
+                   fail_fast: bool = False,
+                   failures: bool = False,
+                   ) -> Iterator[ValidationResult]:
+    """
+    Yields ValidationResult for each instance:
+        workers     - number of processes, None - number of CPUs
+        ordered     - results in input order, otherwise as chunks are
+                      done (instances within chunk are always in order)
+        fail_fast   - stop after first instance with errors, pending
+                      chunks are cancelled (python 3.9+). Which
+                      instance is first depends on ordered.
+        failures    - errors are ValidationFailure objects, not RuleError
+    """
+    if not rules.is_finished():
+        raise RuleError(owner=rules, msg="Call .setup() first")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers<1:
+        raise RuleValidationValueError(owner=rules, msg=f"workers={workers} should be at least 1.")
+    if chunk_size<1:
+        raise RuleValidationValueError(owner=rules, msg=f"chunk_size={chunk_size} should be at least 1.")
+
+    owners = _get_owners_by_path(rules)
+    chunks = _iter_chunks(instances, chunk_size)
+    max_pending = workers * CHUNKS_PER_WORKER
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(dump_rules(rules),)) as executor:
+        pending = deque()
+        # future -> (start index, instances) - instances are kept, failure
+        # item when it is validated instance
+        chunks_by_future = {}
+
+        def submit_next() -> bool:
+            chunk = next(chunks, None)
+            if chunk is None:
+                return False
+            future = executor.submit(_validate_chunk, *chunk)
+            pending.append(future)
+            chunks_by_future[future] = chunk
+            return True
+
+        while len(pending)<max_pending and submit_next():
+            pass
+
+        try:
+            while pending:
+                if ordered:
+                    future = pending.popleft()
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    future = done.pop()
+                    pending.remove(future)
+
+                start_index, chunk_instances = chunks_by_future.pop(future)
+                chunk_results = future.result()
+                submit_next()
+
+                for index, errors_data in chunk_results:
+                    instance = chunk_instances[index - start_index]
+                    errors = [_error_from_data(error_data, index, instance, owners) for error_data in errors_data]
+                    if not failures:
+                        errors = [failure.to_error() for failure in errors]
+                    yield ValidationResult(index, errors)
+                    if fail_fast and errors:
+                        return
+        finally:
+            # fail fast, closed generator or error - executor shutdown
+            # waits only for chunks already running in workers. Python 3.8
+            # has no cancel_futures and cancelled futures can hang its
+            # shutdown - pending chunks are validated then.
+            if sys.version_info>=(3, 9):
+                executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _iter_chunks(instances: Iterable[Any], chunk_size: int) -> Iterator[Tuple[int, List[Any]]]:
+    iterator = iter(instances)
+    start_index = 0
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield start_index, chunk
+        start_index += len(chunk)
+
+# ------------------------------------------------------------
+# Worker process
+# ------------------------------------------------------------
+
+def _init_worker(rules_data: bytes):
+    global _worker_rules, _worker_owner_paths
+    _worker_rules = load_rules(rules_data)
+    _worker_owner_paths = {id(owner): path for path, owner in _get_owners_by_path(_worker_rules).items()}
+
+
+def _validate_chunk(start_index: int, instances: List[Any]) -> List[Tuple[int, List[ErrorData]]]:
+    results = []
+    for index, instance in enumerate(instances, start=start_index):
+        errors = validate_instance_failures(container=_worker_rules, instance=instance)
+        results.append((index, [_error_to_data(error, instance, _worker_owner_paths) for error in errors]))
+    return results
+
+# ------------------------------------------------------------
+# Errors without owner
+# ------------------------------------------------------------
+
+def _error_to_data(failure: ValidationFailure, instance: Any, owner_paths: Dict[int, OwnerPath]) -> ErrorData:
+    item = UNDEFINED if failure.item is instance else failure.item
+    return (failure.code, owner_paths[id(failure.owner)], item, failure.args)
+
+
+def _error_from_data(error_data: ErrorData, index: int, instance: Any,
+                     owners: Dict[OwnerPath, Any]) -> ValidationFailure:
+    code, owner_path, item, args = error_data
+    return ValidationFailure(code, owners[owner_path], instance if item is UNDEFINED else item, index, args)
+
+
+def _get_owners_by_path(container: ContainerBase, path: Optional[OwnerPath] = None) -> Dict[OwnerPath, Any]:
+    """ all components of container and its extensions (incl. cardinality
+        and children validations) by path, e.g.
+        ("company_rules", "items_ext", "code")
+    """
+    if path is None:
+        path = (container.name,)
+    owners = {path: container}
+    for name, component in container.components.items():
+        if component is container:
+            continue
+        component_path = path + (name,)
+        if isinstance(component, ContainerBase):
+            owners.update(_get_owners_by_path(component, component_path))
+        else:
+            owners[component_path] = component
+    return owners
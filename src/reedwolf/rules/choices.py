@@ -0,0 +1,153 @@
+# ------------------------------------------------------------
+# CHOICE INDEX - O(1) MEMBERSHIP AND LABEL LOOKUP OF ChoiceField
+# ------------------------------------------------------------
+"""
+ChoiceField.choices can be list of str/int/ChoiceOption, function which
+returns list of model instances or ValueExpression (e.g. M.company.types).
+Instead of scanning choices for each validated value, choices are indexed
+once per choices source:
+
+    value -> ChoiceOption   membership and availability
+    value -> label          rendering
+
+Values and labels of model instances are read with choice_value /
+choice_label (This.value, This.label) - compiled to attrgetter.
+
+Index is built on first use and kept on ChoiceField until the source is
+invalidated (ChoiceField.invalidate_choices()) - or, for list and
+ValueExpression choices, until other object is used or its length is
+changed (cheap check of in place append / remove).
+
+Autocomplete (ChoiceField.get_autocomplete()) uses prefix index of the
+same ChoiceIndex - labels sorted case-insensitive, searched with bisect:
+O(log n + N) for top N matches. Memory is bounded per option - sort key is
+label prefix of at most PREFIX_KEY_LENGTH characters, options with
+available=False are not indexed. Built with choice index for list (in
+setup) and function choices (ChoiceField.autocomplete=True), on first
+autocomplete call for ValueExpression choices - shared by all callers and
+dropped with ChoiceIndex.
+"""
+from __future__ import annotations
+
+from bisect import bisect_left
+from operator import attrgetter
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from .exceptions import RuleSetupValueError
+from .expressions import ValueExpression
+from .utils import UNDEFINED
+from .components import ChoiceField, ChoiceOption
+
+DEFAULT_AUTOCOMPLETE_LIMIT = 10
+
+# max length of label prefix stored in prefix index, see ChoiceIndex.get_prefix_index()
+PREFIX_KEY_LENGTH = 32
+
+# ------------------------------------------------------------
+
+class ChoiceIndex:
+
+    def __init__(self, options: Dict[Hashable, ChoiceOption]):
+        self.options = options
+        self.labels: Dict[Hashable, Any] = {value: option.label for value, option in options.items()}
+        # (casefolded label prefixes sorted, options in the same order), see get_prefix_index()
+        self._prefix_index: Optional[Tuple[List[str], List[ChoiceOption]]] = None
+
+    def __str__(self):
+        return f"ChoiceIndex(size={len(self.options)})"
+    __repr__ = __str__
+
+    def __len__(self):
+        return len(self.options)
+
+    # NOTE: unhashable value (TypeError) can not be a choice
+
+    def __contains__(self, value: Hashable) -> bool:
+        try:
+            return value in self.options
+        except TypeError:
+            return False
+
+    def get_option(self, value: Hashable) -> Optional[ChoiceOption]:
+        try:
+            return self.options.get(value, None)
+        except TypeError:
+            return None
+
+    def get_label(self, value: Hashable, default: Any = None) -> Any:
+        try:
+            return self.labels.get(value, default)
+        except TypeError:
+            return default
+
+    def get_prefix_matches(self, prefix: str, limit: int = DEFAULT_AUTOCOMPLETE_LIMIT,
+                           is_available: Optional[Callable[[ChoiceOption], bool]] = None) -> List[ChoiceOption]:
+        """ options whose label starts with prefix (case-insensitive), in
+            label order, at most limit. is_available() is called only for
+            options with ValueExpression availability - those which are
+            not available are skipped, as are matches of prefix index key
+            only (prefix longer than PREFIX_KEY_LENGTH).
+        """
+        keys, options = self.get_prefix_index()
+        prefix = prefix.casefold()
+        key_prefix = prefix[:PREFIX_KEY_LENGTH]
+        matches = []
+        for nr in range(bisect_left(keys, key_prefix), len(keys)):
+            if len(matches)>=limit or not keys[nr].startswith(key_prefix):
+                break
+            option = options[nr]
+            if len(prefix)>PREFIX_KEY_LENGTH and not str(option.label).casefold().startswith(prefix):
+                continue
+            if option.available is not True and is_available is not None and not is_available(option):
+                continue
+            matches.append(option)
+        return matches
+
+    def get_prefix_index(self) -> Tuple[List[str], List[ChoiceOption]]:
+        # built into locals and set at once - concurrent callers can only
+        # build it twice, never see it half done
+        if self._prefix_index is None:
+            entries = sorted([(str(option.label).casefold()[:PREFIX_KEY_LENGTH], nr, option)
+                              for nr, option in enumerate(self.options.values())
+                              if option.available is not False])
+            self._prefix_index = ([key for key, _, _ in entries], [option for _, _, option in entries])
+        return self._prefix_index
+
+
+def build_choice_index(field: ChoiceField, choices: Iterable[Any], with_prefix_index: bool = False) -> ChoiceIndex:
+    """ choices - list of str/int/ChoiceOption, or model instances read
+        with field.choice_value / field.choice_label. First choice wins
+        when values repeat. with_prefix_index - autocomplete prefix index is
+        built too, see ChoiceIndex.get_prefix_index().
+    """
+    get_value = _get_attr_getter(field.choice_value)
+    get_label = _get_attr_getter(field.choice_label)
+
+    options: Dict[Hashable, ChoiceOption] = {}
+    for choice in choices:
+        if isinstance(choice, ChoiceOption):
+            option = choice
+            if isinstance(option.value, ValueExpression):
+                raise RuleSetupValueError(owner=field, msg=f"ChoiceOption value should be a plain value to be indexed, got: {option.value}")
+        elif isinstance(choice, (str, int)) and get_value is None:
+            option = ChoiceOption(value=choice, label=str(choice))
+        else:
+            if get_value is None:
+                raise RuleSetupValueError(owner=field, msg=f"Choice {choice!r} / {type(choice)} needs choice_value to be indexed.")
+            value = get_value(choice)
+            option = ChoiceOption(value=value, label=get_label(choice) if get_label else str(value))
+        try:
+            options.setdefault(option.value, option)
+        except TypeError:
+            raise RuleSetupValueError(owner=field, msg=f"Choice value {option.value!r} is not hashable and can not be indexed.")
+    index = ChoiceIndex(options)
+    if with_prefix_index:
+        index.get_prefix_index()
+    return index
+
+
+def _get_attr_getter(vexp: Optional[ValueExpression]) -> Optional[Callable[[Any], Any]]:
+    " This.value -> attrgetter('value') "
+    if vexp is None or vexp is UNDEFINED:
+        return None
+    return attrgetter(".".join([bit._node for bit in vexp.Path]))
@@ -3,7 +3,12 @@
 # ------------------------------------------------------------
 from __future__ import annotations
 
-from typing import Callable, Union, List, Optional, Dict
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Sized
+from typing import Any, Awaitable, Callable, Union, List, Optional, Dict, Hashable, Tuple
 from dataclasses import dataclass, field, InitVar, is_dataclass
 from decimal import Decimal
 from enum import Enum
@@ -11,13 +16,14 @@ from enum import Enum
 # TODO: from .types         import *
 # from .types         import (
 #         )
-from .exceptions    import RuleSetupValueError, RuleSetupError
+from .exceptions    import RuleError, RuleSetupValueError, RuleSetupError
 from .namespaces    import ModelsNS, ThisNS, FieldsNS
 from .utils         import (
         is_function, 
         is_enum, 
         is_pydantic, 
         get_available_vars_sample,
+        import_runtime_module,
         UNDEFINED,
         UndefinedType,
         )
@@ -104,20 +110,243 @@ class Component(ComponentBase):
 # ------------------------------------------------------------
 
 
+@dataclass
+class DataVarCache:
+    """
+    Cache of pure DataVar values shared across records (e.g. validation
+    of many instances with the same Rules):
+
+        ttl         - seconds the value is valid, None - never expires
+        max_size    - LRU, max number of cached keys (see DataVar.cache_key),
+                      None - unlimited
+
+    hits / misses count reads from cache / provider calls.
+    """
+    ttl:        Optional[float] = None
+    max_size:   Optional[int] = None
+    timer:      Callable[[], float] = field(default=time.monotonic, repr=False)
+
+    hits:       int = field(init=False, default=0)
+    misses:     int = field(init=False, default=0)
+    # key -> (value, expires_at)
+    _values:    OrderedDict = field(init=False, repr=False, default_factory=OrderedDict)
+
+    def __post_init__(self):
+        if self.ttl is not None and self.ttl<=0:
+            raise RuleSetupValueError(owner=self, msg=f"ttl={self.ttl} should be positive number of seconds.")
+        if self.max_size is not None and self.max_size<1:
+            raise RuleSetupValueError(owner=self, msg=f"max_size={self.max_size} should be at least 1.")
+
+    def __getstate__(self):
+        # cached values are not shipped (e.g. to process pool workers)
+        state = self.__dict__.copy()
+        state["_values"] = OrderedDict()
+        state["hits"] = state["misses"] = 0
+        return state
+
+    def get(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        " returns cached value for key or calls load() and caches its result "
+        now = self.timer() if self.ttl is not None else None
+        item = self._lookup(key, now)
+        if item is not None:
+            return item[0]
+        value = load()
+        self._put(key, value, now)
+        return value
+
+    async def get_async(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        " same as get() for coroutine function load() "
+        now = self.timer() if self.ttl is not None else None
+        item = self._lookup(key, now)
+        if item is not None:
+            return item[0]
+        value = await load()
+        self._put(key, value, now)
+        return value
+
+    def _lookup(self, key: Hashable, now: Optional[float]) -> Optional[Tuple[Any, Optional[float]]]:
+        item = self._values.get(key, None)
+        if item is not None and (item[1] is None or now<item[1]):
+            self._values.move_to_end(key)
+            self.hits += 1
+            return item
+        self.misses += 1
+        return None
+
+    def _put(self, key: Hashable, value: Any, now: Optional[float]):
+        self._values[key] = (value, now + self.ttl if now is not None else None)
+        self._values.move_to_end(key)
+        if self.max_size is not None and len(self._values)>self.max_size:
+            self._values.popitem(last=False)
+
+    def clear(self):
+        self._values.clear()
+
+
+@dataclass
+class ChoicesCache:
+    """
+    Cache of ChoiceField choices function result (indexed, see
+    choices.ChoiceIndex) shared across requests:
+
+        ttl                     - seconds the choices are fresh, None - never
+                                  expire (only ChoiceField.invalidate_choices())
+        max_size                - max number of choices kept in cache, bigger
+                                  results are used once and not cached,
+                                  None - unlimited
+        stale_while_revalidate  - expired choices are returned while new
+                                  ones are loaded in background thread - only
+                                  the first (cold) load is done in request
+
+    Background load errors are kept in last_error, stale choices are used
+    until next successful load. hits / misses / refreshes count reads from
+    cache / loads in request / loads in background.
+    """
+    ttl:                    Optional[float] = None
+    max_size:               Optional[int] = None
+    stale_while_revalidate: bool = False
+    timer:                  Callable[[], float] = field(default=time.monotonic, repr=False)
+
+    hits:       int = field(init=False, default=0)
+    misses:     int = field(init=False, default=0)
+    refreshes:  int = field(init=False, default=0)
+    last_error: Optional[Exception] = field(init=False, default=None, repr=False)
+    # (choice index, expires_at)
+    _item:      Optional[Tuple[Any, Optional[float]]] = field(init=False, default=None, repr=False)
+    # increased by clear() - background load started before is not stored
+    _generation: int = field(init=False, default=0, repr=False)
+    _refresh_thread: Optional[threading.Thread] = field(init=False, default=None, repr=False)
+    _lock:      threading.Lock = field(init=False, repr=False, default_factory=threading.Lock)
+
+    def __post_init__(self):
+        if self.ttl is not None and self.ttl<=0:
+            raise RuleSetupValueError(owner=self, msg=f"ttl={self.ttl} should be positive number of seconds.")
+        if self.max_size is not None and self.max_size<1:
+            raise RuleSetupValueError(owner=self, msg=f"max_size={self.max_size} should be at least 1.")
+        if self.stale_while_revalidate and self.ttl is None:
+            raise RuleSetupValueError(owner=self, msg="stale_while_revalidate needs ttl.")
+
+    def __getstate__(self):
+        # cached choices, lock and thread are not shipped (e.g. to process pool workers)
+        state = self.__dict__.copy()
+        state.update(_item=None, _refresh_thread=None, _lock=None, last_error=None,
+                     hits=0, misses=0, refreshes=0)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def get(self, load: Callable[[], Any]) -> Any:
+        """ returns cached choice index or calls load() and caches its result.
+            load() result needs len() - number of choices, see max_size.
+        """
+        item = self._item
+        if item is not None:
+            if item[1] is None or self.timer()<item[1]:
+                self.hits += 1
+                return item[0]
+            if self.stale_while_revalidate:
+                self.hits += 1
+                self._start_refresh(load)
+                return item[0]
+        self.misses += 1
+        generation = self._generation
+        value = load()
+        self._put(value, generation)
+        return value
+
+    def _put(self, value: Any, generation: int):
+        if self.max_size is not None and len(value)>self.max_size:
+            return
+        with self._lock:
+            if generation==self._generation:
+                self._item = (value, self.timer() + self.ttl if self.ttl is not None else None)
+
+    def _start_refresh(self, load: Callable[[], Any]):
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self._refresh, args=(load, self._generation),
+                                                    name="ChoicesCache-refresh", daemon=True)
+            self._refresh_thread.start()
+
+    def _refresh(self, load: Callable[[], Any], generation: int):
+        try:
+            value = load()
+        except Exception as ex:
+            self.last_error = ex
+            return
+        self.refreshes += 1
+        self.last_error = None
+        self._put(value, generation)
+
+    def wait_refresh(self, timeout: Optional[float] = None) -> bool:
+        " waits for background load in progress, False on timeout "
+        thread = self._refresh_thread
+        if thread is not None:
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._item = None
+            self._generation += 1
+
+
 @dataclass
 class DataVar(Component):
+    """
+    Value computed from ValueExpression or returned by provider function
+    (callable without arguments), available as DP.<name> and F.<name>.
+
+    Values are evaluated lazily - only when some expression reads them, at
+    most once per record. When evaluate=True the value is evaluated eagerly
+    at the start of record evaluation (e.g. provider with side effects).
+
+    pure=True marks that the value does not depend on the record, so it is
+    evaluated once and shared across records through cache (see
+    DataVarCache for ttl and LRU max_size). When cache_key is set, provider
+    is called with its value - provider(key), and the result is cached per
+    key. Provider can be coroutine function (async def), then the value is
+    available only in Rules.validate_async(), e.g.:
+
+        DataVar(name="company_limit", label="Company limit",
+                value=get_company_limit, cache_key=M.company_id,
+                pure=True, cache=DataVarCache(ttl=60, max_size=100))
+    """
     name:           str
     label:          TransMessageType
     # TODO: the type of datatype and value should match
     value:          Union[ValueExpression, Callable[[], RuleDatatype]]
     datatype:       Optional[RuleDatatype] = None # TODO: should be calculated - field(init=False)
-    evaluate:       bool = False # TODO: describe 
+    evaluate:       bool = False
+    pure:           bool = field(default=False, metadata={"skip_traverse": True})
+    cache_key:      Optional[ValueExpression] = None
+    cache:          Optional[DataVarCache] = field(default=None, repr=False, metadata={"skip_traverse": True})
 
     def __post_init__(self):
         if not (isinstance(self.value, ValueExpression) or callable(self.value)):
             raise RuleSetupValueError(owner=self, msg=f"{self.name} -> {type(self.value)}: {type(self.value)} - not ValueExpression|Callable")
+        if self.cache_key is not None:
+            if not isinstance(self.cache_key, ValueExpression):
+                raise RuleSetupValueError(owner=self, msg=f"{self.name}: cache_key should be ValueExpression, got: {self.cache_key}")
+            if isinstance(self.value, ValueExpression):
+                raise RuleSetupValueError(owner=self, msg=f"{self.name}: cache_key can be used only with provider function.")
+        if self.cache is None:
+            # counters are collected always
+            self.cache = DataVarCache()
+        elif not self.pure:
+            raise RuleSetupValueError(owner=self, msg=f"{self.name}: cache is shared across records - can be used only with pure=True.")
+        if self.cache_key is not None and not self.pure:
+            raise RuleSetupValueError(owner=self, msg=f"{self.name}: cache_key can be used only with pure=True.")
         self.init_clean_base()
 
+    def is_async(self) -> bool:
+        " provider is coroutine function - value needs to be awaited "
+        return not isinstance(self.value, ValueExpression) and inspect.iscoroutinefunction(self.value)
+
 
 @dataclass
 class Validation(Component):
@@ -301,6 +530,8 @@ class ChoiceField(Field):
     choice_value: Optional[ValueExpression] = None
     choice_label: Optional[ValueExpression] = None
     # choice_available: Optional[ValueExpression]=True # returns bool
+    # for choices function only, see ChoicesCache
+    choices_cache: Optional[ChoicesCache] = field(default=None, repr=False, metadata={"skip_traverse": True})
 
     choice_value_th_field: TypeHintField = field(init=False, default=None, repr=False)
     choice_label_th_field: TypeHintField = field(init=False, default=None, repr=False)
@@ -311,6 +542,80 @@ class ChoiceField(Field):
             raise RuleSetupValueError(owner=self, msg=f"{self.name}: {self.__class__.__name__}: argument 'choices' is required.")
         if is_enum(self.choices):
             raise RuleSetupValueError(owner=self, msg=f"{self.name}: {self.__class__.__name__}: argument 'choices' is Enum, use EnumChoices instead.")
+        if self.choices_cache is not None and not is_function(self.choices):
+            raise RuleSetupValueError(owner=self, msg=f"{self.name}: choices_cache can be used only with choices function.")
+        # choices source and its index, see get_choice_index()
+        self._choice_source: Any = UNDEFINED
+        self._choice_source_len: Optional[int] = None
+        self._choice_index: Optional['ChoiceIndex'] = None
+
+    def __getstate__(self):
+        # choice index is not stored (e.g. dump_rules()) - built again on first use
+        state = self.__dict__.copy()
+        state.update(_choice_source=UNDEFINED, _choice_source_len=None, _choice_index=None)
+        return state
+
+    def get_choice_index(self, ctx: Optional[Any] = None) -> 'ChoiceIndex':
+        """ value -> ChoiceOption / label index, built on first use and
+            reused until invalidate_choices(). List and ValueExpression
+            choices (read with ctx) are checked on each call - index is
+            built again when other object is returned or its length has
+            changed (items appended / removed in place). NOTE: items replaced
+            in place with the same length need invalidate_choices(). Function
+            choices are called only when index is (re)built. See
+            choices.ChoiceIndex.
+        """
+        build_choice_index = import_runtime_module("choices").build_choice_index
+
+        choices = self.choices
+        # autocomplete prefix index is built with index of list and function
+        # choices, for record values (ValueExpression) on first autocomplete
+        with_prefix_index = bool(self.autocomplete)
+        if isinstance(choices, ValueExpression):
+            if ctx is None:
+                raise RuleError(owner=self, msg=f"{self.name}: choices {choices} need evaluation context.")
+            source = choices.Read(ctx)
+            with_prefix_index = False
+        elif self.choices_cache is not None:
+            return self.choices_cache.get(lambda: build_choice_index(self, choices(), with_prefix_index))
+        elif is_function(choices):
+            if self._choice_index is None:
+                self._choice_index = build_choice_index(self, choices(), with_prefix_index)
+            return self._choice_index
+        else:
+            source = choices
+
+        source_len = len(source) if isinstance(source, Sized) else None
+        if self._choice_index is None or source is not self._choice_source \
+                or source_len!=self._choice_source_len:
+            self._choice_source, self._choice_source_len = source, source_len
+            self._choice_index = build_choice_index(self, source or (), with_prefix_index)
+        return self._choice_index
+
+    def invalidate_choices(self):
+        """ choices source is changed (e.g. function returns new list) -
+            index (with autocomplete prefix index) is built again on next use
+        """
+        self._choice_source, self._choice_source_len, self._choice_index = UNDEFINED, None, None
+        if self.choices_cache is not None:
+            self.choices_cache.clear()
+
+    def get_autocomplete(self, prefix: str, limit: Optional[int] = None, ctx: Optional[Any] = None) -> List['ChoiceOption']:
+        """ top limit choices whose label starts with prefix - O(log n + limit),
+            see choices.ChoiceIndex.get_prefix_matches(). Choices not
+            available are skipped, ValueExpression availability only with ctx.
+        """
+        if not self.autocomplete:
+            raise RuleError(owner=self, msg=f"{self.name}: autocomplete is not enabled.")
+        if limit is None:
+            limit = import_runtime_module("choices").DEFAULT_AUTOCOMPLETE_LIMIT
+
+        def is_available(option: ChoiceOption) -> bool:
+            if isinstance(option.available, ValueExpression):
+                return ctx is None or bool(option.available.Read(ctx))
+            return bool(option.available)
+
+        return self.get_choice_index(ctx).get_prefix_matches(prefix, limit=limit, is_available=is_available)
 
     def setup(self, heap:VariableHeap):
         super().setup(heap=heap)
@@ -375,6 +680,9 @@ class ChoiceField(Field):
             for choice in choices:
                 if not isinstance(choice, (str, int, ChoiceOption)):
                     raise RuleSetupValueError(owner=self, msg=f"{self.name}: {self.__class__.__name__}: choices has invalid choice, not one of str/int/ChoiceOption: {choice} / {type(choice)}")
+            if self.autocomplete:
+                # index with autocomplete prefix index is ready before first request
+                self.get_choice_index()
         else:
             raise RuleSetupValueError(owner=self, msg=f"{self.name}: {self.__class__.__name__}: choices has invalid value, not Union[Callable, ValueExpression, List[Union[ChoiceOption, int, str]]], got : {choices} / {type(choices)}")
 
@@ -1,6 +1,8 @@
 from typing import (
         Any, 
         Dict, 
+        Iterable,
+        Iterator,
         List, 
         Optional,
         Union,
@@ -15,6 +17,7 @@ from .types import (
 from .utils import (
         is_pydantic, 
         get_available_vars_sample,
+        import_runtime_module,
         UNDEFINED,
         UndefinedType,
         )
@@ -26,8 +29,10 @@ from .base import (
         TypeHintField,
         )
 from .exceptions import (
+        RuleError,
         RuleSetupNameError,
         RuleSetupError,
+        RuleSetupTypeError,
         RuleInternalError,
         RuleNameNotFoundError,
         )
@@ -43,6 +48,10 @@ from .namespaces import (
 from .expressions import(
         ValueExpression,
         Operation,
+        VExpStatusEnum,
+        ValueExpressionInterner,
+        setup_shared_subexpressions,
+        reorder_operands_by_cost,
         )
 from .models import (
         BoundModel,
@@ -51,6 +60,8 @@ from .models import (
 from .validations import (
         CardinalityValidation,
         ChildrenValidation,
+        Unique,
+        UniqueValidation,
         )
 from .variables import (
         Variable,
@@ -256,8 +267,95 @@ class ContainerBase(ComponentBase):
             if not component.is_finished():
                 raise RuleInternalError(owner=self, msg=f"{component} not finished")
 
+        if self.is_reorder_operands():
+            self._reorder_operands_by_cost()
+        self._setup_shared_subexpressions()
+        self._intern_value_expressions()
+
         self.heap.finish() 
 
+        self._setup_dependency_graph()
+
+    def __getstate__(self):
+        """ derived setup values - dependency graph and shared
+            subexpression slots, are not stored (e.g. dump_rules()) - made
+            again on first use, see get_dependency_graph().
+        """
+        state = self.__dict__.copy()
+        if "_dependency_graph" in state:
+            state["_dependency_graph"] = None
+        return state
+
+    def get_dependency_graph(self) -> 'DependencyGraph':
+        if not self.is_finished():
+            raise RuleError(owner=self, msg="Call .setup() first")
+        if self._dependency_graph is None:
+            # unpickled, see __getstate__()
+            self._setup_shared_subexpressions()
+            self._setup_dependency_graph()
+        return self._dependency_graph
+
+    def _setup_dependency_graph(self):
+        # checks circular dependencies too
+        self._dependency_graph = import_runtime_module("dependencies").DependencyGraph(container=self)
+
+    def is_reorder_operands(self) -> bool:
+        " option is set in top Rules only "
+        top = self
+        while top.owner not in (None, UNDEFINED):
+            top = top.owner
+        return top.reorder_operands
+
+    def _reorder_operands_by_cost(self) -> int:
+        """ cheaper operands of and/or are read first, should be called
+            before shared subexpressions are set, see expressions.reorder_operands_by_cost()
+        """
+        data_var_names = {component_name for component_name, component in self.components.items()
+                          if isinstance(component, DataVar)}
+        return sum([reorder_operands_by_cost(vexp, data_var_names)
+                    for vexp in self._get_value_expressions()])
+
+    def _setup_shared_subexpressions(self) -> int:
+        """ structurally equal subexpressions of all components will be
+            evaluated once per record, see expressions.setup_shared_subexpressions()
+        """
+        return setup_shared_subexpressions(self._get_value_expressions())
+
+    def _intern_value_expressions(self) -> ValueExpressionInterner:
+        """ structurally equal expressions of own components are replaced
+            with single (canonical) object, see expressions.ValueExpressionInterner
+        """
+        interner = ValueExpressionInterner()
+
+        def intern(value: Any) -> Any:
+            if isinstance(value, ValueExpression) and value._status!=VExpStatusEnum.INITIALIZED:
+                return interner.intern(value)
+            return value
+
+        for component in self._get_own_components():
+            for field_name in getattr(component, "__dataclass_fields__", {}):
+                value = getattr(component, field_name, None)
+                if isinstance(value, ValueExpression):
+                    setattr(component, field_name, intern(value))
+                elif isinstance(value, list):
+                    value[:] = [intern(item) for item in value]
+        return interner
+
+    def _get_own_components(self) -> List[ComponentBase]:
+        # extension - has own components, only extension itself is returned
+        return [component for component in self.components.values()
+                if component is self or not isinstance(component, ContainerBase)]
+
+    def _get_value_expressions(self) -> List[ValueExpression]:
+        " all ValueExpression attributes of own components (after setup) "
+        vexps = []
+        for component in self._get_own_components():
+            for field_name in getattr(component, "__dataclass_fields__", {}):
+                value = getattr(component, field_name, None)
+                values = value if isinstance(value, (list, tuple)) else [value]
+                vexps.extend([vexp for vexp in values if isinstance(vexp, ValueExpression)])
+        return vexps
+
     def get_bound_model_var(self) -> Variable:
         # TODO: rename this method to _get_bound_model_var
         return self.heap.get_var_by_bound_model(bound_model=self.bound_model)
@@ -271,6 +369,76 @@ class ContainerBase(ComponentBase):
         return self.components[name]
 
 
+    def validate(self, instance:Any) -> List[RuleError]:
+        """ validates bound model instance, returns list of errors - empty
+            list when everything is ok. See evaluation.validate_instance().
+        """
+        if not self.is_finished():
+            raise RuleError(owner=self, msg="Call .setup() first")
+        return import_runtime_module("evaluation").validate_instance(container=self, instance=instance)
+
+
+    def validate_failures(self, instance:Any) -> List['ValidationFailure']:
+        """ same as validate(), but errors are compact ValidationFailure
+            objects - no exceptions are created, messages are formatted
+            only when read. See evaluation.validate_instance_failures().
+        """
+        if not self.is_finished():
+            raise RuleError(owner=self, msg="Call .setup() first")
+        return import_runtime_module("evaluation").validate_instance_failures(container=self, instance=instance)
+
+
+    def iter_validate(self, instances:Iterable[Any], failures:bool=False) -> Iterator['ValidationResult']:
+        """ lazy generator - validates instances one by one (any iterable,
+            e.g. DB cursor), yields (index, errors) for each instance.
+            failures=True - errors are ValidationFailure objects.
+            See evaluation.iter_validate_instances().
+        """
+        if not self.is_finished():
+            raise RuleError(owner=self, msg="Call .setup() first")
+        return import_runtime_module("evaluation").iter_validate_instances(
+                container=self, instances=instances, failures=failures)
+
+
+    async def validate_async(self, instance:Any, max_concurrency:Optional[int]=None) -> List[RuleError]:
+        """ same as validate(), DataVar providers can be coroutine functions,
+            they are awaited concurrently - at most max_concurrency at the
+            time. See evaluation.validate_instance_async().
+        """
+        evaluation = import_runtime_module("evaluation")
+        if not self.is_finished():
+            raise RuleError(owner=self, msg="Call .setup() first")
+        if max_concurrency is None:
+            max_concurrency = evaluation.DEFAULT_MAX_CONCURRENCY
+        return await evaluation.validate_instance_async(container=self, instance=instance, max_concurrency=max_concurrency)
+
+
+    def create_reactive_evaluation(self, instance:Any) -> 'ReactiveEvaluation':
+        """ evaluates all component expressions for instance, later
+            apply_changes() re-evaluates only affected components.
+            See evaluation.ReactiveEvaluation.
+        """
+        if not self.is_finished():
+            raise RuleError(owner=self, msg="Call .setup() first")
+        return import_runtime_module("evaluation").ReactiveEvaluation(container=self, instance=instance)
+
+
+    def validate_columns(self, columns: Dict[str, Any]) -> Dict[str, Any]:
+        """ validates batch of records given as columns - numpy arrays keyed
+            by bound variable name, returns boolean mask per validation name.
+            Requires numpy. See vectorized.ColumnsEvaluator.
+        """
+        return import_runtime_module("vectorized").validate_columns(container=self, columns=columns)
+
+
+    def validate_matrix(self, instances: Iterable[Any]) -> 'ValidationMatrix':
+        """ validates instances, returns boolean matrix records x checks
+            with summary statistics instead of errors per record.
+            Requires numpy. See vectorized.ValidationMatrix.
+        """
+        return import_runtime_module("vectorized").validate_matrix(container=self, instances=instances)
+
+
     def print_components(self):
         if not hasattr(self, "components"): raise RuleError(owner=self, msg="Call .setup() first")
         for k,v in self.components.items():
@@ -289,6 +457,8 @@ class Rules(ContainerBase):
     contains        : List[Component]            = field(repr=False)
     dataproviders   : Optional[List[DataVar]]    = field(repr=False, default_factory=list)
     validations     : Optional[List[Validation]] = field(repr=False, default_factory=list)
+    # reorder and/or operands - cheaper first, see ContainerBase._reorder_operands_by_cost()
+    reorder_operands: bool                       = field(repr=False, default=False, metadata={"skip_traverse": True})
 
     # --- Evaluated later
     heap            : Optional[VariablesHeap]    = field(init=False, repr=False, default=None)
@@ -298,6 +468,26 @@ class Rules(ContainerBase):
     owner           : Union[None, UndefinedType] = field(init=False, default=UNDEFINED, repr=False)
     owner_name      : Union[str, UndefinedType]  = field(init=False, default=UNDEFINED)
 
+    def validate_batch(self, instances: Iterable[Any], workers: Optional[int]=None,
+                       chunk_size: Optional[int]=None, ordered: bool=True,
+                       fail_fast: bool=False, failures: bool=False) -> Iterator['ValidationResult']:
+        """ validates instances in process pool, yields (index, errors) for
+            each instance. See batch.validate_batch().
+        """
+        batch = import_runtime_module("batch")
+        if chunk_size is None:
+            chunk_size = batch.DEFAULT_CHUNK_SIZE
+        return batch.validate_batch(rules=self, instances=instances, workers=workers, chunk_size=chunk_size,
+                                    ordered=ordered, fail_fast=fail_fast, failures=failures)
+
+    def setup_cached(self, cache_dir: str) -> 'Rules':
+        """ same as setup(), but finished Rules object is stored to / loaded
+            from cache_dir - keyed by fingerprint of rules definition and
+            model classes. Returns finished Rules, which is not this object
+            when loaded from cache. See setup_cache.setup_rules_cached().
+        """
+        return import_runtime_module("setup_cache").setup_rules_cached(rules=self, cache_dir=cache_dir)
+
 
 # ------------------------------------------------------------
 
@@ -317,6 +507,8 @@ class Extension(ContainerBase):
     contains        : List[Component]            = field(repr=False)
     dataproviders   : Optional[List[DataVar]]    = field(repr=False, default_factory=list)
     validations     : Optional[List[Validation]] = field(repr=False, default_factory=list)
+    # validated over all children items, e.g. Unique.Children
+    children_validations: Optional[List[ChildrenValidation]] = field(repr=False, default_factory=list)
 
     # --- Evaluated later
     heap            : Optional[VariablesHeap]    = field(init=False, repr=False, default=None)
@@ -343,5 +535,12 @@ class Extension(ContainerBase):
         self.owner_heap = heap
         super().setup()
         self.cardinality.validate_setup()
+        for children_validation in self.children_validations:
+            if not isinstance(children_validation, UniqueValidation):
+                raise RuleSetupTypeError(owner=self, msg=f"Only Unique validations are supported in children_validations, got: {children_validation}")
+            children_validation.validate_setup()
+            if isinstance(children_validation, Unique.Global) and isinstance(self.bound_model, BoundModelWithHandlers):
+                # saved items are added to index
+                self.bound_model.add_save_listener(children_validation.add_saved)
 
 
@@ -0,0 +1,173 @@
+# ------------------------------------------------------------
+# DEPENDENCY GRAPH OF COMPONENTS - BUILT FROM HEAP VARIABLES
+# ------------------------------------------------------------
+"""
+Which components need to be re-evaluated when some value changes.
+
+Producers of values are Fields (value is input - from bound model) and
+DataVars (value is computed). Dependents are components whose
+ValueExpressions read producer's value - collected in setup as
+Variable.references of heap variables:
+
+    Field(bind=M.company.hours)                  producer "hours"
+    DataVar(name="max_hours", value=F.hours*2)   producer "max_hours", depends on "hours"
+    Validation(ensure=This.value<=DP.max_hours)  depends on "max_hours" and
+                                                 owner Field (This.value)
+
+Only DataVar values are computed from other values - ValueExpression
+value, or provider called with cache_key value (e.g. cache_key=F.code),
+so the evaluation order (topological) and cycles are checked over
+dependencies of DataVars.
+"""
+from __future__ import annotations
+
+from collections import deque
+from typing import Dict, List, Set, Iterable
+
+from .exceptions import (
+        RuleSetupError,
+        RuleNameNotFoundError,
+        )
+from .namespaces import ModelsNS, FieldsNS, DataProvidersNS
+from .components import DataVar, Field, Validation
+from .containers import ContainerBase
+
+# ------------------------------------------------------------
+
+class DependencyGraph:
+
+    def __init__(self, container: ContainerBase):
+        self.container = container
+        # component name -> component, only own components (not extension ones)
+        self.components = {component.name: component
+                           for component in container._get_own_components()
+                           if not isinstance(component, ContainerBase)}
+        # producer name -> names of components which read its value
+        self.dependents: Dict[str, Set[str]] = {}
+        # component name -> names of producers it reads
+        self.dependencies: Dict[str, Set[str]] = {}
+        # topological order of all components - DataVars before dependents
+        self.order: List[str] = []
+
+        self._fill_edges()
+        self._fill_order()
+
+    def __str__(self):
+        edges = sum([len(dependents) for dependents in self.dependents.values()])
+        return f"DependencyGraph({self.container.name}, nodes={len(self.components)}, edges={edges})"
+    __repr__ = __str__
+
+    # ------------------------------------------------------------
+
+    def _add_edge(self, producer_name: str, component_name: str):
+        if component_name not in self.components:
+            return
+        self.dependents.setdefault(producer_name, set()).add(component_name)
+        self.dependencies.setdefault(component_name, set()).add(producer_name)
+
+    def _fill_edges(self):
+        # model variable name -> names of fields bound to it
+        bound_fields: Dict[str, str] = {}
+        for component in self.components.values():
+            if isinstance(component, Field) and component.bound_variable:
+                bound_fields[component.bound_variable.name] = component.name
+
+        heap = self.container.heap
+        visited = set()
+        for namespace in (ModelsNS, FieldsNS, DataProvidersNS):
+            # NOTE: the same variable can be stored under more names (alias from bound_list)
+            for variable in heap.variables[namespace._name].values():
+                if id(variable) in visited or not variable.references:
+                    continue
+                visited.add(id(variable))
+
+                if namespace==ModelsNS:
+                    # M.company.address used - depends on fields bound to
+                    # company.address.* and the other way around
+                    producer_names = [field_name for var_name, field_name in bound_fields.items()
+                                      if var_name==variable.name
+                                      or var_name.startswith(variable.name + ".")
+                                      or variable.name.startswith(var_name + ".")]
+                elif isinstance(variable.data, (Field, DataVar)):
+                    producer_names = [variable.data.name]
+                else:
+                    producer_names = []
+
+                for producer_name in producer_names:
+                    for component_name in variable.references:
+                        if namespace==ModelsNS and component_name==producer_name:
+                            # Field.bind - own value
+                            continue
+                        self._add_edge(producer_name, component_name)
+
+        # Field validation reads Field value as This.value
+        for component in self.components.values():
+            if isinstance(component, Validation) and isinstance(component.owner, Field):
+                self._add_edge(component.owner.name, component.name)
+
+    def _is_computed(self, name: str) -> bool:
+        " value computed from other values - DataVar which reads some (value or cache_key) "
+        component = self.components.get(name, None)
+        return isinstance(component, DataVar) and name in self.dependencies
+
+    def _fill_order(self):
+        """ Kahn's algorithm, written order is kept when there is no
+            dependency. Only edges from computed values are considered,
+            Field values are input.
+        """
+        in_degree = {name: 0 for name in self.components}
+        for producer_name, dependents in self.dependents.items():
+            if self._is_computed(producer_name):
+                for name in dependents:
+                    in_degree[name] += 1
+
+        positions = {name: nr for nr, name in enumerate(self.components)}
+        queue = deque([name for name, degree in in_degree.items() if degree==0])
+        while queue:
+            name = queue.popleft()
+            self.order.append(name)
+            if not self._is_computed(name):
+                continue
+            for dependent in sorted(self.dependents.get(name, ()), key=positions.get):
+                in_degree[dependent] -= 1
+                if in_degree[dependent]==0:
+                    queue.append(dependent)
+
+        if len(self.order)!=len(self.components):
+            cycle = self._find_cycle([name for name, degree in in_degree.items() if degree>0])
+            raise RuleSetupError(owner=self.container, msg=f"Circular dependency found: {' -> '.join(cycle)}")
+
+    def _find_cycle(self, names: List[str]) -> List[str]:
+        # follow dependencies within unresolved names until some repeats
+        path = [names[0]]
+        while True:
+            producer_name = sorted([name for name in self.dependencies.get(path[-1], ())
+                                    if name in names and self._is_computed(name)])[0]
+            if producer_name in path:
+                return path[path.index(producer_name):] + [producer_name]
+            path.append(producer_name)
+
+    # ------------------------------------------------------------
+
+    def get_affected(self, changed_names: Iterable[str]) -> List[str]:
+        """ components that need to be re-evaluated when values of
+            changed_names change (transitively through DataVars), in
+            evaluation order
+        """
+        affected = set()
+        queue = deque()
+        for name in changed_names:
+            if name not in self.components:
+                raise RuleNameNotFoundError(owner=self.container, msg=f"Component '{name}' not found")
+            queue.append(name)
+
+        while queue:
+            name = queue.popleft()
+            for dependent in self.dependents.get(name, ()):
+                if dependent in affected:
+                    continue
+                affected.add(dependent)
+                if self._is_computed(dependent):
+                    queue.append(dependent)
+
+        return [name for name in self.order if name in affected]
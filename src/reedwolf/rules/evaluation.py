@@ -0,0 +1,606 @@
+# ------------------------------------------------------------
+# RUNTIME - EVALUATION OF RULES AGAINST MODEL INSTANCES
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import asyncio
+from collections import namedtuple
+from enum import Enum
+from functools import partial
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, FrozenSet, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+from .exceptions import (
+        RuleError,
+        RuleValidationError,
+        RuleValidationFieldError,
+        RuleValidationChoiceError,
+        RuleValidationCardinalityError,
+        RuleValidationUniqueError,
+        RuleValidationValueError,
+        )
+from .utils import UNDEFINED
+from .expressions import ValueExpression
+from .namespaces import FieldsNS, DataProvidersNS
+from .components import (
+        ChoiceField,
+        DataVar,
+        Field,
+        Section,
+        Validation,
+        _,
+        )
+from .containers import ContainerBase
+
+# ------------------------------------------------------------
+
+REQUIRED_ERROR_MSG = _("Value is required.")
+CHOICE_ERROR_MSG = _("Value is not a valid choice.")
+
+# index - position of instance in input, errors - empty list when valid
+ValidationResult = namedtuple("ValidationResult", ["index", "errors"])
+
+# max number of async provider calls awaited at the same time
+DEFAULT_MAX_CONCURRENCY = 10
+
+# ------------------------------------------------------------
+# ValidationFailure
+# ------------------------------------------------------------
+
+class FailureCodeEnum(str, Enum):
+    REQUIRED    = "required"
+    CHOICE      = "choice"
+    VALIDATION  = "validation"
+    CARDINALITY = "cardinality"
+    UNIQUE      = "unique"
+
+
+class ValidationFailure:
+    """
+    Compact validation error - no exception is created and no message is
+    formatted while validating, see validate_instance_failures(). Message
+    is formatted only when msg / full_msg is read, to_error() converts to
+    the same RuleError that validate_instance() returns.
+        code    - FailureCodeEnum
+        owner   - Field (required, choice), Validation, CardinalityValidation or
+                  UniqueValidation
+        item    - validated instance (or extension item)
+        index   - position of instance in input, None when unknown
+        args    - code specific, (error code, items count) for cardinality,
+                  (duplicate item positions,) for unique
+    """
+    __slots__ = ("code", "owner", "item", "index", "args")
+
+    ERROR_CLASSES = {
+        FailureCodeEnum.REQUIRED    : RuleValidationFieldError,
+        FailureCodeEnum.CHOICE      : RuleValidationChoiceError,
+        FailureCodeEnum.VALIDATION  : RuleValidationError,
+        FailureCodeEnum.CARDINALITY : RuleValidationCardinalityError,
+        FailureCodeEnum.UNIQUE      : RuleValidationUniqueError,
+    }
+
+    def __init__(self, code: FailureCodeEnum, owner: Any, item: Any,
+                 index: Optional[int] = None, args: Tuple = ()):
+        self.code, self.owner, self.item, self.index, self.args = code, owner, item, index, args
+
+    @property
+    def msg(self) -> str:
+        if self.code==FailureCodeEnum.REQUIRED:
+            return REQUIRED_ERROR_MSG
+        if self.code==FailureCodeEnum.CHOICE:
+            return CHOICE_ERROR_MSG
+        if self.code==FailureCodeEnum.VALIDATION:
+            return self.owner.error
+        # cardinality and unique
+        return self.owner.get_error_msg(*self.args)
+
+    @property
+    def full_msg(self) -> str:
+        return self.to_error().full_msg
+
+    def to_error(self) -> RuleError:
+        return self.ERROR_CLASSES[self.code](msg=self.msg, owner=self.owner, item=self.item)
+
+    def __str__(self):
+        return f"ValidationFailure({self.code.value}, {getattr(self.owner, 'name', None)}, index={self.index})"
+    __repr__ = __str__
+
+# ------------------------------------------------------------
+
+def read_value(value: Any, ctx: EvaluationContext) -> Any:
+    " attribute can be plain value or ValueExpression, e.g. Field.available "
+    if isinstance(value, ValueExpression):
+        return value.Read(ctx)
+    return value
+
+
+def is_value_empty(value: Any) -> bool:
+    return value is None or value is UNDEFINED or value==""
+
+
+def get_data_var_key(data_var: DataVar, ctx: Optional[EvaluationContext]) -> Hashable:
+    " cache key - value of cache_key when set "
+    if data_var.cache_key is not None:
+        return data_var.cache_key.Read(ctx)
+    return ()
+
+
+def get_data_var_value(data_var: DataVar, ctx: Optional[EvaluationContext]) -> Any:
+    """ pure DataVar values are shared across records by data_var.cache,
+        others are evaluated on each call (counted as cache miss).
+        Values of async providers are loaded before, see validate_instance_async().
+    """
+    if data_var.is_async():
+        async_values = ctx.async_values if ctx is not None else None
+        if async_values is None:
+            raise RuleError(owner=data_var, msg=f"DataVar '{data_var.name}' has async provider, use validate_async().")
+        return async_values[(id(data_var), get_data_var_key(data_var, ctx))]
+
+    # NOTE: ValueExpression is callable too - check it first
+    key = get_data_var_key(data_var, ctx)
+    if isinstance(data_var.value, ValueExpression):
+        load = partial(data_var.value.Read, ctx)
+    elif data_var.cache_key is not None:
+        load = partial(data_var.value, key)
+    else:
+        load = data_var.value
+
+    if not data_var.pure:
+        data_var.cache.misses += 1
+        return load()
+    return data_var.cache.get(key, load)
+
+
+async def get_data_var_value_async(data_var: DataVar, key: Hashable) -> Any:
+    " awaits async provider, see get_data_var_value() "
+    if data_var.cache_key is not None:
+        load = partial(data_var.value, key)
+    else:
+        load = data_var.value
+
+    if not data_var.pure:
+        data_var.cache.misses += 1
+        return await load()
+    return await data_var.cache.get_async(key, load)
+
+
+class LazyValues:
+    """ Namespace which loads missing attributes on first access with
+        load(name) - only for names given, e.g. DataVar values.
+        load() should set the attribute itself, to load it again remove
+        it from vars().
+    """
+
+    def __init__(self, load: Callable[[str], Any], lazy_names: Iterable[str]):
+        self._load = load
+        self._lazy_names = frozenset(lazy_names)
+
+    def __getattr__(self, name: str) -> Any:
+        # called only when attribute is not found
+        if name[:1]!="_" and name in self._lazy_names:
+            return self._load(name)
+        raise AttributeError(name)
+
+    def __repr__(self):
+        values = ", ".join([f"{name}={value!r}" for name, value in vars(self).items() if name[:1]!="_"])
+        return f"LazyValues({values})"
+
+# ------------------------------------------------------------
+# EvaluationContext
+# ------------------------------------------------------------
+
+class EvaluationContext:
+    """
+    Runtime values of single bound model instance, holds single attribute
+    per namespace in the form that ValueExpression.Read() expects, e.g.:
+        ctx.Models.company, ctx.Fields.name, ctx.This.value
+    """
+
+    def __init__(self, container: ContainerBase, instance: Any,
+                 async_values: Optional[Dict[Tuple[int, Hashable], Any]] = None,
+                 evaluate_eager: bool = True, index: Optional[int] = None):
+        self.container = container
+        self.instance = instance
+        # position of instance in input, see ValidationFailure.index
+        self.index = index
+        # (id(DataVar), key) -> value of async providers, see validate_instance_async()
+        self.async_values = async_values
+        # extension name -> contexts of its items, prepared before
+        # validation, see validate_instance_async()
+        self.extension_contexts: Optional[Dict[str, List[EvaluationContext]]] = None
+        # ids of Validations not checked, see validate_instance_failures()
+        self.skip_validations: FrozenSet[int] = frozenset()
+
+        # DataVar values are loaded on first read, see load_data_var_value()
+        data_var_names = [component_name for component_name, component in container.components.items()
+                          if isinstance(component, DataVar)]
+        self.Models = SimpleNamespace()
+        self.Fields = LazyValues(self.load_data_var_value, data_var_names)
+        self.DataProviders = LazyValues(self.load_data_var_value, data_var_names)
+        self.This = SimpleNamespace(value=instance)
+        self.Context = SimpleNamespace()
+        self.Utils = SimpleNamespace()
+        # values of common subexpressions, see Operation.apply_shared()
+        self.shared_values = {}
+        # variable full name -> value, see ValueExpression.Read()
+        self.var_values: Dict[str, Any] = {}
+
+        self.fill_values(evaluate_eager=evaluate_eager)
+
+    def __str__(self):
+        return f"EvaluationContext({self.container.name}, {repr(self.instance)[:50]})"
+    __repr__ = __str__
+
+    def fill_values(self, evaluate_eager: bool = True):
+        container = self.container
+
+        # main model first, dependent models are read from previous ones
+        for bound_model_name, bound_model in container.models.items():
+            if bound_model is container.bound_model:
+                value = self.instance
+            else:
+                value = read_value(bound_model.model, self)
+            setattr(self.Models, bound_model_name, value)
+
+        # Fields are bound to Models, DataVar can reference Fields and
+        # other DataVars - dependency order. Only DataVars with
+        # evaluate=True are evaluated now, others when read.
+        for component_name, component in container.components.items():
+            if isinstance(component, Field):
+                setattr(self.Fields, component_name, component.bind.Read(self))
+
+        if evaluate_eager:
+            self.evaluate_data_vars()
+
+    def evaluate_data_vars(self):
+        " DataVars with evaluate=True in dependency order - the ones not read before "
+        container = self.container
+        loaded = vars(self.DataProviders)
+        for component_name in container.get_dependency_graph().order:
+            component = container.components[component_name]
+            if isinstance(component, DataVar) and component.evaluate and component_name not in loaded:
+                self.set_data_var_value(component)
+
+    def invalidate_variable(self, var_full_name: str):
+        """ bound value is changed - removes cached values of the variable
+            and its attributes, e.g. Models.company.address ->
+            Models.company.address.street too.
+        """
+        prefix = var_full_name + "."
+        for key in [key for key in self.var_values if key==var_full_name or key.startswith(prefix)]:
+            del self.var_values[key]
+        self.shared_values.clear()
+
+    def load_data_var_value(self, data_var_name: str) -> Any:
+        " first read of DataVar value - nothing could be cached for it before "
+        value = get_data_var_value(self.container.components[data_var_name], self)
+        setattr(self.DataProviders, data_var_name, value)
+        setattr(self.Fields, data_var_name, value)
+        return value
+
+    def set_data_var_value(self, data_var: DataVar) -> Any:
+        value = get_data_var_value(data_var, self)
+        self.invalidate_variable(f"{DataProvidersNS._name}.{data_var.name}")
+        self.invalidate_variable(f"{FieldsNS._name}.{data_var.name}")
+        setattr(self.DataProviders, data_var.name, value)
+        setattr(self.Fields, data_var.name, value)
+        return value
+
+# ------------------------------------------------------------
+# Validation
+# ------------------------------------------------------------
+
+def validate_instance(container: ContainerBase, instance: Any,
+                      async_values: Optional[Dict[Tuple[int, Hashable], Any]] = None) -> List[RuleError]:
+    " errors of validate_instance_failures() as RuleError instances "
+    return [failure.to_error()
+            for failure in validate_instance_failures(container=container, instance=instance, async_values=async_values)]
+
+
+def validate_instance_failures(container: ContainerBase, instance: Any,
+                               async_values: Optional[Dict[Tuple[int, Hashable], Any]] = None,
+                               index: Optional[int] = None,
+                               skip_validations: Optional[FrozenSet[int]] = None) -> List[ValidationFailure]:
+    """
+    Walks the component tree and collects failures (not raised):
+        - components which are not available are skipped with all children
+        - required Field must not have empty value
+        - ChoiceField value must be available choice - O(1) lookup in
+          choice index, see ChoiceField.get_choice_index()
+        - Field validations are checked only for not None values,
+          This.value is the Field value then
+        - Section and container validations have This.value == instance
+        - Extension cardinality is checked and then each child instance is
+          validated recursively
+    skip_validations - ids of container Validations which are not checked,
+    e.g. evaluated over columns before, see vectorized.validate_matrix()
+    """
+    ctx = EvaluationContext(container=container, instance=instance, async_values=async_values, index=index)
+    if skip_validations:
+        ctx.skip_validations = skip_validations
+    return _validate_context(ctx)
+
+
+def _validate_context(ctx: EvaluationContext) -> List[ValidationFailure]:
+    errors = []
+    for component in ctx.container.get_children():
+        _validate_component(component, ctx, errors)
+    _validate_validations(ctx.container.validations, ctx, ctx.instance, errors)
+    return errors
+
+
+def _validate_validations(validations: List[Validation], ctx: EvaluationContext, value: Any, errors: List[ValidationFailure]):
+    if not validations:
+        return
+    ctx.This.value = value
+    for validation in validations:
+        if id(validation) in ctx.skip_validations:
+            continue
+        if read_value(validation.available, ctx) and not validation.ensure.Read(ctx):
+            errors.append(ValidationFailure(FailureCodeEnum.VALIDATION, validation, ctx.instance, ctx.index))
+
+
+def _validate_component(component: Any, ctx: EvaluationContext, errors: List[ValidationFailure]):
+    if isinstance(component, Field):
+        if not read_value(component.available, ctx):
+            return
+        value = getattr(ctx.Fields, component.name)
+        if read_value(component.required, ctx) and is_value_empty(value):
+            errors.append(ValidationFailure(FailureCodeEnum.REQUIRED, component, ctx.instance, ctx.index))
+        if isinstance(component, ChoiceField) and not is_value_empty(value):
+            option = component.get_choice_index(ctx).get_option(value)
+            if option is None or not read_value(option.available, ctx):
+                errors.append(ValidationFailure(FailureCodeEnum.CHOICE, component, ctx.instance, ctx.index))
+        if value is not None:
+            _validate_validations(component.validations, ctx, value, errors)
+        for child in component.get_children():
+            _validate_component(child, ctx, errors)
+
+    elif isinstance(component, Section):
+        if not read_value(component.available, ctx):
+            return
+        for child in component.get_children():
+            _validate_component(child, ctx, errors)
+        _validate_validations(component.validations, ctx, ctx.instance, errors)
+
+    elif isinstance(component, ContainerBase):
+        _validate_extension(component, ctx, errors)
+
+    # DataVar, BoundModel, ChildrenValidation - nothing to validate
+
+
+def _get_extension_items(extension: ContainerBase, ctx: EvaluationContext) -> Iterable[Any]:
+    " any iterable for list bound models - e.g. generator, not materialized "
+    value = extension.bound_model.model.Read(ctx)
+    if value is None:
+        return ()
+    if extension.bound_variable.data.is_list:
+        return value
+    return (value,)
+
+
+def _iter_extension_contexts(extension: ContainerBase, ctx: EvaluationContext) -> Iterator[EvaluationContext]:
+    " prepared contexts (see validate_instance_async()) or created as items are iterated "
+    if ctx.extension_contexts is not None:
+        return iter(ctx.extension_contexts[extension.name])
+    return (EvaluationContext(container=extension, instance=item, async_values=ctx.async_values, index=ctx.index)
+            for item in _get_extension_items(extension, ctx))
+
+
+def _validate_extension(extension: ContainerBase, ctx: EvaluationContext, errors: List[ValidationFailure]):
+    # items are validated as iterated and counted on the fly in single pass,
+    # unique keys are checked against set of keys seen before (and against
+    # index of stored keys for Unique.Global) - only positions of
+    # duplicates are kept. Unhashable keys (see UniqueValidation.get_key())
+    # are compared with list of previous unhashable keys. Cardinality and
+    # unique errors are reported before item errors.
+    children_errors_pos = len(errors)
+    uniques = [(validation, getattr(validation, "index", None), set(), [], [])
+               for validation in extension.children_validations]
+    items_count = 0
+    for item_ctx in _iter_extension_contexts(extension, ctx):
+        item = item_ctx.instance
+        for validation, index, seen_keys, seen_unhashable, duplicates in uniques:
+            key = validation.get_key(item)
+            if key is not UNDEFINED:
+                try:
+                    is_seen, add_seen = key in seen_keys, seen_keys.add
+                except TypeError:
+                    is_seen, add_seen = key in seen_unhashable, seen_unhashable.append
+                if is_seen or (index is not None and validation.is_stored(key, item)):
+                    duplicates.append(items_count)
+                else:
+                    add_seen(key)
+        errors.extend(_validate_context(item_ctx))
+        items_count += 1
+
+    children_errors = []
+    cardinality = extension.cardinality
+    error_code = cardinality.get_error_code(items_count)
+    if error_code is not None:
+        children_errors.append(ValidationFailure(FailureCodeEnum.CARDINALITY, cardinality, ctx.instance,
+                                                 ctx.index, (error_code, items_count)))
+    for validation, index, seen_keys, seen_unhashable, duplicates in uniques:
+        if duplicates:
+            children_errors.append(ValidationFailure(FailureCodeEnum.UNIQUE, validation, ctx.instance,
+                                                     ctx.index, (tuple(duplicates),)))
+    errors[children_errors_pos:children_errors_pos] = children_errors
+
+
+def iter_validate_instances(container: ContainerBase, instances: Iterable[Any],
+                            failures: bool = False) -> Iterator[ValidationResult]:
+    """ lazy validation of any iterable (e.g. DB cursor), yields
+        ValidationResult for each instance, nothing is materialized.
+        failures - errors are ValidationFailure instances (with index),
+                   not RuleError - see validate_instance_failures()
+    """
+    for index, instance in enumerate(instances):
+        errors = validate_instance_failures(container=container, instance=instance, index=index)
+        if not failures:
+            errors = [failure.to_error() for failure in errors]
+        yield ValidationResult(index, errors)
+
+# ------------------------------------------------------------
+# Async validation
+# ------------------------------------------------------------
+
+async def validate_instance_async(container: ContainerBase, instance: Any,
+                                  max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> List[RuleError]:
+    """
+    Same as validate_instance(), but DataVars with async providers
+    (coroutine functions) are supported. Contexts of the instance and its
+    extension items are built first (without DataVars evaluation) and
+    their async provider calls (once per DataVar and cache key) are
+    awaited concurrently, at most max_concurrency at the time. Then the
+    same contexts are evaluated and validated as usual.
+
+    NOTE: async providers are called even when they are not read later
+          (e.g. component is not available). Contexts of all extension
+          items are kept until validation.
+    """
+    if max_concurrency<1:
+        raise RuleValidationValueError(owner=container, msg=f"max_concurrency={max_concurrency} should be at least 1.")
+
+    requests: Dict[Tuple[int, Hashable], Tuple[DataVar, Hashable]] = {}
+    contexts: List[EvaluationContext] = []
+    ctx = _prepare_async_context(container, instance, requests, contexts)
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def load(data_var: DataVar, key: Hashable) -> Any:
+        async with semaphore:
+            return await get_data_var_value_async(data_var, key)
+
+    values = await asyncio.gather(*[load(data_var, key) for data_var, key in requests.values()])
+    async_values = dict(zip(requests.keys(), values))
+    for item_ctx in contexts:
+        item_ctx.async_values = async_values
+        item_ctx.evaluate_data_vars()
+    return [failure.to_error() for failure in _validate_context(ctx)]
+
+
+def _prepare_async_context(container: ContainerBase, instance: Any,
+                           requests: Dict[Tuple[int, Hashable], Tuple[DataVar, Hashable]],
+                           contexts: List[EvaluationContext]) -> EvaluationContext:
+    " context with extension contexts, recursive - contexts are collected in parent-first order "
+    # only Models and Fields values are needed for cache keys and extension items
+    ctx = EvaluationContext(container=container, instance=instance, evaluate_eager=False)
+    contexts.append(ctx)
+    for data_var in container._get_own_components():
+        if isinstance(data_var, DataVar) and data_var.is_async():
+            key = get_data_var_key(data_var, ctx)
+            requests[(id(data_var), key)] = (data_var, key)
+
+    ctx.extension_contexts = {}
+    for extension in container.components.values():
+        if isinstance(extension, ContainerBase) and extension is not container:
+            ctx.extension_contexts[extension.name] = [
+                _prepare_async_context(extension, item, requests, contexts)
+                for item in _get_extension_items(extension, ctx)]
+    return ctx
+
+# ------------------------------------------------------------
+# ReactiveEvaluation
+# ------------------------------------------------------------
+
+class ReactiveEvaluation:
+    """
+    Evaluation of single instance for interactive editing (forms). All
+    component expressions are evaluated once, then apply_changes() sets
+    new Field values and re-evaluates only components which depend on
+    them - see dependencies.DependencyGraph.
+
+    results - component name -> attribute name -> value, e.g.
+        {"address": {"available": True}, "hour_value": {"available": True, "ensure": False}}
+    """
+
+    ATTR_NAMES = {
+        Field:      ("available", "required", "editable", "default"),
+        Section:    ("available",),
+    }
+
+    def __init__(self, container: ContainerBase, instance: Any):
+        self.container = container
+        self.graph = container.get_dependency_graph()
+        self.ctx = EvaluationContext(container=container, instance=instance)
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.evaluate(self.graph.order)
+
+    def __str__(self):
+        return f"ReactiveEvaluation({self.container.name}, {repr(self.ctx.instance)[:50]})"
+    __repr__ = __str__
+
+    def apply_changes(self, changes: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """ changes - Field name -> new value, value is stored in bound
+            model instance too. Returns results of re-evaluated components.
+        """
+        for field_name, value in changes.items():
+            field = self.graph.components.get(field_name, None)
+            if not isinstance(field, Field):
+                raise RuleValidationValueError(owner=self.container, msg=f"'{field_name}' is not a Field")
+            self._set_field_value(field, value)
+        return self.evaluate(self.graph.get_affected(changes))
+
+    def evaluate(self, component_names: List[str]) -> Dict[str, Dict[str, Any]]:
+        # values are changed - shared subexpressions need to be evaluated again
+        self.ctx.shared_values.clear()
+        evaluated = {}
+        for component_name in component_names:
+            result = self._evaluate_component(self.graph.components[component_name])
+            if result is not None:
+                self.results[component_name] = evaluated[component_name] = result
+        return evaluated
+
+    def _evaluate_component(self, component: Any) -> Optional[Dict[str, Any]]:
+        ctx = self.ctx
+        if isinstance(component, DataVar):
+            return {"value": ctx.set_data_var_value(component)}
+
+        if isinstance(component, Validation):
+            if isinstance(component.owner, Field):
+                ctx.This.value = getattr(ctx.Fields, component.owner.name)
+                if ctx.This.value is None:
+                    # validations are not checked for None values
+                    return {"available": False, "ensure": None}
+            else:
+                ctx.This.value = ctx.instance
+            available = read_value(component.available, ctx)
+            return {"available": available,
+                    "ensure": component.ensure.Read(ctx) if available else None}
+
+        for component_type, attr_names in self.ATTR_NAMES.items():
+            if isinstance(component, component_type):
+                return {attr_name: read_value(getattr(component, attr_name), ctx)
+                        for attr_name in attr_names}
+        # BoundModel, ChildrenValidation, ...
+        return None
+
+    def _set_field_value(self, field: Field, value: Any):
+        ctx = self.ctx
+        # store to bound model instance, e.g. M.company.address.street -
+        # holder is found first, nothing is changed when it is missing
+        bits = [bit._node for bit in field.bind.Path]
+        if len(bits)==1:
+            # bound to model itself, e.g. M.company
+            holder, attr_name = ctx.Models, bits[0]
+        else:
+            holder, attr_name = getattr(ctx.Models, bits[0]), bits[-1]
+            for nr in range(1, len(bits)):
+                if holder is None:
+                    raise RuleValidationValueError(owner=field, msg=f"{field.name}: value can not be set, {'.'.join(bits[:nr])} is None")
+                if nr<len(bits) - 1:
+                    holder = getattr(holder, bits[nr])
+
+        ctx.invalidate_variable(f"{FieldsNS._name}.{field.name}")
+        ctx.invalidate_variable(field.bound_variable.full_name)
+        setattr(ctx.Fields, field.name, value)
+        setattr(holder, attr_name, value)
+        if len(bits)==1 and field.bind.Path[0]._node==self.container.bound_model.name:
+            ctx.instance = value
+
+        # fields bound to attributes of changed value
+        var_name = field.bound_variable.name
+        for component in self.graph.components.values():
+            if isinstance(component, Field) and component.bound_variable \
+                    and component.bound_variable.name.startswith(var_name + "."):
+                setattr(ctx.Fields, component.name, component.bind.Read(ctx))
@@ -7,8 +7,12 @@ class RuleError(Exception):
     # TODO: validate that every call is marked for translations, check in constructor or using mypy
     def __init__(self, msg:str, owner:Optional['ComponentBase'] = None, item: Optional['Item'] = None):
         self.msg, self.owner, self.item = msg, owner, item
+
+    @property
+    def full_msg(self) -> str:
+        # formatted only when needed - validation errors can be numerous
         # maybe type(item)?
-        self.full_msg = self._get_full_msg() + (f" (item={repr(item)[:50]})" if self.item else "")
+        return self._get_full_msg() + (f" (item={repr(self.item)[:50]})" if self.item else "")
 
     def _get_full_msg(self) -> str:
         return f"{self.owner.name}: {self.msg}" if self.owner and getattr(self.owner, "name", None) \
@@ -60,9 +64,15 @@ class RuleValidationFieldError(RuleError):
         " owner must be field and is required "
         super().__init__(msg=msg, owner=owner, item=item)
 
+class RuleValidationChoiceError(RuleValidationFieldError):
+    " value is not available choice of ChoiceField "
+    pass
+
 class RuleValidationValueError(RuleValidationError):
     pass
 
 class RuleValidationCardinalityError(RuleValidationError):
     pass
 
+class RuleValidationUniqueError(RuleValidationError):
+    pass
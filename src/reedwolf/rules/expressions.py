@@ -12,10 +12,16 @@ from typing import (
         Optional, 
         Union, 
         Any, 
+        Callable,
+        Set,
+        Dict,
+        Hashable,
+        Tuple,
         )
 from .exceptions import (
         RuleSetupValueError, 
         RuleSetupError, 
+        RuleValidationValueError,
         RuleSetupNameError, 
         RuleError, 
         RuleInternalError,
@@ -23,9 +29,11 @@ from .exceptions import (
         )
 from .utils import (
         composite_functions, 
+        get_none_safe_attrgetter,
+        get_none_safe_methodcaller,
         UNDEFINED,
         )
-from .namespaces import RubberObjectBase, GlobalNS, Namespace, ThisNS, UtilsNS
+from .namespaces import RubberObjectBase, GlobalNS, Namespace, ThisNS, UtilsNS, FieldsNS, DataProvidersNS
 
 # ------------------------------------------------------------
 
@@ -37,19 +45,25 @@ class VExpStatusEnum(str, Enum):
 
 # ------------------------------------------------------------
 
+# no operator, needs custom logic
+def apply_and(first, second): return bool(first) and bool(second)
+def apply_or (first, second): return bool(first) or  bool(second)
+
+
 class Operation:
 
     def __init__(self, op: str, first: Any, second: Optional[Any] = None):
         self.op, self.first, self.second = op, first, second
         self.op_function = self.OPCODE_TO_FUNCTION.get(self.op, None)
         if self.op_function is None:
-            raise RuleSetupValueError(owner=self, msg="Invalid operation code, {self.op} not one of: {', '.join(self.OP_TO_CODE.keys())}")
+            raise RuleSetupValueError(owner=self, msg=f"Invalid operation code, {self.op} not one of: {', '.join(self.OPCODE_TO_FUNCTION.keys())}")
         self._status : VExpStatusEnum = VExpStatusEnum.INITIALIZED
         self._all_ok : Optional[bool] = None
-
-    # no operator, needs custom logic
-    def apply_and(self, first, second): return bool(first) and bool(second)
-    def apply_or (self, first, second): return bool(first) or  bool(second)
+        # operand reader functions - set in Setup()
+        self._read_first : Optional[Callable[[Any], Any]] = None
+        self._read_second : Optional[Callable[[Any], Any]] = None
+        # common subexpression - see set_shared_slot()
+        self._shared_slot : Optional[int] = None
 
     # https://florian-dahlitz.de/articles/introduction-to-pythons-operator-module
     # https://docs.python.org/3/library/operator.html#mapping-operators-to-functions
@@ -75,36 +89,102 @@ class Operation:
         , "or"  : apply_or        # orig: |
     }
 
+    # NOTE: second==None is not the sign of unary operator, e.g. F.x==None
+    UNARY_OPCODES = {"not"}
+
+    # result when first operand decides - second is not read then
+    SHORT_CIRCUIT_RESULTS = {"and": False, "or": True}
+
+    def is_unary(self) -> bool:
+        return self.op in self.UNARY_OPCODES
+
+    @staticmethod
+    def get_operand_reader(operand: Any) -> Callable[[Any], Any]:
+        " returns function that reads operand value from ctx "
+        if isinstance(operand, ValueExpression):
+            return operand.Read
+        if isinstance(operand, Operation):
+            return operand.get_read_function()
+        # literal value
+        return lambda ctx: operand
+
     def Setup(self, heap: "VariableHeap", owner: Any):
         # parent:"Variable"
         assert self._status==VExpStatusEnum.INITIALIZED, self
 
         if isinstance(self.first, (ValueExpression, Operation)):
             self.first.Setup(heap, owner=owner, parent=None)
-        if self.second!=None and isinstance(self.second, (ValueExpression, Operation)):
+        if not self.is_unary() and isinstance(self.second, (ValueExpression, Operation)):
             self.second.Setup(heap, owner=owner, parent=None)
+
+        self.compile_operand_readers()
         self._status=VExpStatusEnum.OK
 
-    def apply(self, heap):
-        first  = self.first.Read(ctx)
-        if self.second!=None:
-            # binary operator
-            second = self.second.Read(ctx)
-            try:
-                res = self.op_function(first, second)
-            except Exception as ex:
-                raise RuleSetupError(owner=heap, item=self, msg=f"Apply {self.first} {self.op} {self.second} => {first} {self.op} {second} raised error: {ex}")
-        else:
+    def __getstate__(self):
+        # operand readers can be lambdas - compiled again in __setstate__,
+        # shared slot is set again by owner container, see ContainerBase.__getstate__()
+        state = self.__dict__.copy()
+        state["_read_first"] = state["_read_second"] = None
+        state["_shared_slot"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self._status==VExpStatusEnum.OK:
+            self.compile_operand_readers()
+
+    def compile_operand_readers(self):
+        self._read_first = self.get_operand_reader(self.first)
+        if not self.is_unary():
+            self._read_second = self.get_operand_reader(self.second)
+
+    def set_shared_slot(self, slot: int):
+        """ marks common subexpression - all structurally equal operations
+            get the same slot, value is evaluated once per record (ctx) and
+            shared by all of them, see apply_shared(). Readers of owners
+            need to be recompiled after.
+        """
+        self._shared_slot = slot
+
+    def get_read_function(self) -> Callable[[Any], Any]:
+        return self.apply if self._shared_slot is None else self.apply_shared
+
+    def apply_shared(self, ctx: Any) -> Any:
+        " ctx.shared_values - slot -> value, ctx without it is evaluated directly "
+        shared_values = getattr(ctx, "shared_values", None)
+        if shared_values is None:
+            return self.apply(ctx)
+        try:
+            return shared_values[self._shared_slot]
+        except KeyError:
+            value = shared_values[self._shared_slot] = self.apply(ctx)
+            return value
+
+    def apply(self, ctx: Any) -> Any:
+        first = self._read_first(ctx)
+        if self._read_second is None:
             # unary operator
             try:
-                res = self.op_function(first, second)
+                return self.op_function(first)
             except Exception as ex:
-                raise RuleSetupError(owner=heap, item=self, msg=f"Apply {self.op} {self.first} => {self.op} {first} raised error: {ex}")
-        return res
+                raise RuleValidationValueError(owner=self, msg=f"Apply {self.op} {self.first} => {self.op} {first} raised error: {ex}")
+
+        # binary operator
+        if self.op in self.SHORT_CIRCUIT_RESULTS:
+            # and/or - second is read only when first does not decide
+            result = self.SHORT_CIRCUIT_RESULTS[self.op]
+            if bool(first)==result:
+                return result
+
+        second = self._read_second(ctx)
+        try:
+            return self.op_function(first, second)
+        except Exception as ex:
+            raise RuleValidationValueError(owner=self, msg=f"Apply {self.first} {self.op} {self.second} => {first} {self.op} {second} raised error: {ex}")
 
 
     def __str__(self):
-        if self.second:
+        if not self.is_unary():
             return f"({self.first} {self.op} {self.second})"
         else:
             return f"({self.op} {self.first})"
@@ -120,7 +200,9 @@ class ValueExpression(RubberObjectBase):
     # NOTE: each item in this list should be implemented as attribute or method in this class
     # "GetVariable", 
     RESERVED_ATTR_NAMES = {"Path", "Read", "Setup", "GetNamespace",  
-                           "_var_name", "_node", "_namespace", "_name", "_func_args", "_is_top", "_read_functions", "_status"}
+                           "GetStructuralKey", "GetStructuralHash", "IsStructurallyEqual",
+                           "_var_name", "_node", "_namespace", "_name", "_func_args", "_is_top", "_read_function", "_status",
+                           "_parent", "_path", "_cache_key"}
     RESERVED_FUNCTION_NAMES = ("Value",)
     # "First", "Second", 
 
@@ -129,6 +211,7 @@ class ValueExpression(RubberObjectBase):
         node: Union[str, Operation],
         namespace: Namespace,
         Path: Optional[List[ValueExpression]] = None,
+        parent: Optional[ValueExpression] = None,
     ):
         self._status : VExpStatusEnum = VExpStatusEnum.INITIALIZED
 
@@ -144,23 +227,56 @@ class ValueExpression(RubberObjectBase):
                 raise RuleSetupValueError(owner=self, msg=f"Value expression's attribute '{self._node}' needs to be string or Operation, got: {type(self._node)}")
             self._node = node
 
-        self._is_top = Path is None
+        # NOTE: only link to parent is kept, Path is built on first access -
+        #       copying Path on each attribute hop was O(n^2)
+        if parent is None and Path:
+            parent = Path[-1]
+        self._parent = parent
+        self._path : Optional[Tuple[ValueExpression, ...]] = None
+        self._is_top = parent is None
         self._name = str(self._node)
 
-        self.Path = [] if self._is_top else Path[:]
-        self.Path.append(self)
-
         self._func_args = None
 
-        self._read_functions = UNDEFINED
+        self._read_function = UNDEFINED
         self._var_name = UNDEFINED
+        # key of the value in per-record cache (ctx.var_values), see Read()
+        self._cache_key : Optional[str] = None
+        self._all_ok : Optional[bool] = None
 
         self._reserved_function = self._name in self.RESERVED_FUNCTION_NAMES
 
 
+    @property
+    def Path(self) -> Tuple[ValueExpression, ...]:
+        """ built once by walking parent links and cached only on this node -
+            parents do not cache their (prefix) paths, so chain of n nodes
+            costs O(n) and not O(n^2) memory
+        """
+        if self._path is None:
+            bits = []
+            node = self
+            while node is not None:
+                bits.append(node)
+                node = node._parent
+            bits.reverse()
+            self._path = tuple(bits)
+        return self._path
+
     def GetNamespace(self) -> Namespace:
         return self._namespace
 
+    def GetStructuralKey(self) -> Hashable:
+        " explicit structural equality - __eq__ is used for building Operation "
+        return get_structural_key(self)
+
+    def GetStructuralHash(self) -> int:
+        return hash(get_structural_key(self))
+
+    def IsStructurallyEqual(self, other: Any) -> bool:
+        return isinstance(other, ValueExpression) \
+               and get_structural_key(self)==get_structural_key(other)
+
     # NOTE: replaced with VariableHeap.get_var_by_vexp(vexp ...)
     # def GetVariable(self, heap:'VariableHeap', strict=True) -> 'Variable':
     #     if self._var_name==UNDEFINED:
@@ -174,24 +290,13 @@ class ValueExpression(RubberObjectBase):
         owner used just for reference count.
         """
         # , copy_to_heap:Optional[CopyToHeap]=None
-        # TODO: create single function - which is composed of functions 
-        #           see: https://florian-dahlitz.de/articles/introduction-to-pythons-operator-module
-        #             callable = operator.attrgetter("last_name")           -> .last_name
-        #             callable = operator.itemgetter(1)                     -> [1]
-        #             callable = operator.methodcaller("run", "foo", bar=1) -> .run("foot", bar=1)
-        #           and this:
-        #             functools.partial(function, x=1, y=2)
-        #       https://www.geeksforgeeks.org/function-composition-in-python/
-
         from .variables import Variable
 
         if self._status!=VExpStatusEnum.INITIALIZED:
             raise RuleInternalError(owner=self, msg=f"Setup() already called (status={self._status}).")
 
-        if self._read_functions!=UNDEFINED:
-            raise RuleSetupError(owner=self, msg=f"Setup() already called (found _read_functions).")
-
-        _read_functions = []
+        if self._read_function!=UNDEFINED:
+            raise RuleSetupError(owner=self, msg=f"Setup() already called (found _read_function).")
 
         current_variable = None
         last_parent = parent
@@ -209,7 +314,6 @@ class ValueExpression(RubberObjectBase):
                 operation = bit._node
                 # one level deeper
                 operation.Setup(heap=heap, owner=owner) 
-                _read_functions.append(operation.apply)
             else:
                 # ----------------------------------------
                 # Check if Path goes to correct variable 
@@ -256,18 +360,6 @@ class ValueExpression(RubberObjectBase):
                     raise RuleSetupValueError(owner=self, msg=f"Variable '{var_name}' (owner={owner.name}) references '{current_variable.name}' is not allowed in ValueExpression due: {current_variable.deny_reason}.")
 
                 # print(f"OK: {self} -> {bit}")
-                if bit._func_args is not None:
-                    args, kwargs = bit._func_args
-                    # getter = operator.attrgetter(var_name)
-                    # def func_call(obj):
-                    #     return getter(obj)(*args, **kwargs)
-                    # -> .<var_name>(*args, **kwargs)
-                    func_call  = operator.methodcaller(var_name, *args, **kwargs)
-                    _read_functions.append(func_call)
-                    # raise NotImplementedError(f"Call to functions {bit} in {self} not implemented yet!")
-                else:
-                    getter = operator.attrgetter(var_name)
-                    _read_functions.append(getter)
 
         variable = None
 
@@ -277,7 +369,7 @@ class ValueExpression(RubberObjectBase):
         if all_ok:
             self._status = VExpStatusEnum.OK
             self._all_ok = True
-            self._read_functions = _read_functions
+            self._read_function = self._compile_read_function()
             variable = current_variable
             if not variable:
                 if self._namespace not in (GlobalNS, ThisNS, UtilsNS):
@@ -288,26 +380,100 @@ class ValueExpression(RubberObjectBase):
                 # self._all_ok = False?
                 variable.add_reference(owner.name)
                 self._var_name = variable.name
+                if not [bit for bit in self.Path if bit._func_args is not None]:
+                    # method calls can return different values - not cached
+                    self._cache_key = variable.full_name
 
         else:
             self._all_ok = False
             self._var_name = None
-            self._read_functions = None
+            # ThisNS/ContextNS variables can not be checked in setup phase
+            # (not implemented yet), but they can be read in runtime
+            self._read_function = (self._compile_read_function() 
+                                   if self._status==VExpStatusEnum.ERR_TO_IMPLEMENT 
+                                   else None)
 
         return variable
 
 
-    def Read(self, heap:'VariablesHeap', model_name:Optional[str]):
-        if not "_read_functions" in dir(self):
-            raise RuleSetupInternalError(owner=self, msg=f"Setup not done.")
-        val = UNDEFINED
-        # TODO: if self._var_name
-        for func in rself._read_functions:
-            if val is UNDEFINED:
-                val = func(heap)
+    def _compile_read_function(self) -> Callable[[Any], Any]:
+        """
+        Fuses all Path bits into single None-safe accessor function.
+        Consecutive attributes are joined into one dotted attrgetter
+        which starts from namespace values holder, e.g.:
+            M.company.address.street -> attrgetter("Models.company.address.street")(ctx)
+        Method calls - bits with func_args - split path to more functions
+        which are composed then.
+        """
+        read_functions = []
+        attr_names = []
+
+        for bit in self.Path:
+            if isinstance(bit._node, Operation):
+                # one level deeper, only first bit can be Operation
+                assert not read_functions and not attr_names, self
+                read_functions.append(bit._node.get_read_function())
+                continue
+
+            if not read_functions and not attr_names:
+                # top - start from namespace values holder, e.g. ctx.Models
+                attr_names.append(self._namespace._name)
+
+            if bit._func_args is not None:
+                # -> .<var_name>(*args, **kwargs)
+                if attr_names:
+                    read_functions.append(get_none_safe_attrgetter(".".join(attr_names)))
+                    attr_names = []
+                args, kwargs = bit._func_args
+                read_functions.append(get_none_safe_methodcaller(bit._node, *args, **kwargs))
             else:
-                val = func(val)
-        return val
+                attr_names.append(bit._node)
+
+        if attr_names:
+            read_functions.append(get_none_safe_attrgetter(".".join(attr_names)))
+
+        return composite_functions(*read_functions)
+
+
+    def _compile_and_read(self, ctx:Any) -> Any:
+        " read function after unpickling - compiled on first Read() "
+        self._read_function = self._compile_read_function()
+        return self._read_function(ctx)
+
+    def __getstate__(self):
+        """ compiled read function is not picklable, Path is cached list -
+            both are made again after unpickling.
+        """
+        state = self.__dict__.copy()
+        state["_path"] = None
+        if callable(self._read_function):
+            state["_read_function"] = UNDEFINED
+            state["_read_function_compiled"] = True
+        return state
+
+    def __setstate__(self, state):
+        compiled = state.pop("_read_function_compiled", False)
+        self.__dict__.update(state)
+        if compiled:
+            self._read_function = self._compile_and_read
+
+    def Read(self, ctx:Any) -> Any:
+        """
+        ctx - holds runtime values, single attribute per namespace
+              e.g. ctx.Models.company, ctx.Fields.name, ctx.This.value
+        """
+        if self._read_function is UNDEFINED or self._read_function is None:
+            raise RuleInternalError(owner=self, msg=f"Setup not done or not successful (status={self._status}).")
+        if self._cache_key is not None:
+            # per-record cache of variable values, ctx without it is not cached
+            var_values = getattr(ctx, "var_values", None)
+            if var_values is not None:
+                try:
+                    return var_values[self._cache_key]
+                except KeyError:
+                    value = var_values[self._cache_key] = self._read_function(ctx)
+                    return value
+        return self._read_function(ctx)
 
     # def __getitem__(self, ind):
     #     # list [0] or dict ["test"]
@@ -324,7 +490,7 @@ class ValueExpression(RubberObjectBase):
             raise RuleSetupNameError(owner=self, msg=f"ValueExpression's attribute '{aname}' is reserved name, choose another.")
         if aname.startswith("__") and aname.endswith("__"):
             raise AttributeError(f"Attribute '{type(self)}' object has no attribute '{aname}'")
-        return ValueExpression(node=aname, namespace=self._namespace, Path=self.Path)
+        return ValueExpression(node=aname, namespace=self._namespace, parent=self)
 
     def __call__(self, *args, **kwargs):
         assert self._func_args is None
@@ -395,3 +561,369 @@ class ValueExpression(RubberObjectBase):
     # String Formatting 	s % obj 	mod(s, obj)
     #       % 	__mod__(self, object) 	Modulus
     # Truth Test 	obj 	truth(obj) 
+
+# ------------------------------------------------------------
+# Simplification - constant folding and boolean identities
+# ------------------------------------------------------------
+
+# operators which always return bool
+BOOLEAN_OPCODES = {"not", "and", "or"}
+
+# NOTE: arithmetic identities (x + 0, x * 1) are not removed - operand
+#       types are not known before Setup(), and for non-numbers they
+#       change the result (None + 0 fails, list * 1 is a copy).
+
+
+def is_literal(node: Any) -> bool:
+    return not isinstance(node, (ValueExpression, Operation))
+
+
+def is_boolean_node(node: Any) -> bool:
+    if isinstance(node, ValueExpression) and len(node.Path)==1 and isinstance(node._node, Operation):
+        node = node._node
+    return isinstance(node, Operation) and node.op in BOOLEAN_OPCODES
+
+
+def simplify_value_expression(vexp: ValueExpression, truth_value: bool=False) -> Any:
+    """
+    Simplifies Operation tree before Setup(), returns ValueExpression or
+    literal value when whole tree is folded. Nested operands are simplified
+    in place, e.g.:
+        F.x * (2 * 3)   -> F.x * 6
+        ~~(F.a > 1)     -> F.a > 1
+        F.a & False     -> False
+    truth_value - result is used only as bool (e.g. available, ensure), then
+    x & True -> x is allowed even when x is not bool.
+    """
+    if vexp._status!=VExpStatusEnum.INITIALIZED:
+        raise RuleInternalError(owner=vexp, msg=f"Simplification should be done before Setup() (status={vexp._status}).")
+    if len(vexp.Path)!=1 or not isinstance(vexp._node, Operation):
+        # plain path - nothing to simplify
+        return vexp
+
+    node = simplify_operation(vexp._node, truth_value=truth_value)
+    if isinstance(node, Operation):
+        if node is not vexp._node:
+            vexp._node = node
+            vexp._name = str(node)
+        return vexp
+    # ValueExpression or literal
+    return node
+
+
+def _simplify_operand(operand: Any, truth_value: bool) -> Any:
+    if isinstance(operand, ValueExpression):
+        node = simplify_value_expression(operand, truth_value=truth_value)
+    elif isinstance(operand, Operation):
+        node = simplify_operation(operand, truth_value=truth_value)
+    else:
+        node = operand
+    if isinstance(node, Operation):
+        node = ValueExpression(node, namespace=GlobalNS)
+    return node
+
+
+def simplify_operation(operation: Operation, truth_value: bool=False) -> Any:
+    " returns Operation (same or changed in place), ValueExpression or literal "
+    op = operation.op
+    # operands of not/and/or are used only as bool
+    operands_truth_value = (op in BOOLEAN_OPCODES)
+
+    operation.first = first = _simplify_operand(operation.first, truth_value=operands_truth_value)
+    if operation.is_unary():
+        if is_literal(first):
+            return _fold(operation, first)
+        # not not x -> x
+        if op=="not" and is_boolean_node(first) and first._node.op=="not":
+            inner = first._node.first
+            if truth_value or is_boolean_node(inner):
+                return inner
+        return operation
+
+    operation.second = second = _simplify_operand(operation.second, truth_value=operands_truth_value)
+    if is_literal(first) and is_literal(second):
+        return _fold(operation, first, second)
+
+    if op in ("and", "or"):
+        # absorbing: x & False -> False, x | True -> True
+        # identity:  x & True -> x,      x | False -> x
+        absorbing = (op=="or")
+        for literal, other in ((first, second), (second, first)):
+            if not is_literal(literal):
+                continue
+            if bool(literal)==absorbing:
+                return absorbing
+            if truth_value or is_boolean_node(other):
+                return other
+    return operation
+
+
+def _fold(operation: Operation, *operands: Any) -> Any:
+    try:
+        return operation.op_function(*operands)
+    except Exception:
+        # will fail in runtime with proper error
+        return operation
+
+# ------------------------------------------------------------
+# Structural keys and interning
+# ------------------------------------------------------------
+
+def get_structural_key(node: Any, visit: Optional[Callable[[Operation, Hashable], None]]=None) -> Hashable:
+    """
+    Hashable key of expression structure - (namespace, path, func_args) for
+    ValueExpression, (op, first, second) for Operation. Structurally equal
+    expressions have equal keys, e.g. F.a & (F.b > 1) built twice.
+    visit - optional, called for each Operation (bottom-up) with its key.
+    """
+    if isinstance(node, ValueExpression):
+        bit_keys = []
+        for bit in node.Path:
+            if isinstance(bit._node, Operation):
+                bit_key = get_structural_key(bit._node, visit)
+            elif bit._func_args is not None:
+                args, kwargs = bit._func_args
+                bit_key = (bit._node,
+                           tuple([get_structural_key(arg, visit) for arg in args]),
+                           tuple([(name, get_structural_key(value, visit)) for name, value in sorted(kwargs.items())]))
+            else:
+                bit_key = bit._node
+            bit_keys.append(bit_key)
+        return (node._namespace._name, tuple(bit_keys))
+
+    if isinstance(node, Operation):
+        second_key = None if node.is_unary() else get_structural_key(node.second, visit)
+        key = (node.op, get_structural_key(node.first, visit), second_key)
+        if visit:
+            visit(node, key)
+        return key
+
+    # literal, NOTE: repr() - literal can be unhashable, e.g. list
+    return ("literal", type(node).__name__, repr(node))
+
+
+def _iter_operands(operation: Operation):
+    yield operation.first
+    if not operation.is_unary():
+        yield operation.second
+
+
+class ValueExpressionInterner:
+    """
+    Table of canonical ValueExpressions (after Setup) keyed by structural
+    key - structurally equal expressions share single object, nested
+    operands included. Table is per container (heap), since the same
+    expression in other container references other variables.
+    NOTE: interning is done only after Setup() of the container, so
+          duplicates live (and are set up) separately until then.
+    """
+
+    def __init__(self):
+        self.table: Dict[Hashable, ValueExpression] = {}
+        self.hits = 0
+
+    def __str__(self):
+        return f"ValueExpressionInterner(size={len(self.table)}, hits={self.hits})"
+    __repr__ = __str__
+
+    def intern(self, vexp: ValueExpression) -> ValueExpression:
+        if vexp._status==VExpStatusEnum.INITIALIZED:
+            raise RuleInternalError(owner=vexp, msg="Only expressions after Setup() can be interned.")
+        if len(vexp.Path)==1 and isinstance(vexp._node, Operation):
+            self._intern_operands(vexp._node)
+
+        key = get_structural_key(vexp)
+        canonical = self.table.setdefault(key, vexp)
+        if canonical is not vexp:
+            self.hits += 1
+        return canonical
+
+    def _intern_operands(self, operation: Operation):
+        changed = False
+        for attr_name, operand in (("first", operation.first), ("second", operation.second)):
+            if attr_name=="second" and operation.is_unary():
+                continue
+            if isinstance(operand, ValueExpression):
+                canonical = self.intern(operand)
+                if canonical is not operand:
+                    setattr(operation, attr_name, canonical)
+                    changed = True
+            elif isinstance(operand, Operation):
+                self._intern_operands(operand)
+        if changed:
+            operation.compile_operand_readers()
+
+# ------------------------------------------------------------
+# Common subexpressions
+# ------------------------------------------------------------
+
+def setup_shared_subexpressions(vexps: List[ValueExpression]) -> int:
+    """
+    Finds structurally equal Operation subtrees in all vexps (after Setup)
+    and marks each group with the same shared slot - value is then evaluated
+    once per record and shared, e.g. (F.a & ~F.b) used in available and
+    ensure. Subtrees which use This. are excluded since This.value
+    changes within the same record. Returns number of shared slots.
+    """
+    operations: List[Operation] = []
+    operations_by_key = {}
+    # id(operation) -> key / if uses This., child id(operation) -> parent operation
+    operation_keys = {}
+    operation_uses_this = {}
+    parents = {}
+
+    def uses_this(operand: Any) -> bool:
+        inner = _unwrap_operation(operand)
+        if inner is not None:
+            return operation_uses_this[id(inner)]
+        return isinstance(operand, ValueExpression) and operand._namespace==ThisNS
+
+    def visit(operation: Operation, key: Hashable):
+        # bottom-up - operands are already visited
+        operations.append(operation)
+        operation_keys[id(operation)] = key
+        operation_uses_this[id(operation)] = any([uses_this(operand) for operand in _iter_operands(operation)])
+        if not operation_uses_this[id(operation)]:
+            operations_by_key.setdefault(key, []).append(operation)
+        for operand in _iter_operands(operation):
+            inner = _unwrap_operation(operand)
+            if inner is not None:
+                parents[id(inner)] = operation
+
+    for vexp in vexps:
+        get_structural_key(vexp, visit)
+
+    def is_shared(operation: Operation) -> bool:
+        return len(operations_by_key.get(operation_keys[id(operation)], ()))>=2
+
+    slot = 0
+    for key, key_operations in operations_by_key.items():
+        if len(key_operations)<2:
+            continue
+        if all(id(operation) in parents and is_shared(parents[id(operation)])
+               for operation in key_operations):
+            # each occurrence is within shared parent - evaluated once anyway
+            continue
+        for operation in key_operations:
+            operation.set_shared_slot(slot)
+        slot += 1
+
+    if slot:
+        # readers hold Operation read functions - recompile
+        for operation in operations:
+            operation.compile_operand_readers()
+        for vexp in vexps:
+            _recompile_read_functions(vexp)
+    return slot
+
+
+def _recompile_read_functions(vexp: ValueExpression):
+    inner = _unwrap_operation(vexp)
+    if inner is None:
+        return
+    if vexp._read_function not in (UNDEFINED, None):
+        vexp._read_function = vexp._compile_read_function()
+    for operand in _iter_operands(inner):
+        if isinstance(operand, ValueExpression):
+            _recompile_read_functions(operand)
+
+# ------------------------------------------------------------
+# Cost based operand ordering
+# ------------------------------------------------------------
+
+# estimated cost of reading the value, used for and/or operands ordering
+READ_COST_LITERAL     = 0
+READ_COST_ATTRIBUTE   = 1
+READ_COST_METHOD_CALL = 10
+READ_COST_DATA_VAR    = 100
+
+
+def get_read_cost(node: Any, data_var_names: Set[str]) -> int:
+    " data_var_names - F.<name> which are DataVar (callables) "
+    if isinstance(node, ValueExpression):
+        if len(node.Path)==1 and isinstance(node._node, Operation):
+            return get_read_cost(node._node, data_var_names)
+        if node._namespace==DataProvidersNS \
+                or (node._namespace==FieldsNS and node.Path[0]._node in data_var_names):
+            return READ_COST_DATA_VAR
+        if [bit for bit in node.Path if bit._func_args is not None]:
+            return READ_COST_METHOD_CALL
+        return READ_COST_ATTRIBUTE
+    if isinstance(node, Operation):
+        cost = get_read_cost(node.first, data_var_names)
+        if not node.is_unary():
+            cost += get_read_cost(node.second, data_var_names)
+        return cost
+    return READ_COST_LITERAL
+
+
+def reorder_operands_by_cost(vexp: ValueExpression, data_var_names: Set[str]) -> int:
+    """
+    Reorders operands of and/or chains (after Setup) so cheaper operands are
+    read first and short-circuit skips expensive ones:
+        attribute < method call < DataVar callable
+    e.g. DP.lookup & (F.x.upper()=="A") & F.flag -> F.flag & (F.x.upper()=="A") & DP.lookup.
+    Chain is rebuilt from the same Operation objects (left deep). Ordering
+    is stable, so equal costs keep written order. Operands are expected to
+    be without side effects - errors of skipped operands are not raised
+    any more. Returns number of reordered chains.
+    """
+    if len(vexp.Path)!=1 or not isinstance(vexp._node, Operation):
+        return 0
+    return _reorder_operation(vexp._node, data_var_names)
+
+
+def _unwrap_operation(operand: Any) -> Optional[Operation]:
+    if isinstance(operand, ValueExpression) and len(operand.Path)==1 \
+            and isinstance(operand._node, Operation):
+        return operand._node
+    if isinstance(operand, Operation):
+        return operand
+    return None
+
+
+def _reorder_operation(operation: Operation, data_var_names: Set[str]) -> int:
+    if operation.op not in Operation.SHORT_CIRCUIT_RESULTS:
+        count = 0
+        for operand in (operation.first, operation.second):
+            inner = _unwrap_operation(operand)
+            if inner is not None:
+                count += _reorder_operation(inner, data_var_names)
+        return count
+
+    # flatten chain of the same operator - operands and (operation, wrapper) list
+    chain = [(operation, None)]
+    operands = []
+
+    def flatten(chain_operation: Operation):
+        for operand in (chain_operation.first, chain_operation.second):
+            inner = _unwrap_operation(operand)
+            if inner is not None and inner.op==operation.op and isinstance(operand, ValueExpression):
+                chain.append((inner, operand))
+                flatten(inner)
+            else:
+                operands.append(operand)
+    flatten(operation)
+
+    count = 0
+    for operand in operands:
+        inner = _unwrap_operation(operand)
+        if inner is not None:
+            count += _reorder_operation(inner, data_var_names)
+
+    ordered = sorted(operands, key=lambda operand: get_read_cost(operand, data_var_names))
+    if [id(operand) for operand in ordered]==[id(operand) for operand in operands]:
+        return count
+
+    # rebuild left deep: ((o1 op o2) op o3) op o4
+    for nr, (chain_operation, _) in enumerate(chain):
+        chain_operation.second = ordered[-1-nr]
+        if nr+1<len(chain):
+            chain_operation.first = chain[nr+1][1]
+        else:
+            chain_operation.first = ordered[0]
+    for chain_operation, wrapper in reversed(chain):
+        chain_operation.compile_operand_readers()
+        if wrapper is not None:
+            wrapper._name = str(chain_operation)
+    return count + 1
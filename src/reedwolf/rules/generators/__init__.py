@@ -1,4 +1,6 @@
 # module
 from .to_pydantic import dump_pydantic_models, dump_pydantic_models_to_str
+from .to_python import dump_python_validator, dump_python_validator_to_str
 
-__all__ = ["dump_pydantic_models", "dump_pydantic_models_to_str"]
+__all__ = ["dump_pydantic_models", "dump_pydantic_models_to_str",
+           "dump_python_validator", "dump_python_validator_to_str"]
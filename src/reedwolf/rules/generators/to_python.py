@@ -0,0 +1,530 @@
+"""
+Dumps set-up Rules to plain python module with single validate(instance)
+function. Attribute access, operations and Field/Validation/Cardinality
+checks are inlined, so the generated module can be imported and used
+without reedwolf.rules (no fill_components, type hints and heap building).
+
+Generated validate() follows evaluation.validate_instance() logic, but
+returns list of tuples (component_name, error_message). Local variables
+(Models attributes, Field and DataVar values) are assigned in the branch
+that uses them - nothing is read for components which are not available.
+DataVar values are evaluated at most once (NOT_SET in function prologue).
+"""
+from __future__ import annotations
+
+import inspect
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Dict, List, Optional, Set
+
+from ..base import (
+        ComponentBase,
+        PY_INDENT,
+        )
+from ..exceptions import RuleSetupError
+from ..expressions import ValueExpression, Operation
+from ..namespaces import ModelsNS, FieldsNS, DataProvidersNS, ThisNS
+from ..components import ChoiceField, DataVar, Field, Section
+from ..containers import ContainerBase
+from ..validations import Cardinality, Unique, to_hashable
+from ..evaluation import REQUIRED_ERROR_MSG, CHOICE_ERROR_MSG
+
+# ------------------------------------------------------------
+
+@dataclass
+class DumpPythonFunctionLines:
+    " single generated validate function - one per container (Rules/Extension) "
+    name: str
+    container: ContainerBase = field(repr=False)
+    # local variable name -> python expression, names are unique in function
+    locals: Dict[str, str] = field(init=False, default_factory=dict)
+    # locals set to NOT_SET in function prologue, see add_local()
+    lazy_names: List[str] = field(init=False, default_factory=list)
+    lines: List[str] = field(init=False, default_factory=list)
+    # locals assigned in current block or blocks around it
+    assigned: Set[str] = field(init=False, default_factory=set)
+    _blocks: List[Set[str]] = field(init=False, repr=False, default_factory=list)
+
+    def add_local(self, name:str, py_expr:str, lines:List[str], indent:str, lazy:bool=False) -> str:
+        """ returns local name, when name is taken with different expression,
+            new one is made. Assignment is added to lines when the local is
+            not assigned yet in current block. lazy - evaluated at most once
+            in function (e.g. DataVar provider call).
+        """
+        base_name, nr = name, 1
+        while name in self.locals and self.locals[name]!=py_expr:
+            nr += 1
+            name = f"{base_name}_{nr}"
+        self.locals[name] = py_expr
+        if name not in self.assigned:
+            if lazy:
+                if name not in self.lazy_names:
+                    self.lazy_names.append(name)
+                lines.append(f"{indent}if {name} is NOT_SET:")
+                lines.append(f"{indent}{PY_INDENT}{name} = {py_expr}")
+            else:
+                lines.append(f"{indent}{name} = {py_expr}")
+            self.assigned.add(name)
+        return name
+
+    def open_block(self):
+        " lines of conditional block follow - locals assigned there are not seen after it "
+        self._blocks.append(set(self.assigned))
+
+    def close_block(self):
+        self.assigned = self._blocks.pop()
+
+# ------------------------------------------------------------
+
+@dataclass
+class DumpPythonValidatorStore:
+
+    functions: List[DumpPythonFunctionLines] = field(init=False, default_factory=list)
+    # module -> names
+    imports: Dict[str, Set[str]] = field(init=False, default_factory=dict)
+    # module level name -> python expression, evaluated once on import
+    constants: Dict[str, str] = field(init=False, default_factory=dict)
+    # module level function name -> source, copied from reedwolf.rules
+    helpers: Dict[str, str] = field(init=False, default_factory=dict)
+
+    def add_import(self, module:str, name:str):
+        self.imports.setdefault(module, set()).add(name)
+
+    def add_constant(self, name:str, py_expr:str) -> str:
+        assert name not in self.constants, name
+        self.constants[name] = py_expr
+        return name
+
+    def add_helper(self, function:Any) -> str:
+        " function source is copied, its annotations can use typing.Any only "
+        self.add_import("typing", "Any")
+        self.helpers.setdefault(function.__name__, inspect.getsource(function))
+        return function.__name__
+
+    def add_function(self, name:str, container:ContainerBase) -> DumpPythonFunctionLines:
+        assert name not in [fn.name for fn in self.functions], name
+        function_lines = DumpPythonFunctionLines(name=name, container=container)
+        self.functions.append(function_lines)
+        return function_lines
+
+# ------------------------------------------------------------
+
+def dump_python_validator(component:ComponentBase, fname:str):
+    code = dump_python_validator_to_str(component=component)
+    with open(fname, "w") as fout:
+        fout.write(code)
+        len_lines = len(code.splitlines())
+        print(f"Output in {fname}, {len_lines} lines.")
+    return
+
+# ------------------------------------------------------------
+
+def dump_python_validator_to_str(component:ComponentBase) -> str:
+    if not isinstance(component, ContainerBase):
+        raise RuleSetupError(owner=component, msg="Python validator can be dumped only for Rules/Extension.")
+    if not component.is_finished():
+        raise RuleSetupError(owner=component, msg="Call .setup() first")
+
+    store = DumpPythonValidatorStore()
+    _dump_container(component, store, function_name="validate")
+    if [function_lines for function_lines in store.functions if function_lines.lazy_names]:
+        store.add_constant("NOT_SET", "object()")
+
+    all_lines = [
+        "# --------------------------------------------------------------------------------",
+        "# IMPORTANT: DO NOT EDIT!!! The code is generated by reedwolf.rules system,",
+        "#            rather change rules.py and regenerate the code.",
+        "# --------------------------------------------------------------------------------",
+        ]
+    for module in sorted(store.imports):
+        names = ", ".join(sorted(store.imports[module]))
+        all_lines.append(f"from {module} import {names}  # noqa: F401")
+    if store.constants:
+        all_lines.append("")
+    for name, py_expr in store.constants.items():
+        all_lines.append(f"{name} = {py_expr}")
+    for name, source in store.helpers.items():
+        all_lines.append("")
+        all_lines.append("")
+        all_lines.extend(source.rstrip().splitlines())
+
+    # extensions are dumped last, but are needed first
+    for function_lines in reversed(store.functions):
+        all_lines.append("")
+        all_lines.append("")
+        all_lines.append(f"def {function_lines.name}(instance):")
+        all_lines.append(f'{PY_INDENT}""" {function_lines.container.__class__.__name__} {function_lines.container.name} """')
+        all_lines.append(f"{PY_INDENT}errors = []")
+        for local_name in function_lines.lazy_names:
+            all_lines.append(f"{PY_INDENT}{local_name} = NOT_SET")
+        all_lines.extend(function_lines.lines)
+        all_lines.append(f"{PY_INDENT}return errors")
+    all_lines.append("")
+
+    return "\n".join(all_lines)
+
+# ------------------------------------------------------------
+# Components
+# ------------------------------------------------------------
+
+def _dump_container(container:ContainerBase, store:DumpPythonValidatorStore, function_name:str):
+    fn = store.add_function(function_name, container)
+    for component in container.get_children():
+        _dump_component(component, fn, store, fn.lines, depth=1)
+    _dump_validations(container.validations, "instance", fn, store, fn.lines, depth=1)
+
+
+def _dump_component(component:ComponentBase, fn:DumpPythonFunctionLines, store:DumpPythonValidatorStore, lines:List[str], depth:int):
+    indent = PY_INDENT * depth
+
+    if isinstance(component, Field):
+        component_start, assigned = len(lines), set(fn.assigned)
+        lines.append(f"{indent}# Field {component.name}")
+        available = _condition_to_python(component.available, fn, store, lines, indent=indent)
+        if available is False:
+            del lines[component_start:]
+            fn.assigned = assigned
+            return
+        if available is not True:
+            lines.append(f"{indent}if {available}:")
+            fn.open_block()
+            depth += 1
+            indent = PY_INDENT * depth
+
+        value = _vexp_to_python(component.bind, fn, store, lines, indent=indent)
+        checks_start = len(lines)
+        empty_check = f"{value} is None or {value}==''"
+        required = _condition_to_python(component.required, fn, store, lines, indent=indent)
+        if required is True:
+            lines.append(f"{indent}if {empty_check}:")
+        elif required is not False:
+            lines.append(f"{indent}if ({required}) and ({empty_check}):")
+        if required is not False:
+            lines.append(f"{indent}{PY_INDENT}errors.append(({component.name!r}, {REQUIRED_ERROR_MSG!r}))")
+
+        if isinstance(component, ChoiceField):
+            choices = _dump_choice_values(component, store)
+            lines.append(f"{indent}if not ({empty_check}) and {value} not in {choices}:")
+            lines.append(f"{indent}{PY_INDENT}errors.append(({component.name!r}, {CHOICE_ERROR_MSG!r}))")
+
+        if component.validations:
+            lines.append(f"{indent}if {value} is not None:")
+            fn.open_block()
+            _dump_validations(component.validations, value, fn, store, lines, depth+1)
+            fn.close_block()
+
+        for child in component.get_children():
+            _dump_component(child, fn, store, lines, depth)
+
+        if available is not True:
+            fn.close_block()
+        if len(lines)==checks_start:
+            # nothing to check
+            del lines[component_start:]
+            fn.assigned = assigned
+
+    elif isinstance(component, Section):
+        component_start, assigned = len(lines), set(fn.assigned)
+        lines.append(f"{indent}# Section {component.name}")
+        available = _condition_to_python(component.available, fn, store, lines, indent=indent)
+        if available is False:
+            del lines[component_start:]
+            fn.assigned = assigned
+            return
+        if available is not True:
+            lines.append(f"{indent}if {available}:")
+            fn.open_block()
+            depth += 1
+        block_start = len(lines)
+        for child in component.get_children():
+            _dump_component(child, fn, store, lines, depth)
+        _dump_validations(component.validations, "instance", fn, store, lines, depth)
+        if available is not True:
+            fn.close_block()
+        if len(lines)==block_start:
+            # nothing to check
+            del lines[component_start:]
+            fn.assigned = assigned
+
+    elif isinstance(component, ContainerBase):
+        _dump_extension(component, fn, store, lines, depth)
+
+    # DataVar, BoundModel, ChildrenValidation - nothing to validate
+
+
+def _dump_choice_values(component:ChoiceField, store:DumpPythonValidatorStore) -> str:
+    # NOTE: needs to be in sync with choices.build_choice_index() - only
+    #       list choices, set of values is made once
+    if not isinstance(component.choices, (list, tuple)):
+        raise RuleSetupError(owner=component, msg=f"ChoiceField {component.name} with choices {component.choices} (not a list) is not supported in python validator dump.")
+    values = []
+    for value, option in component.get_choice_index().options.items():
+        if option.available is not True:
+            raise RuleSetupError(owner=component, msg=f"ChoiceField {component.name} with conditionally available choices is not supported in python validator dump.")
+        values.append(_literal_to_python(value, store))
+    return store.add_constant(f"CHOICES__{component.name}", f"frozenset([{', '.join(values)}])")
+
+
+def _dump_validations(validations, this_value:str, fn:DumpPythonFunctionLines, store:DumpPythonValidatorStore, lines:List[str], depth:int):
+    if not validations:
+        return
+    indent = PY_INDENT * depth
+    lines.append(f"{indent}this_value = {this_value}")
+    for validation in validations:
+        available = _condition_to_python(validation.available, fn, store, lines, indent=indent)
+        if available is False:
+            continue
+        ensure_indent = indent
+        if available is not True:
+            # ensure is evaluated only when available, as in evaluation
+            lines.append(f"{indent}if {available}:")
+            fn.open_block()
+            ensure_indent += PY_INDENT
+        ensure = _vexp_to_python(validation.ensure, fn, store, lines, indent=ensure_indent)
+        lines.append(f"{ensure_indent}if not ({ensure}):")
+        lines.append(f"{ensure_indent}{PY_INDENT}errors.append(({validation.name!r}, {validation.error!r}))")
+        if available is not True:
+            fn.close_block()
+
+
+def _dump_extension(extension:ContainerBase, fn:DumpPythonFunctionLines, store:DumpPythonValidatorStore, lines:List[str], depth:int):
+    indent = PY_INDENT * depth
+    function_name = f"validate__{extension.name}"
+    items = f"items__{extension.name}"
+
+    for unique in extension.children_validations:
+        if isinstance(unique, Unique.Global):
+            raise RuleSetupError(owner=unique, msg="Unique.Global (index of stored keys) is not supported in python validator dump.")
+
+    lines.append(f"{indent}# Extension {extension.name}")
+    value = _vexp_to_python(extension.bound_model.model, fn, store, lines, indent=indent)
+    if extension.bound_variable.data.is_list:
+        lines.append(f"{indent}{items} = {value} if {value} is not None else ()")
+    else:
+        lines.append(f"{indent}{items} = ({value},) if {value} is not None else ()")
+    # items are counted on the fly - any iterable, cardinality and unique
+    # errors go first
+    lines.append(f"{indent}errors_pos = len(errors)")
+    lines.append(f"{indent}items_count = 0")
+    for unique in extension.children_validations:
+        lines.append(f"{indent}unique_keys__{unique.name}, unique_keys_unhashable__{unique.name}, "
+                     f"unique_duplicates__{unique.name} = set(), [], []")
+    lines.append(f"{indent}for item in {items}:")
+    for unique in extension.children_validations:
+        _dump_unique_check(unique, store, lines, depth + 1)
+    lines.append(f"{indent}{PY_INDENT}items_count += 1")
+    lines.append(f"{indent}{PY_INDENT}errors.extend({function_name}(item))")
+    lines.append(f"{indent}item_errors = errors[errors_pos:]")
+    lines.append(f"{indent}del errors[errors_pos:]")
+    _dump_cardinality(extension.cardinality, None, lines, depth)
+    for unique in extension.children_validations:
+        duplicates = f"unique_duplicates__{unique.name}"
+        msg = f"Values of {', '.join(unique.fields)} should be unique, duplicates at item position(s): "
+        lines.append(f"{indent}if {duplicates}:")
+        lines.append(f"{indent}{PY_INDENT}errors.append(({unique.name!r}, {msg!r} + ', '.join(map(str, {duplicates})) + '.'))")
+    lines.append(f"{indent}errors.extend(item_errors)")
+
+    _dump_container(extension, store, function_name=function_name)
+
+
+def _dump_unique_check(unique, store:DumpPythonValidatorStore, lines:List[str], depth:int):
+    # NOTE: needs to be in sync with validations.UniqueValidation.get_key()
+    #       and evaluation._validate_extension()
+    indent = PY_INDENT * depth
+    values = [_attr_path_to_python("item", attr_path) for attr_path in unique._attr_paths]
+    keys, duplicates = f"unique_keys__{unique.name}", f"unique_duplicates__{unique.name}"
+    keys_unhashable = f"unique_keys_unhashable__{unique.name}"
+    if len(values)==1:
+        lines.append(f"{indent}key = {values[0]}")
+    else:
+        lines.append(f"{indent}key = ({', '.join(values)})")
+    if unique.ignore_none:
+        lines.append(f"{indent}if key is not None:" if len(values)==1 else f"{indent}if None not in key:")
+        indent += PY_INDENT
+    lines.append(f"{indent}try:")
+    lines.append(f"{indent}{PY_INDENT}hash(key)")
+    lines.append(f"{indent}except TypeError:")
+    lines.append(f"{indent}{PY_INDENT}key = {store.add_helper(to_hashable)}(key)")
+    lines.append(f"{indent}try:")
+    lines.append(f"{indent}{PY_INDENT}is_seen, add_seen = key in {keys}, {keys}.add")
+    lines.append(f"{indent}except TypeError:")
+    lines.append(f"{indent}{PY_INDENT}is_seen, add_seen = key in {keys_unhashable}, {keys_unhashable}.append")
+    lines.append(f"{indent}if is_seen:")
+    lines.append(f"{indent}{PY_INDENT}{duplicates}.append(items_count)")
+    lines.append(f"{indent}else:")
+    lines.append(f"{indent}{PY_INDENT}add_seen(key)")
+
+
+def _attr_path_to_python(obj:str, attr_path:str) -> str:
+    " none safe dotted attribute access, e.g. address.city - None when address is None "
+    py_expr = obj
+    for nr, attr_name in enumerate(attr_path.split(".")):
+        if nr==0:
+            py_expr = f"{py_expr}.{attr_name}"
+        else:
+            py_expr = f"({py_expr}.{attr_name} if {py_expr} is not None else None)"
+    return py_expr
+
+
+def _dump_cardinality(cardinality, items_count:Optional[str], lines:List[str], depth:int):
+    # NOTE: needs to be in sync with validations.Cardinality.*.validate()
+    #       items_count - None when local variable items_count is already set
+    indent = PY_INDENT * depth
+    name = cardinality.name
+    if items_count is not None:
+        lines.append(f"{indent}items_count = {items_count}")
+
+    def add_check(condition, msg, keyword="if"):
+        lines.append(f"{indent}{keyword} {condition}:")
+        lines.append(f"{indent}{PY_INDENT}errors.append(({name!r}, {msg}))")
+
+    if isinstance(cardinality, Cardinality.Single):
+        if not cardinality.allow_none:
+            add_check("items_count==0", repr("Expected exactly one item, got none."))
+        add_check("items_count>1", 'f"Expected exactly one item, got {items_count}."')
+    elif isinstance(cardinality, Cardinality.Range):
+        keyword = "if"
+        if cardinality.min:
+            add_check(f"items_count < {cardinality.min}", f'f"Expected at least {cardinality.min} item(s), got {{items_count}}."')
+            keyword = "elif"
+        if cardinality.max:
+            add_check(f"items_count > {cardinality.max}", f'f"Expected at most {cardinality.max} items, got {{items_count}}."', keyword=keyword)
+    elif isinstance(cardinality, Cardinality.Multi):
+        if not cardinality.allow_none:
+            add_check("items_count==0", repr("Expected at least one item, got none."))
+    else:
+        raise RuleSetupError(owner=cardinality, msg=f"Cardinality {type(cardinality)} is not supported in python validator dump.")
+
+# ------------------------------------------------------------
+# Expressions
+# ------------------------------------------------------------
+
+def _condition_to_python(value:Any, fn:DumpPythonFunctionLines, store:DumpPythonValidatorStore, lines:List[str], indent:str) -> Any:
+    " returns True/False for constant values, otherwise python expression "
+    if isinstance(value, ValueExpression):
+        return _vexp_to_python(value, fn, store, lines, indent=indent)
+    return bool(value)
+
+
+def _operand_to_python(operand:Any, fn:DumpPythonFunctionLines, store:DumpPythonValidatorStore, lines:List[str], indent:str) -> str:
+    if isinstance(operand, ValueExpression):
+        return _vexp_to_python(operand, fn, store, lines, indent=indent)
+    if isinstance(operand, Operation):
+        return _operation_to_python(operand, fn, store, lines, indent=indent)
+    return _literal_to_python(operand, store)
+
+
+def _operation_to_python(operation:Operation, fn:DumpPythonFunctionLines, store:DumpPythonValidatorStore, lines:List[str], indent:str) -> str:
+    first = _operand_to_python(operation.first, fn, store, lines, indent)
+    if operation.is_unary():
+        assert operation.op=="not"
+        return f"(not {first})"
+    second = _operand_to_python(operation.second, fn, store, lines, indent)
+    if operation.op=="and":
+        return f"(bool({first}) and bool({second}))"
+    if operation.op=="or":
+        return f"(bool({first}) or bool({second}))"
+    if operation.op=="in":
+        # operator.contains(first, second)
+        return f"({second} in {first})"
+    return f"({first} {operation.op} {second})"
+
+
+def _literal_to_python(value:Any, store:DumpPythonValidatorStore) -> str:
+    if value is None or isinstance(value, (bool, int, float, str)) and not isinstance(value, Enum):
+        return repr(value)
+    if isinstance(value, Decimal):
+        store.add_import("decimal", "Decimal")
+        return repr(value)
+    if isinstance(value, (date, datetime)):
+        store.add_import("datetime", value.__class__.__name__)
+        return f"{value.__class__.__name__}{repr(value)[repr(value).index('('):]}"
+    if isinstance(value, Enum):
+        return f"{_import_object(value.__class__, store)}.{value.name}"
+    if isinstance(value, (list, tuple)):
+        items = ", ".join([_literal_to_python(item, store) for item in value])
+        return f"[{items}]" if isinstance(value, list) else f"({items},)"
+    raise RuleSetupError(item=value, msg=f"Literal value {value} / {type(value)} is not supported in python validator dump.")
+
+
+def _import_object(obj:Any, store:DumpPythonValidatorStore) -> str:
+    module = getattr(obj, "__module__", None)
+    qualname = getattr(obj, "__qualname__", None)
+    if not module or not qualname or "<" in qualname or module=="__main__":
+        raise RuleSetupError(item=obj, msg=f"Object {obj} is not importable (module level name needed) and can not be used in python validator dump.")
+    store.add_import(module, qualname.split(".")[0])
+    return qualname
+
+
+def _vexp_to_python(vexp:ValueExpression, fn:DumpPythonFunctionLines, store:DumpPythonValidatorStore, lines:List[str], indent:str) -> str:
+    """
+    returns python expression. Models/Fields/DataProviders values are
+    stored in locals assigned in lines before use (see
+    DumpPythonFunctionLines.add_local()), This values are set just before
+    validation.
+    """
+    top = vexp.Path[0]
+    if isinstance(top._node, Operation):
+        if len(vexp.Path)!=1:
+            raise RuleSetupError(owner=vexp, msg="Attribute of operation result is not supported in python validator dump.")
+        return _operation_to_python(top._node, fn, store, lines, indent=indent)
+
+    namespace = vexp.GetNamespace()
+    container = fn.container
+    top_name = top._node
+    this_lines = None
+
+    if namespace==ModelsNS:
+        bound_model = container.models.get(top_name, None)
+        if bound_model is None:
+            raise RuleSetupError(owner=vexp, msg=f"Model {top_name} not found in {container}")
+        if bound_model is container.bound_model:
+            py_expr = "instance"
+        else:
+            py_expr = _vexp_to_python(bound_model.model, fn, store, lines, indent=indent)
+        local_name = fn.add_local(f"m__{top_name}", py_expr, lines, indent)
+    elif namespace in (FieldsNS, DataProvidersNS):
+        component = container.components.get(top_name, None)
+        if isinstance(component, Field) and namespace==FieldsNS:
+            local_name = _vexp_to_python(component.bind, fn, store, lines, indent=indent)
+        elif isinstance(component, DataVar):
+            if isinstance(component.value, ValueExpression):
+                py_expr = _vexp_to_python(component.value, fn, store, lines, indent=indent)
+            elif component.cache_key is not None or component.is_async():
+                raise RuleSetupError(owner=vexp, msg=f"DataVar {top_name} with cache_key or async provider is not supported in python validator dump.")
+            else:
+                py_expr = f"{_import_object(component.value, store)}()"
+            local_name = fn.add_local(f"dp__{top_name}", py_expr, lines, indent, lazy=True)
+        else:
+            raise RuleSetupError(owner=vexp, msg=f"Component {top_name} not found or not supported in python validator dump.")
+    elif namespace==ThisNS:
+        if top_name!="value":
+            raise RuleSetupError(owner=vexp, msg="Only This.value is supported in python validator dump.")
+        local_name = "this_value"
+        this_lines = lines
+    else:
+        raise RuleSetupError(owner=vexp, msg=f"Namespace {namespace} is not supported in python validator dump.")
+
+    if top._func_args is not None:
+        raise RuleSetupError(owner=vexp, msg="Function call on namespace level is not supported in python validator dump.")
+
+    for bit in vexp.Path[1:]:
+        py_expr = f"{local_name}.{bit._node}"
+        if bit._func_args is not None:
+            args, kwargs = bit._func_args
+            params = [_literal_to_python(arg, store) for arg in args] \
+                   + [f"{k}={_literal_to_python(v, store)}" for k, v in kwargs.items()]
+            py_expr = f"{py_expr}({', '.join(params)})"
+        if local_name!="instance" and fn.locals.get(local_name, None)!="instance":
+            py_expr = f"{py_expr} if {local_name} is not None else None"
+        if this_lines is not None:
+            # This values are changed during validations, can not be in prologue
+            new_local_name = f"{local_name}__{bit._node}"
+            this_lines.append(f"{indent}{new_local_name} = {py_expr}")
+            local_name = new_local_name
+        else:
+            local_name = fn.add_local(f"{local_name}__{bit._node}", py_expr, lines, indent)
+
+    return local_name
@@ -1,6 +1,8 @@
-from typing       import Callable, Optional, Dict, List, Any, Union
+import inspect
+from typing       import Awaitable, Callable, Optional, Dict, Iterable, List, Any, Union
 from dataclasses  import dataclass, field
 
+from .exceptions  import RuleSetupError, RuleSetupValueError
 from .utils import (
         UNDEFINED, 
         UndefinedType, 
@@ -65,19 +67,58 @@ class BoundModelWithHandlers(BoundModelBase):
     # py_type_hint    : SimpleTypeHint = field(init=False, default=None, repr=False)
 
     def read(self, *args, **kwargs):
-        return self.fn_read(*args, **kwargs)
+        return self.read_handler.function(*args, **kwargs)
 
     def save(self, *args, **kwargs):
-        return self.fn_save(*args, **kwargs)
+        """ calls save_handler, then saved model instance(s) - argument
+            model_param_name or first argument - are passed to save
+            listeners, e.g. Unique.Global.add_saved() updates its index.
+            Listeners are called only after successful save - for async
+            save_handler returned coroutine awaits save and then calls them.
+        """
+        if not self._save_listeners:
+            return self.save_handler.function(*args, **kwargs)
+
+        items = self._get_saved_items(args, kwargs)
+        result = self.save_handler.function(*args, **kwargs)
+        if inspect.isawaitable(result):
+            return self._notify_after_save(result, items)
+        self._notify_save_listeners(items)
+        return result
+
+    async def _notify_after_save(self, result: Awaitable[Any], items: Iterable[Any]) -> Any:
+        result = await result
+        self._notify_save_listeners(items)
+        return result
+
+    def _notify_save_listeners(self, items: Iterable[Any]):
+        for listener in self._save_listeners:
+            listener(items)
+
+    def _get_saved_items(self, args: tuple, kwargs: Dict[str, Any]) -> Iterable[Any]:
+        model_param_name = self.save_handler.model_param_name
+        if model_param_name in kwargs:
+            saved = kwargs[model_param_name]
+        elif args:
+            saved = args[0]
+        else:
+            raise RuleSetupError(owner=self, msg=f"{self.name}: saved model instance(s) should be passed as '{model_param_name}' or as first argument, got: {sorted(kwargs)}")
+        return saved if isinstance(saved, (list, tuple)) else (saved,)
+
+    def add_save_listener(self, listener: Callable[[Iterable[Any]], None]):
+        if listener not in self._save_listeners:
+            self._save_listeners.append(listener)
 
     def __post_init__(self):
         if not isinstance(self.read_handler, BoundModelHandler):
-            raise RuleSetupValueError(owner=self, msg=f"read_handler={read_handler} should be instance of BoundModelHandler")
+            raise RuleSetupValueError(owner=self, msg=f"read_handler={self.read_handler} should be instance of BoundModelHandler")
         if not isinstance(self.save_handler, BoundModelHandler):
-            raise RuleSetupValueError(owner=self, msg=f"save_handler={save_handler} should be instance of BoundModelHandler")
+            raise RuleSetupValueError(owner=self, msg=f"save_handler={self.save_handler} should be instance of BoundModelHandler")
         # if self.name=="device_types": import pdb;pdb.set_trace() 
         self.type_hint_field = TypeHintField.extract_function_return_type_hint_field(self.read_handler.function)
         self.model = self.type_hint_field.klass
+        # called after save_handler, see save()
+        self._save_listeners: List[Callable[[Iterable[Any]], None]] = []
 
         # TODO: verify:
         #   read() and save() method inject_parasm - params ok, param type matches vexp 
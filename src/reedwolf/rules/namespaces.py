@@ -20,8 +20,16 @@ class Namespace(RubberObjectBase):
 
     RESERVED_ATTR_NAMES = {"_name",}
 
+    # name -> instance, namespaces are singletons - see __reduce__()
+    _instances = {}
+
     def __init__(self, name):
         self._name = name
+        self.__class__._instances[name] = self
+
+    def __reduce__(self):
+        # pickle / copy returns the same singleton instance
+        return (get_namespace, (self._name,))
 
     def __str__(self):
         return f"{self._name}"
@@ -32,6 +40,9 @@ class Namespace(RubberObjectBase):
     def __getattr__(self, aname):
         if aname in self.RESERVED_ATTR_NAMES: # , "%r -> %s" % (self._node, aname):
             raise RuleSetupNameError(f"{self!r}: Namespace attribute {aname} is reserved, choose another name.")
+        if aname.startswith("__") and aname.endswith("__"):
+            # e.g. __deepcopy__, __getstate__ lookups
+            raise AttributeError(f"Attribute '{type(self)}' object has no attribute '{aname}'")
 
         from .expressions import ValueExpression
         return ValueExpression(node=aname, namespace=self)
@@ -58,6 +69,9 @@ class Namespace(RubberObjectBase):
     #     else:
     #         raise RuleSetupError(f"Unknown type {vexpr.namespace}, expected some known namespace")
 
+def get_namespace(name: str) -> Namespace:
+    return Namespace._instances[name]
+
 # Instances - should be used as singletons
 
 # the only namespace declaration in this module
@@ -0,0 +1,244 @@
+# ------------------------------------------------------------
+# ON-DISK CACHE OF SET-UP RULES
+# ------------------------------------------------------------
+"""
+Rules.setup() (heap, type hints, extensions recursion) is done once and
+the result is pickled to local cache directory. Next process with the
+same rules definition loads finished Rules object instead.
+
+Cache file is keyed by fingerprint of:
+    - rules definition - all component attributes before setup
+    - source (or annotations) of all model classes reachable from bound
+      models, source of provider functions
+    - source of this package and python version - pickled objects
+      depend on them
+
+Any problem with cache file (missing, corrupted, not loadable) falls back
+to normal setup. NOTE: cache files are unpickled - cache directory
+should not be writable by untrusted parties.
+"""
+from __future__ import annotations
+
+import hashlib
+import inspect
+import os
+import pickle
+import re
+import sys
+import tempfile
+from dataclasses import is_dataclass, fields as dc_fields
+from enum import Enum
+from functools import partial
+from typing import Any, List, Optional, Set
+
+from .utils import is_pydantic
+from .exceptions import RuleError
+from .base import warn, extract_py_type_hints
+from .expressions import ValueExpression, Operation, get_structural_key
+from .containers import Rules
+
+# ------------------------------------------------------------
+
+CACHE_FILE_SUFFIX = ".rules.pickle"
+
+# e.g. <function f at 0x7f...> - differs between processes
+RE_MEMORY_ADDRESS = re.compile(r" at 0x[0-9a-fA-F]+")
+
+_package_fingerprint: Optional[str] = None
+
+# ------------------------------------------------------------
+
+def get_rules_fingerprint(rules: Rules) -> str:
+    """ sha256 of rules definition - call before setup(), setup changes
+        component attributes
+    """
+    if rules.is_finished():
+        raise RuleError(owner=rules, msg="Fingerprint should be calculated before setup().")
+    fingerprinter = _Fingerprinter()
+    fingerprinter.add_value(rules)
+    fingerprinter.add_classes()
+    out = [_get_package_fingerprint(), sys.version] + fingerprinter.out
+    return hashlib.sha256("\n".join(out).encode("utf-8")).hexdigest()
+
+
+def get_cache_file_path(rules: Rules, cache_dir: str, fingerprint: str) -> str:
+    return os.path.join(cache_dir, f"{rules.name}-{fingerprint[:32]}{CACHE_FILE_SUFFIX}")
+
+
+def setup_rules_cached(rules: Rules, cache_dir: str) -> Rules:
+    """ returns finished Rules - loaded from cache_dir when found, otherwise
+        rules.setup() is called and result is stored to cache_dir.
+        NOTE: returned object is not the same as rules argument on cache hit.
+    """
+    fingerprint = get_rules_fingerprint(rules)
+    file_path = get_cache_file_path(rules, cache_dir, fingerprint)
+
+    loaded = _load(file_path)
+    if loaded is not None:
+        return loaded
+
+    rules.setup()
+    _store(rules, cache_dir, file_path)
+    return rules
+
+
+def dump_rules(rules: Rules) -> bytes:
+    """ pickled Rules, e.g. for process pool workers - finished Rules can be
+        used without setup() after load_rules(). Derived values (compiled
+        read functions, cached paths, DataVar cache values, choice indexes,
+        dependency graphs, shared subexpression slots) are not stored, they
+        are made again on first use.
+    """
+    return pickle.dumps(rules, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_rules(data: bytes) -> Rules:
+    rules = pickle.loads(data)
+    if not isinstance(rules, Rules):
+        raise RuleError(msg=f"Expected pickled Rules object, got: {type(rules)}")
+    return rules
+
+
+def _load(file_path: str) -> Optional[Rules]:
+    if not os.path.exists(file_path):
+        return None
+    try:
+        with open(file_path, "rb") as file_in:
+            loaded = load_rules(file_in.read())
+        if not loaded.is_finished():
+            raise ValueError("Rules object is not finished")
+    except Exception as ex:
+        warn(f"Rules setup cache file {file_path} can not be loaded, setup is done again: {ex}")
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+        return None
+    return loaded
+
+
+def _store(rules: Rules, cache_dir: str, file_path: str):
+    # written to temporary file first - concurrent processes can read
+    # only complete file
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file_out:
+            file_out.write(dump_rules(rules))
+        os.replace(tmp_path, file_path)
+    except Exception as ex:
+        warn(f"Rules setup cache file {file_path} can not be stored: {ex}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _get_package_fingerprint() -> str:
+    " source of all package modules, calculated once "
+    global _package_fingerprint
+    if _package_fingerprint is None:
+        digest = hashlib.sha256()
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        for dir_path, dir_names, file_names in os.walk(package_dir):
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                if file_name.endswith(".py"):
+                    with open(os.path.join(dir_path, file_name), "rb") as file_in:
+                        digest.update(file_in.read())
+        _package_fingerprint = digest.hexdigest()
+    return _package_fingerprint
+
+# ------------------------------------------------------------
+
+class _Fingerprinter:
+    """ canonical text of object tree - stable between processes (no
+        memory addresses, no set ordering)
+    """
+
+    def __init__(self):
+        self.out: List[str] = []
+        self.classes: List[type] = []
+        self._seen_ids: Set[int] = set()
+
+    def add_value(self, value: Any, indent: str = ""):
+        out = self.out
+        if value is None or isinstance(value, (bool, int, float, str, bytes)):
+            out.append(f"{indent}{value!r}")
+        elif isinstance(value, (ValueExpression, Operation)):
+            # structure only (namespace, path, ops) - str() of literals can hold memory addresses
+            key = get_structural_key(value)
+            out.append(f"{indent}vexp:{RE_MEMORY_ADDRESS.sub('', repr(key))}")
+        elif isinstance(value, Enum):
+            out.append(f"{indent}enum:{self._get_name(type(value))}.{value.name}")
+        elif isinstance(value, type):
+            self._add_class(value)
+            out.append(f"{indent}class:{self._get_name(value)}")
+        elif isinstance(value, (list, tuple)):
+            out.append(f"{indent}{type(value).__name__}:")
+            for item in value:
+                self.add_value(item, indent + " ")
+        elif isinstance(value, dict):
+            out.append(f"{indent}dict:")
+            for key in sorted(value, key=repr):
+                out.append(f"{indent} {key!r}:")
+                self.add_value(value[key], indent + "  ")
+        elif isinstance(value, (set, frozenset)):
+            out.append(f"{indent}set:{sorted([repr(item) for item in value])}")
+        elif isinstance(value, partial):
+            out.append(f"{indent}partial:")
+            self.add_value(value.func, indent + " ")
+            self.add_value(list(value.args), indent + " ")
+            self.add_value(value.keywords, indent + " ")
+        elif is_dataclass(value):
+            if id(value) in self._seen_ids:
+                out.append(f"{indent}seen:{type(value).__name__}")
+                return
+            self._seen_ids.add(id(value))
+            out.append(f"{indent}{self._get_name(type(value))}:")
+            for dc_field in dc_fields(value):
+                if dc_field.init:
+                    out.append(f"{indent} {dc_field.name}=")
+                    self.add_value(getattr(value, dc_field.name, None), indent + "  ")
+        elif callable(value):
+            out.append(f"{indent}callable:{self._get_name(value)}:{self._get_source(value)}")
+        else:
+            out.append(f"{indent}{type(value).__name__}:{RE_MEMORY_ADDRESS.sub('', repr(value))}")
+
+    def add_classes(self):
+        " model classes with all classes referenced in their type hints "
+        done = set()
+        nr = 0
+        while nr<len(self.classes):
+            klass = self.classes[nr]
+            nr += 1
+            if klass in done:
+                continue
+            done.add(klass)
+            self.out.append(f"class {self._get_name(klass)}:{self._get_source(klass)}")
+            if is_dataclass(klass) or is_pydantic(klass):
+                type_hints = extract_py_type_hints(klass, "setup_cache", strict=False)
+                for type_hint in type_hints.values():
+                    self._add_type_hint_classes(type_hint)
+
+    def _add_class(self, klass: type):
+        if is_dataclass(klass) or is_pydantic(klass):
+            self.classes.append(klass)
+
+    def _add_type_hint_classes(self, type_hint: Any):
+        # e.g. Optional[List[Address]]
+        if isinstance(type_hint, type):
+            self._add_class(type_hint)
+        for arg in getattr(type_hint, "__args__", None) or ():
+            self._add_type_hint_classes(arg)
+
+    @staticmethod
+    def _get_name(value: Any) -> str:
+        return f"{getattr(value, '__module__', '')}.{getattr(value, '__qualname__', type(value).__name__)}"
+
+    @staticmethod
+    def _get_source(value: Any) -> str:
+        try:
+            return inspect.getsource(value)
+        except (OSError, TypeError):
+            # e.g. builtins, classes created dynamically
+            annotations = getattr(value, "__annotations__", None)
+            return RE_MEMORY_ADDRESS.sub("", repr(annotations))
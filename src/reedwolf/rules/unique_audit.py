@@ -0,0 +1,157 @@
+# ------------------------------------------------------------
+# BATCH AUDIT OF UNIQUE KEYS - EXTERNAL MEMORY SORT
+# ------------------------------------------------------------
+"""
+One-off check of Unique.Global over datasets larger than memory (e.g.
+export of whole table), where even a set of keys does not fit in memory.
+
+    1. keys are extracted with compiled getter of Unique.Global
+       (get_key()), collected with item position until memory budget is
+       reached, sorted and spilled to temporary file (sorted run)
+    2. runs are merged (k-way, heapq.merge) - equal keys come together,
+       groups with more than one position are reported. When there are
+       more runs than MERGE_FAN_IN, they are merged to longer runs first.
+
+Entries are sorted by key text (unique_index.get_key_text()) - total order
+for any keys (mixed types, None, frozensets of to_hashable()), equal
+exactly when keys are equal as in unique indexes.
+
+O(n log n), files are written and read sequentially. Memory is bounded by
+memory_budget (estimate) and one block per run while merging.
+"""
+from __future__ import annotations
+
+import heapq
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+from collections import namedtuple
+from itertools import groupby, islice
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+from .exceptions import RuleValidationValueError
+from .unique_index import get_key_text
+from .utils import UNDEFINED
+
+# ------------------------------------------------------------
+
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+
+# max number of runs merged at once - open files and read buffers
+MERGE_FAN_IN = 64
+
+# entries per pickle.dump() in run files
+BLOCK_SIZE = 1000
+
+# estimate of list slot + (key text, position, key) tuple + position int
+ENTRY_OVERHEAD = 8 + 64 + 28
+
+# key - as returned by Unique.Global.get_key(), positions - of items in
+# input, sorted
+DuplicateGroup = namedtuple("DuplicateGroup", ["key", "positions"])
+
+# (key text, position, key) - positions are unique, keys are never compared
+Entry = Tuple[str, int, Any]
+
+# ------------------------------------------------------------
+
+def audit_unique(unique: Any, items: Iterable[Any],
+                 memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                 tmp_dir: Optional[str] = None) -> Iterator[DuplicateGroup]:
+    """
+    Yields DuplicateGroup for each key found more than once in items, in
+    key text order. unique - Unique.Global or Unique.Children after setup.
+    Temporary files are created in tmp_dir (default - system temp
+    directory) and removed when generator is finished or closed.
+    """
+    if memory_budget<1:
+        raise RuleValidationValueError(owner=unique, msg=f"memory_budget={memory_budget} should be positive.")
+
+    run_dir = tempfile.mkdtemp(prefix="unique_audit_", dir=tmp_dir)
+    try:
+        runs, buffer = _write_runs(unique, items, memory_budget, run_dir)
+        if buffer is not None:
+            # everything fit in memory
+            entries = iter(buffer)
+        else:
+            while len(runs)>MERGE_FAN_IN:
+                runs = [_merge_to_file(runs[start:start + MERGE_FAN_IN], run_dir)
+                        for start in range(0, len(runs), MERGE_FAN_IN)]
+            entries = heapq.merge(*[_read_run(run) for run in runs])
+
+        for _, group in groupby(entries, key=lambda entry: entry[0]):
+            first = next(group)
+            second = next(group, None)
+            if second is not None:
+                positions = [first[1], second[1]] + [entry[1] for entry in group]
+                yield DuplicateGroup(first[2], positions)
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def _write_runs(unique: Any, items: Iterable[Any], memory_budget: int,
+                run_dir: str) -> Tuple[List[str], Optional[List[Entry]]]:
+    " file names of sorted runs, or sorted in-memory entries when all fits in budget "
+    runs = []
+    buffer: List[Entry] = []
+    buffer_size = 0
+    get_key = unique.get_key
+    for position, item in enumerate(items):
+        key = get_key(item)
+        if key is UNDEFINED:
+            continue
+        key_text = get_key_text(key)
+        buffer.append((key_text, position, key))
+        buffer_size += sys.getsizeof(key_text) + _get_key_size(key) + ENTRY_OVERHEAD
+        if buffer_size>=memory_budget:
+            buffer.sort()
+            runs.append(_write_run(buffer, run_dir))
+            buffer, buffer_size = [], 0
+
+    buffer.sort()
+    if not runs:
+        return runs, buffer
+    if buffer:
+        runs.append(_write_run(buffer, run_dir))
+    return runs, None
+
+
+def _get_key_size(key: Any) -> int:
+    if isinstance(key, tuple):
+        return sys.getsizeof(key) + sum([sys.getsizeof(value) for value in key])
+    return sys.getsizeof(key)
+
+
+# ------------------------------------------------------------
+# Run files - sequence of pickled blocks of sorted entries
+# ------------------------------------------------------------
+
+def _write_run(entries: Iterable[Entry], run_dir: str) -> str:
+    fd, file_path = tempfile.mkstemp(dir=run_dir, suffix=".run")
+    with os.fdopen(fd, "wb") as file_out:
+        entries = iter(entries)
+        while True:
+            block = list(islice(entries, BLOCK_SIZE))
+            if not block:
+                break
+            pickle.dump(block, file_out, protocol=pickle.HIGHEST_PROTOCOL)
+    return file_path
+
+
+def _read_run(file_path: str) -> Iterator[Entry]:
+    with open(file_path, "rb") as file_in:
+        while True:
+            try:
+                block = pickle.load(file_in)
+            except EOFError:
+                return
+            yield from block
+
+
+def _merge_to_file(runs: List[str], run_dir: str) -> str:
+    file_path = _write_run(heapq.merge(*[_read_run(run) for run in runs]), run_dir)
+    for run in runs:
+        os.remove(run)
+    return file_path
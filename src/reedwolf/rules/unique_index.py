@@ -0,0 +1,310 @@
+# ------------------------------------------------------------
+# INDEXES OF STORED UNIQUE KEYS - FOR Unique.Global
+# ------------------------------------------------------------
+"""
+Unique.Global checks key of each item against keys of all stored items
+(e.g. whole table). Instead of scanning the table on every save, keys are
+kept in an index:
+
+    - populated incrementally - Unique.Global.add_saved(), called by
+      BoundModelWithHandlers.save() after save_handler
+    - checked in O(1) per item while validating
+    - rebuilt in bulk for initial load - Unique.Global.rebuild_index()
+
+Key maps to record id (value of Unique.Global.id_field) - item with the
+same key and the same record id is the same record (update), not a
+duplicate. Keys and record ids are compared by text from get_key_text()
+in all implementations - equal when python values are equal (e.g. 1, 1.0
+and True), and the same text can be stored in files.
+
+Implementations:
+    MemoryUniqueIndex   - dict in process memory
+    SqliteUniqueIndex   - local SQLite file, persistent across processes,
+                          optional BloomFilter pre-check keeps "definitely
+                          new" keys off the disk
+"""
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+import re
+import sqlite3
+from fractions import Fraction
+from itertools import islice
+from numbers import Number
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+from .exceptions import RuleSetupError, RuleSetupValueError
+from .utils import UNDEFINED
+
+# ------------------------------------------------------------
+
+# (key, record id) - record id is None when Unique.Global.id_field is not set
+IndexEntry = Tuple[Hashable, Any]
+
+# entries per executemany() call in bulk rebuild
+REBUILD_CHUNK_SIZE = 10000
+
+RE_TABLE_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# ------------------------------------------------------------
+
+def get_key_text(value: Any) -> str:
+    """ canonical text of unique key or record id - equal for values equal
+        in python: numbers by exact value (1 == 1.0 == True == Decimal(1)),
+        items of tuples in order, items of frozensets (see
+        validations.to_hashable()) in any order. Other values by repr().
+    """
+    if isinstance(value, Number) and not isinstance(value, complex):
+        try:
+            fraction = Fraction(value)
+        except (ValueError, OverflowError, TypeError):
+            # nan, inf
+            return repr(value)
+        if fraction.denominator==1:
+            return str(fraction.numerator)
+        return f"{fraction.numerator}/{fraction.denominator}"
+    if isinstance(value, tuple):
+        return f"({', '.join([get_key_text(item) for item in value])})"
+    if isinstance(value, (frozenset, set)):
+        return f"{{{', '.join(sorted([get_key_text(item) for item in value]))}}}"
+    return repr(value)
+
+# ------------------------------------------------------------
+
+class UniqueIndexBase:
+    " stored unique keys -> record id, see Unique.Global "
+
+    def contains(self, key: Hashable, exclude_record_id: Any = None) -> bool:
+        """
+        True when key is stored for some other record
+            exclude_record_id - record id of checked item, key stored for
+                                the same record is not a duplicate.
+                                None - any stored key is a duplicate
+        """
+        raise NotImplementedError("abstract method")
+
+    def add(self, key: Hashable, record_id: Any = None):
+        " stores key of saved item, previous key of the same record is removed "
+        raise NotImplementedError("abstract method")
+
+    def discard(self, key: Hashable):
+        raise NotImplementedError("abstract method")
+
+    def rebuild(self, entries: Iterable[IndexEntry]):
+        " removes all keys and stores entries - initial load "
+        raise NotImplementedError("abstract method")
+
+    def __len__(self):
+        raise NotImplementedError("abstract method")
+
+# ------------------------------------------------------------
+# MemoryUniqueIndex
+# ------------------------------------------------------------
+
+class MemoryUniqueIndex(UniqueIndexBase):
+
+    def __init__(self):
+        # texts of keys and record ids, see get_key_text()
+        self._record_ids: Dict[str, Optional[str]] = {}
+        # record id -> key, to remove previous key when record is changed
+        self._keys: Dict[str, str] = {}
+
+    def __repr__(self):
+        return "MemoryUniqueIndex()"
+
+    def contains(self, key: Hashable, exclude_record_id: Any = None) -> bool:
+        record_id = self._record_ids.get(get_key_text(key), UNDEFINED)
+        if record_id is UNDEFINED:
+            return False
+        return exclude_record_id is None or record_id!=get_key_text(exclude_record_id)
+
+    def add(self, key: Hashable, record_id: Any = None):
+        key = get_key_text(key)
+        if record_id is not None:
+            record_id = get_key_text(record_id)
+        previous_record_id = self._record_ids.get(key, None)
+        if previous_record_id is not None and previous_record_id!=record_id:
+            self._keys.pop(previous_record_id, None)
+        if record_id is not None:
+            old_key = self._keys.get(record_id, None)
+            if old_key is not None and old_key!=key:
+                self._record_ids.pop(old_key, None)
+            self._keys[record_id] = key
+        self._record_ids[key] = record_id
+
+    def discard(self, key: Hashable):
+        record_id = self._record_ids.pop(get_key_text(key), None)
+        if record_id is not None:
+            self._keys.pop(record_id, None)
+
+    def rebuild(self, entries: Iterable[IndexEntry]):
+        self._record_ids.clear()
+        self._keys.clear()
+        for key, record_id in entries:
+            self.add(key, record_id)
+
+    def __len__(self):
+        return len(self._record_ids)
+
+# ------------------------------------------------------------
+# SqliteUniqueIndex
+# ------------------------------------------------------------
+
+class SqliteUniqueIndex(UniqueIndexBase):
+    """
+    Keys and record ids are stored as text from get_key_text().
+
+        bloom_capacity   - expected number of keys, enables BloomFilter.
+                           Filter is filled from file on first use and
+                           with each add(). Removed keys stay in filter -
+                           they only cost extra disk lookup. When key is
+                           not in filter and other connections (processes)
+                           have written to file since filter was filled
+                           (PRAGMA data_version), filter is filled again.
+    """
+
+    def __init__(self, file_path: str, table_name: str = "unique_keys",
+                 bloom_capacity: Optional[int] = None, bloom_error_rate: float = 0.01):
+        if not RE_TABLE_NAME.match(table_name):
+            raise RuleSetupValueError(msg=f"Invalid table name: {table_name}")
+        # absolute - the same file when unpickled in other process
+        self.file_path = os.path.abspath(file_path)
+        self.table_name = table_name
+        self.bloom_capacity = bloom_capacity
+        self.bloom_error_rate = bloom_error_rate
+        self._connection: Optional[sqlite3.Connection] = None
+        self._bloom_filter: Optional[BloomFilter] = None
+        # data_version of connection when bloom filter was filled
+        self._bloom_data_version: Optional[int] = None
+
+    def __repr__(self):
+        return f"SqliteUniqueIndex({self.file_path!r}, {self.table_name!r})"
+
+    def __getstate__(self):
+        # connection and bloom filter are made again on first use
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        state["_bloom_filter"] = None
+        state["_bloom_data_version"] = None
+        return state
+
+    def _get_connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.file_path)
+            self._connection.execute(f"CREATE TABLE IF NOT EXISTS {self.table_name} "
+                                     "(key TEXT PRIMARY KEY, record_id TEXT)")
+            self._connection.execute(f"CREATE INDEX IF NOT EXISTS {self.table_name}__record_id "
+                                     f"ON {self.table_name} (record_id)")
+            self._connection.commit()
+        return self._connection
+
+    def _get_bloom_filter(self) -> Optional[BloomFilter]:
+        if self.bloom_capacity is not None and self._bloom_filter is None:
+            self._load_bloom_filter()
+        return self._bloom_filter
+
+    def _load_bloom_filter(self):
+        bloom_filter = BloomFilter(capacity=self.bloom_capacity, error_rate=self.bloom_error_rate)
+        # read before keys - write during load makes filter stale, not wrong
+        self._bloom_data_version = self._get_data_version()
+        for (key_text,) in self._get_connection().execute(f"SELECT key FROM {self.table_name}"):
+            bloom_filter.add(key_text)
+        self._bloom_filter = bloom_filter
+
+    def _get_data_version(self) -> int:
+        # changed only by commits of other connections, not by this one
+        return self._get_connection().execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    # ------------------------------------------------------------
+
+    def contains(self, key: Hashable, exclude_record_id: Any = None) -> bool:
+        key_text = get_key_text(key)
+        bloom_filter = self._get_bloom_filter()
+        if bloom_filter is not None and key_text not in bloom_filter:
+            if self._get_data_version()==self._bloom_data_version:
+                return False
+            # keys stored by other connections could be missing in filter
+            self._load_bloom_filter()
+            if key_text not in self._bloom_filter:
+                return False
+        row = self._get_connection().execute(
+                f"SELECT record_id FROM {self.table_name} WHERE key=?", (key_text,)).fetchone()
+        if row is None:
+            return False
+        return exclude_record_id is None or row[0]!=get_key_text(exclude_record_id)
+
+    def add(self, key: Hashable, record_id: Any = None):
+        key_text = get_key_text(key)
+        connection = self._get_connection()
+        with connection:
+            if record_id is not None:
+                connection.execute(f"DELETE FROM {self.table_name} WHERE record_id=? AND key<>?",
+                                   (get_key_text(record_id), key_text))
+            connection.execute(f"INSERT OR REPLACE INTO {self.table_name} (key, record_id) VALUES (?, ?)",
+                               (key_text, None if record_id is None else get_key_text(record_id)))
+        bloom_filter = self._get_bloom_filter()
+        if bloom_filter is not None:
+            bloom_filter.add(key_text)
+
+    def discard(self, key: Hashable):
+        connection = self._get_connection()
+        with connection:
+            connection.execute(f"DELETE FROM {self.table_name} WHERE key=?", (get_key_text(key),))
+
+    def rebuild(self, entries: Iterable[IndexEntry]):
+        " single transaction, entries are consumed in chunks "
+        connection = self._get_connection()
+        rows = ((get_key_text(key), None if record_id is None else get_key_text(record_id)) for key, record_id in entries)
+        with connection:
+            connection.execute(f"DELETE FROM {self.table_name}")
+            while True:
+                chunk = list(islice(rows, REBUILD_CHUNK_SIZE))
+                if not chunk:
+                    break
+                connection.executemany(f"INSERT OR REPLACE INTO {self.table_name} (key, record_id) VALUES (?, ?)", chunk)
+        # filled again from file on first use
+        self._bloom_filter = None
+
+    def __len__(self):
+        return self._get_connection().execute(f"SELECT COUNT(*) FROM {self.table_name}").fetchone()[0]
+
+# ------------------------------------------------------------
+# BloomFilter
+# ------------------------------------------------------------
+
+class BloomFilter:
+    """
+    Set membership with false positives only - "not in" is certain.
+    Bit array size and number of hashes are computed from expected
+    capacity and false positive error rate. Positions are made by double
+    hashing of single blake2b digest.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        if capacity<1 or not (0<error_rate<1):
+            raise RuleSetupError(msg=f"BloomFilter needs capacity>=1 and 0<error_rate<1, got: {capacity}, {error_rate}")
+        self.bits_count = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hashes_count = max(1, int(round(self.bits_count / capacity * math.log(2))))
+        self._bits = bytearray((self.bits_count + 7) // 8)
+
+    def __repr__(self):
+        return f"BloomFilter(bits={self.bits_count}, hashes={self.hashes_count})"
+
+    def _get_positions(self, value: str) -> Iterable[int]:
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(first + nr * second) % self.bits_count for nr in range(self.hashes_count)]
+
+    def add(self, value: str):
+        for position in self._get_positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._get_positions(value))
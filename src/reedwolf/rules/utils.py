@@ -1,6 +1,9 @@
 from enum import Enum
 from typing import Callable, Any, List, _GenericAlias
 from functools import reduce
+from importlib import import_module
+from types import ModuleType
+from operator import attrgetter, methodcaller
 from dataclasses import Field as DcField, is_dataclass
 try:
     # imported and used in other modules - e.g. base.py
@@ -40,6 +43,9 @@ class UndefinedType:
         return False 
     def __ne__(self, other):
         return not self.__eq__(other)
+    def __reduce__(self):
+        # singleton - pickle / copy by module global name
+        return "UNDEFINED"
     __repr__ = __str__
 
 UNDEFINED = UndefinedType()
@@ -48,18 +54,72 @@ UNDEFINED = UndefinedType()
 # Utility functions ...
 # ------------------------------------------------------------
 
-# nije ok ...
 def composite_functions(*func:Callable[..., Any]) -> Callable[..., Any]:
     # inspired https://www.geeksforgeeks.org/function-composition-in-python/ 
     # TODO: see kwargs exmple at: https://mathieularose.com/function-composition-in-python
     """ accepts N number of function as an 
         argument and then compose them 
-        returning single function that can be applied with """
+        returning single function that can be applied with.
+        Functions are applied from left to right, i.e.
+            composite_functions(f, g)(x) == g(f(x))
+    """
+    if len(func)==1:
+        # no need for additional wrapper
+        return func[0]
+
     def compose(f, g):
-        return lambda x : f(g(x))
+        return lambda x : g(f(x))
               
     return reduce(compose, func, lambda x : x)
 
+def get_none_safe_attrgetter(*attr_paths: str) -> Callable[[Any], Any]:
+    """ returns fused getter for dotted attribute path, e.g. "company.address.street".
+        Normally it is a single operator.attrgetter() call. When some object
+        on the path is None/UNDEFINED, that value is returned instead of
+        raising AttributeError. For more paths returns tuple of values, as
+        operator.attrgetter() does.
+    """
+    getter = attrgetter(*attr_paths)
+    attr_names_list = [attr_path.split(".") for attr_path in attr_paths]
+
+    def get_value(obj, attr_names):
+        # slow path - check if some object on the path is None,
+        # otherwise AttributeError is raised again.
+        for attr_name in attr_names:
+            if obj is None or obj is UNDEFINED:
+                return obj
+            obj = getattr(obj, attr_name)
+        return obj
+
+    def none_safe_getter(obj):
+        try:
+            return getter(obj)
+        except AttributeError:
+            if len(attr_names_list)==1:
+                return get_value(obj, attr_names_list[0])
+            return tuple([get_value(obj, attr_names) for attr_names in attr_names_list])
+
+    return none_safe_getter
+
+def get_none_safe_methodcaller(method_name: str, *args, **kwargs) -> Callable[[Any], Any]:
+    """ operator.methodcaller() that skips call on None/UNDEFINED """
+    caller = methodcaller(method_name, *args, **kwargs)
+
+    def none_safe_caller(obj):
+        if obj is None or obj is UNDEFINED:
+            return obj
+        return caller(obj)
+
+    return none_safe_caller
+
+def import_runtime_module(module_name: str) -> ModuleType:
+    """ imports module of this package on first use - runtime modules
+        (evaluation, batch, choices ...) import containers / components,
+        so these can not import them at module level.
+    """
+    return import_module(f"{__package__}.{module_name}")
+
+
 def is_pydantic(maybe_pydantic_class: Any) -> bool: 
     # TODO: ALT: maybe fails for partial functions: isinstance(maybe_pydantic_class) and issubclass(maybe_pydantic_class, PydBaseModel)
     return bool(PydBaseModel) and isinstance(maybe_pydantic_class, PydModelMetaclass)
@@ -1,4 +1,4 @@
-from typing import List, Optional, Union
+from typing import Any, Callable, Hashable, Iterable, Iterator, List, Optional, Tuple, Union
 from dataclasses import dataclass, field
 
 from .exceptions import (
@@ -7,6 +7,7 @@ from .exceptions import (
         RuleSetupTypeError,
         )
 from .utils import (
+        get_none_safe_attrgetter,
         to_int,
         UNDEFINED, 
         UndefinedType,
@@ -14,6 +15,15 @@ from .utils import (
 from .base import (
         SetOwnerMixin,
         )
+from .unique_index import (
+        MemoryUniqueIndex,
+        UniqueIndexBase,
+        )
+from .unique_audit import (
+        audit_unique,
+        DuplicateGroup,
+        DEFAULT_MEMORY_BUDGET,
+        )
 
 class ChildrenValidation(SetOwnerMixin):
     def is_finished(self):
@@ -33,7 +43,19 @@ class CardinalityValidation(ChildrenValidation): # count
         """
         raise NotImplementedError("abstract method")
 
-    def validate(self, items_count:bool, raise_err:bool=True) -> bool:
+    def get_error_code(self, items_count:int) -> Optional[str]:
+        """
+        takes nr. of items and validates
+        if ok, returns None
+        if not ok, returns error code - message is formatted later with
+        get_error_msg() only when needed
+        """
+        raise NotImplementedError("abstract method")
+
+    def get_error_msg(self, error_code:str, items_count:int) -> str:
+        raise NotImplementedError("abstract method")
+
+    def validate(self, items_count:int, raise_err:bool=True) -> bool:
         """
         takes nr. of items and validates
         if ok, returns True
@@ -41,7 +63,12 @@ class CardinalityValidation(ChildrenValidation): # count
             if raise_err -> raises RuleValidationCardinalityError
             else -> return false
         """
-        raise NotImplementedError("abstract method")
+        error_code = self.get_error_code(items_count)
+        if error_code is None:
+            return True
+        if raise_err:
+            raise RuleValidationCardinalityError(owner=self, msg=self.get_error_msg(error_code, items_count))
+        return False
 
     def _validate_setup_common(self, allow_none:Optional[bool]=None) -> 'Variable':
         model_var = self.owner.get_bound_model_var()
@@ -69,16 +96,17 @@ class Cardinality: # namespace holder
             if model_var.islist():
                 raise RuleSetupTypeError(owner=self, msg=f"Type hint is List and should be single instance. Change to Range/Multi or remove type hint List[]")
 
-        def validate(self, items_count:int, raise_err:bool=True):
-            if items_count==0 and not self.allow_none:
-                if raise_err: 
-                    raise RuleValidationCardinalityError(owner=self, msg=f"Expected exactly one item, got none.")
-                return False
+        def get_error_code(self, items_count:int) -> Optional[str]:
+            if items_count==0:
+                return None if self.allow_none else "none"
             if items_count!=1:
-                if raise_err: 
-                    raise RuleValidationCardinalityError(owner=self, msg=f"Expected exactly one item, got {items_count}.")
-                return False
-            return True
+                return "not_one"
+            return None
+
+        def get_error_msg(self, error_code:str, items_count:int) -> str:
+            if error_code=="none":
+                return f"Expected exactly one item, got none."
+            return f"Expected exactly one item, got {items_count}."
 
     @dataclass
     class Range(CardinalityValidation):
@@ -113,16 +141,17 @@ class Cardinality: # namespace holder
             if not model_var.islist():
                 raise RuleSetupTypeError(owner=self, msg=f"Type hint is not List and should be. Change to Single or add List[] type hint ")
 
-        def validate(self, items_count:int, raise_err:bool=True):
+        def get_error_code(self, items_count:int) -> Optional[str]:
             if self.min and items_count < self.min:
-                if raise_err: 
-                    raise RuleValidationCardinalityError(owner=self, msg=f"Expected at least {self.min} item(s), got {items_count}.")
-                return False
-            if self.max and items_count < self.max:
-                if raise_err: 
-                    raise RuleValidationCardinalityError(owner=self, msg=f"Expected at most {self.max} items, got {items_count}.")
-                return False
-            return True
+                return "min"
+            if self.max and items_count > self.max:
+                return "max"
+            return None
+
+        def get_error_msg(self, error_code:str, items_count:int) -> str:
+            if error_code=="min":
+                return f"Expected at least {self.min} item(s), got {items_count}."
+            return f"Expected at most {self.max} items, got {items_count}."
 
     @dataclass
     class Multi(CardinalityValidation):
@@ -138,12 +167,13 @@ class Cardinality: # namespace holder
             if not model_var.islist():
                 raise RuleSetupTypeError(owner=self, msg=f"Type hint is not a List and should be. Change to Single or add List[] type hint")
 
-        def validate(self, items_count:int, raise_err:bool=True):
+        def get_error_code(self, items_count:int) -> Optional[str]:
             if items_count==0 and not self.allow_none:
-                if raise_err: 
-                    raise RuleValidationCardinalityError(owner=self, msg=f"Expected at least one item, got none.")
-                return False
-            return True
+                return "none"
+            return None
+
+        def get_error_msg(self, error_code:str, items_count:int) -> str:
+            return f"Expected at least one item, got none."
 
 
 # ------------------------------------------------------------
@@ -154,24 +184,157 @@ class UniqueValidation(ChildrenValidation):
     def __post_init__(self):
         if self.__class__==UniqueValidation:
             raise RuleSetupError(owner=self, msg=f" Use subclasses of UniqueValidation")
+        if not self.fields:
+            raise RuleSetupError(owner=self, msg=f"Please provide at least one field name")
+
+    def validate_setup(self):
+        """
+        fields are names of owner container Fields bound to the container
+        model, e.g. Field(bind=M.items.code) -> "code". Key getter is
+        precompiled - single attrgetter call per item, tuple for more fields,
+        None when some object on the path is None (e.g. "address.city").
+        if not ok, 
+            raises RuleSetupError
+        """
+        # item attribute paths, e.g. "code", "address.city"
+        self._attr_paths: List[str] = [self._get_attr_path(field_name) for field_name in self.fields]
+        self._compile_getters()
+
+    def _compile_getters(self):
+        self._get_key: Callable[[Any], Hashable] = get_none_safe_attrgetter(*self._attr_paths)
+
+    def __getstate__(self):
+        # getters are closures - compiled again in __setstate__
+        state = self.__dict__.copy()
+        state.pop("_get_key", None)
+        state.pop("_get_record_id", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "_attr_paths" in state:
+            self._compile_getters()
+
+    def _get_attr_path(self, field_name:str) -> str:
+        container = self.owner
+        bound_model_name = container.bound_model.name
+        component = container.components.get(field_name, None)
+        if component is None or not hasattr(component, "bind"):
+            raise RuleSetupError(owner=self, msg=f"Field '{field_name}' not found in {container.name}")
+        bits = [bit._node for bit in component.bind.Path]
+        if bits[0]!=bound_model_name or len(bits)<2:
+            raise RuleSetupError(owner=self, msg=f"Field '{field_name}' should be bound to attribute of model {bound_model_name}")
+        return ".".join(bits[1:])
+
+    def get_key(self, item:Any) -> Union[Hashable, UndefinedType]:
+        """ key of item, UNDEFINED when it should not be checked (ignore_none).
+            list / tuple / dict / set values are converted to hashable
+            tuple / frozenset, other unhashable values are returned as they are.
+        """
+        key = self._get_key(item)
+        if self.ignore_none:
+            if len(self.fields)==1:
+                if key is None:
+                    return UNDEFINED
+            elif None in key:
+                return UNDEFINED
+        try:
+            hash(key)
+        except TypeError:
+            key = to_hashable(key)
+        return key
+
+    def get_error_msg(self, positions:Tuple[int, ...]) -> str:
+        " positions - of items whose key was already found in previous items "
+        return f"Values of {', '.join(self.fields)} should be unique, duplicates at item position(s): {', '.join(map(str, positions))}."
 
     # def set_owner(self, owner):
     #     super().set_owner(owner)
     #     if not self.name:
     #         self.name = f"{self.owner.name}__{self.__class__.__name__.lower()}"
 
+def to_hashable(value:Any) -> Any:
+    " list, tuple -> tuple, dict -> frozenset of items, set -> frozenset - nested too "
+    if isinstance(value, (list, tuple)):
+        return tuple([to_hashable(item) for item in value])
+    if isinstance(value, dict):
+        return frozenset([(key, to_hashable(item)) for key, item in value.items()])
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
 class Unique: # namespace holder
 
     @dataclass
     class Global(UniqueValidation):
-        " globally - e.g. within table "
+        """ globally - e.g. within table. Items are checked against each
+            other (as Children) and against keys of stored items in index.
+            index       - see unique_index, default is MemoryUniqueIndex
+            id_field    - name of Field with record id (e.g. primary key),
+                          stored key of the same record is not a duplicate.
+                          When not set any stored key is a duplicate.
+        """
         name            : str
         fields          : List[str] # TODO: better field specification or vexpr?
         ignore_none     : bool = True
+        index           : Optional[UniqueIndexBase] = field(default=None, repr=False)
+        id_field        : Optional[str] = None
 
         owner           : Union['ContainerBase', UndefinedType] = field(init=False, default=UNDEFINED, repr=False)
         owner_name      : Union[str, UndefinedType] = field(init=False, default=UNDEFINED)
 
+        def __post_init__(self):
+            super().__post_init__()
+            if self.index is None:
+                self.index = MemoryUniqueIndex()
+
+        def validate_setup(self):
+            self._id_attr_path: Optional[str] = self._get_attr_path(self.id_field) if self.id_field else None
+            super().validate_setup()
+
+        def _compile_getters(self):
+            super()._compile_getters()
+            self._get_record_id: Optional[Callable[[Any], Any]] = \
+                    get_none_safe_attrgetter(self._id_attr_path) if self._id_attr_path else None
+
+        def get_record_id(self, item:Any) -> Any:
+            return self._get_record_id(item) if self._get_record_id else None
+
+        def is_stored(self, key:Hashable, item:Any) -> bool:
+            " key is stored in index for other record - O(1) "
+            try:
+                return self.index.contains(key, exclude_record_id=self.get_record_id(item))
+            except TypeError:
+                # unhashable key can not be stored in index
+                return False
+
+        def add_saved(self, items:Iterable[Any]):
+            " keys of saved items are stored to index, see BoundModelWithHandlers.save() "
+            for item in items:
+                key = self.get_key(item)
+                if key is not UNDEFINED:
+                    self.index.add(key, self.get_record_id(item))
+
+        def rebuild_index(self, items:Iterable[Any]):
+            " initial load - index is filled with keys of all stored items, consumed lazily "
+            self.index.rebuild((key, self.get_record_id(item))
+                               for item, key in ((item, self.get_key(item)) for item in items)
+                               if key is not UNDEFINED)
+
+        def audit(self, items:Iterable[Any], memory_budget:Optional[int]=None,
+                  tmp_dir:Optional[str]=None) -> Iterator[DuplicateGroup]:
+            """ batch check of all items (e.g. table export larger than
+                memory) without index - external memory sort, yields
+                DuplicateGroup(key, positions). See unique_audit.audit_unique().
+            """
+            if memory_budget is None:
+                memory_budget = DEFAULT_MEMORY_BUDGET
+            return audit_unique(self, items, memory_budget=memory_budget, tmp_dir=tmp_dir)
+
+        def get_error_msg(self, positions:Tuple[int, ...]) -> str:
+            return f"Values of {', '.join(self.fields)} should be globally unique, duplicates at item position(s): {', '.join(map(str, positions))}."
+
     @dataclass
     class Children(UniqueValidation):
         " within extension records "
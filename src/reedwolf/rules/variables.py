@@ -153,6 +153,13 @@ class VariablesHeap:
     def __repr__(self):
         return str(self)
 
+    def __getstate__(self):
+        return self.__dict__.copy()
+
+    def __setstate__(self, state):
+        # explicit - __getattr__ would be called before self.variables is set
+        self.__dict__.update(state)
+
     def __getattr__(self, attr_name:str):
         if attr_name in self.variables:
             return self.variables[attr_name]
@@ -0,0 +1,579 @@
+# ------------------------------------------------------------
+# RUNTIME - VECTORIZED EVALUATION OF VALIDATIONS OVER COLUMNS
+# ------------------------------------------------------------
+"""
+Columnar batch evaluation - instead of evaluating ValueExpressions row by
+row, Operation trees are evaluated with numpy ufuncs over whole columns.
+
+Columns are numpy arrays (or sequences) keyed by bound Variable name (the
+name in VariablesHeap, e.g. "company.hours" for M.company.hours). Result is
+boolean mask per Validation - True where validation passed or was not
+applicable (component not available, Field value is None).
+
+When Validation can not be vectorized (e.g. method calls, missing columns,
+unsupported operation) or numpy reports floating point error (division
+by zero, overflow) it falls back to row-wise evaluation with
+ValueExpression.Read(), where row values are made from the same columns.
+
+ValidationMatrix holds results of many records as single boolean matrix
+(records x checks) with summary statistics - made from column masks or
+from row-wise validation results (iter_validate(), validate_batch()).
+Check is identified by its owner component and failure code, e.g.
+required and choice checks of the same ChoiceField are different columns.
+"""
+from __future__ import annotations
+
+from collections import namedtuple
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .exceptions import (
+        RuleError,
+        RuleInternalError,
+        RuleNameNotFoundError,
+        RuleSetupError,
+        RuleValidationValueError,
+        )
+from .expressions import ValueExpression, Operation
+from .namespaces import ModelsNS, FieldsNS, DataProvidersNS, ThisNS
+from .components import ChoiceField, DataVar, Field, Section, Validation
+from .containers import ContainerBase
+from .evaluation import (
+        get_data_var_value,
+        validate_instance_failures,
+        FailureCodeEnum,
+        LazyValues,
+        ValidationFailure,
+        ValidationResult,
+        )
+from .utils import get_none_safe_attrgetter
+
+# ------------------------------------------------------------
+
+if np is not None:
+    OPCODE_TO_UFUNC = {
+          "=="  : np.equal
+        , "!="  : np.not_equal
+        , ">"   : np.greater
+        , ">="  : np.greater_equal
+        , "<"   : np.less
+        , "<="  : np.less_equal
+
+        , "+"   : np.add
+        , "-"   : np.subtract
+        , "*"   : np.multiply
+        , "/"   : np.true_divide
+        , "//"  : np.floor_divide
+
+        , "not" : np.logical_not
+        , "and" : np.logical_and
+        , "or"  : np.logical_or
+    }
+else:
+    OPCODE_TO_UFUNC = {}
+
+
+class NotVectorizableError(Exception):
+    " internal - expression can not be evaluated over columns "
+    pass
+
+# ------------------------------------------------------------
+# ColumnsEvaluator
+# ------------------------------------------------------------
+
+class ColumnsEvaluator:
+    """
+    row_wise=False - validations which can not be vectorized are not
+    evaluated row-wise, they are left out of masks (also validations of
+    components whose availability can not be vectorized).
+    """
+
+    def __init__(self, container: ContainerBase, columns: Dict[str, Any], row_wise: bool = True):
+        if np is None:
+            raise RuleSetupError(owner=container, msg="Package numpy is required for vectorized evaluation.")
+        if not container.is_finished():
+            raise RuleError(owner=container, msg="Call .setup() first")
+        if not columns:
+            raise RuleValidationValueError(owner=container, msg="At least one column is required.")
+
+        self.container = container
+        self.row_wise = row_wise
+        self.columns = {name: np.asarray(column) for name, column in columns.items()}
+        sizes = {len(column) for column in self.columns.values()}
+        if len(sizes)!=1:
+            raise RuleValidationValueError(owner=container, msg=f"All columns should have the same length, got: {sorted(sizes)}")
+        self.size = sizes.pop()
+
+        # DataVar values do not depend on rows, evaluated once when needed
+        self._data_var_values: Dict[str, Any] = {}
+        # names of validations evaluated row-wise
+        self.row_wise_names: List[str] = []
+
+    def __str__(self):
+        return f"ColumnsEvaluator({self.container.name}, size={self.size}, columns={len(self.columns)})"
+    __repr__ = __str__
+
+    # ------------------------------------------------------------
+
+    def evaluate(self) -> Dict[str, np.ndarray]:
+        " returns validation name -> boolean mask, True where passed or not applicable "
+        masks = {}
+        all_rows = np.ones(self.size, dtype=bool)
+        for component in self.container.get_children():
+            self._evaluate_component(component, all_rows, masks)
+        self._evaluate_validations(self.container.validations, all_rows, None, masks)
+        return masks
+
+    def _evaluate_component(self, component: Any, applicable: np.ndarray, masks: Dict[str, np.ndarray]):
+        if isinstance(component, (Field, Section)):
+            try:
+                applicable = applicable & self._evaluate_mask(component.available, applicable, None)
+            except NotVectorizableError:
+                # only when row_wise=False
+                return
+
+        if isinstance(component, Field):
+            column = self._get_field_column(component)
+            if component.validations:
+                if column is None:
+                    # no column - can be evaluated only when This.value is not used
+                    value_applicable = applicable
+                elif column.dtype==object:
+                    value_applicable = applicable & np.not_equal(column, None)
+                else:
+                    value_applicable = applicable
+                self._evaluate_validations(component.validations, value_applicable, column, masks)
+            for child in component.get_children():
+                self._evaluate_component(child, applicable, masks)
+
+        elif isinstance(component, Section):
+            for child in component.get_children():
+                self._evaluate_component(child, applicable, masks)
+            self._evaluate_validations(component.validations, applicable, None, masks)
+
+        # Extension - child records are not in columns, DataVar, BoundModel,
+        # ChildrenValidation - nothing to validate
+
+    def _evaluate_validations(self, validations, applicable: np.ndarray, this_column: Optional[np.ndarray], masks: Dict[str, np.ndarray]):
+        for validation in (validations or []):
+            try:
+                validation_applicable = applicable & self._evaluate_mask(validation.available, applicable, this_column)
+                ensure = self._evaluate_mask(validation.ensure, validation_applicable, this_column, name=validation.name)
+            except NotVectorizableError:
+                # only when row_wise=False
+                continue
+            masks[validation.name] = ~validation_applicable | ensure
+
+    # ------------------------------------------------------------
+
+    def _evaluate_mask(self, value: Any, applicable: np.ndarray, this_column: Optional[np.ndarray], name: Optional[str]=None) -> np.ndarray:
+        if not isinstance(value, ValueExpression):
+            return np.full(self.size, bool(value))
+        try:
+            # division by zero, overflow ... - rows are evaluated row-wise
+            # (applicable only), so error is raised as in row evaluation.
+            # Underflow is not an error in row evaluation.
+            with np.errstate(divide="raise", invalid="raise", over="raise"):
+                result = self._evaluate(value, this_column)
+            if np.ndim(result)==0:
+                return np.full(self.size, bool(result))
+            return np.asarray(result, dtype=bool)
+        except (NotVectorizableError, TypeError, ValueError, FloatingPointError) as ex:
+            if not self.row_wise:
+                raise NotVectorizableError(f"{value}: {ex}")
+            if name:
+                self.row_wise_names.append(name)
+            return self._evaluate_row_wise(value, applicable, this_column)
+
+    def _evaluate(self, node: Any, this_column: Optional[np.ndarray]) -> Any:
+        " returns numpy array or scalar "
+        if isinstance(node, Operation):
+            return self._evaluate_operation(node, this_column)
+        if not isinstance(node, ValueExpression):
+            # literal
+            return node
+
+        top = node.Path[0]
+        if isinstance(top._node, Operation):
+            if len(node.Path)!=1:
+                raise NotVectorizableError(f"{node}: attribute of operation result")
+            return self._evaluate_operation(top._node, this_column)
+
+        if [bit for bit in node.Path if bit._func_args is not None]:
+            raise NotVectorizableError(f"{node}: function calls")
+
+        namespace = node.GetNamespace()
+        if namespace==ModelsNS:
+            return self._get_column(node._var_name, node)
+
+        if namespace in (FieldsNS, DataProvidersNS):
+            if len(node.Path)!=1:
+                raise NotVectorizableError(f"{node}: only direct references are supported")
+            component = self.container.components.get(top._node, None)
+            if isinstance(component, DataVar):
+                return self._get_data_var_value(component, this_column)
+            if isinstance(component, Field) and namespace==FieldsNS:
+                column = self._get_field_column(component)
+                if column is None:
+                    raise NotVectorizableError(f"{node}: no column for bound variable")
+                return column
+            raise NotVectorizableError(f"{node}: component not supported")
+
+        if namespace==ThisNS:
+            if len(node.Path)!=1 or top._node!="value" or this_column is None:
+                raise NotVectorizableError(f"{node}: only This.value of Field is supported")
+            return this_column
+
+        raise NotVectorizableError(f"{node}: namespace {namespace} is not supported")
+
+    def _evaluate_operation(self, operation: Operation, this_column: Optional[np.ndarray]) -> Any:
+        first = self._evaluate(operation.first, this_column)
+        if operation.is_unary():
+            return OPCODE_TO_UFUNC[operation.op](first)
+
+        second = self._evaluate(operation.second, this_column)
+        if operation.op=="in":
+            # operator.contains(first, second) => second in first
+            if np.ndim(first)==0 and np.ndim(second)>0 and isinstance(first, (list, tuple, set, frozenset)):
+                return np.isin(second, list(first))
+            raise NotVectorizableError(f"{operation}: only <column> in <list of values> is supported")
+
+        ufunc = OPCODE_TO_UFUNC.get(operation.op, None)
+        if ufunc is None:
+            raise NotVectorizableError(f"{operation}: operation is not supported")
+        return ufunc(first, second)
+
+    # ------------------------------------------------------------
+
+    def _get_column(self, var_name: Optional[str], node: Any) -> np.ndarray:
+        if not var_name or var_name not in self.columns:
+            raise NotVectorizableError(f"{node}: column {var_name} not found")
+        return self.columns[var_name]
+
+    def _get_field_column(self, field: Field) -> Optional[np.ndarray]:
+        if not field.bound_variable:
+            return None
+        return self.columns.get(field.bound_variable.name, None)
+
+    def _get_data_var_value(self, data_var: DataVar, this_column: Optional[np.ndarray]) -> Any:
+        if isinstance(data_var.value, ValueExpression):
+            return self._evaluate(data_var.value, this_column)
+        if data_var.cache_key is not None:
+            raise NotVectorizableError(f"{data_var.name}: provider value depends on cache_key")
+        if data_var.name not in self._data_var_values:
+            self._data_var_values[data_var.name] = get_data_var_value(data_var, None)
+        return self._data_var_values[data_var.name]
+
+    # ------------------------------------------------------------
+    # Row-wise fallback
+    # ------------------------------------------------------------
+
+    def _evaluate_row_wise(self, vexp: ValueExpression, applicable: np.ndarray, this_column: Optional[np.ndarray]) -> np.ndarray:
+        " evaluates only applicable rows, others are True "
+        result = np.ones(self.size, dtype=bool)
+        for index in np.flatnonzero(applicable):
+            ctx = self._create_row_context(index, this_column)
+            result[index] = bool(vexp.Read(ctx))
+        return result
+
+    def _create_row_context(self, index: int, this_column: Optional[np.ndarray]) -> SimpleNamespace:
+        " same structure as evaluation.EvaluationContext, values are made from columns "
+        models = SimpleNamespace()
+        # shorter first - so parent objects are set before attributes
+        for var_name in sorted(self.columns, key=len):
+            holder = models
+            bits = var_name.split(".")
+            for bit in bits[:-1]:
+                if not hasattr(holder, bit):
+                    setattr(holder, bit, SimpleNamespace())
+                holder = getattr(holder, bit)
+                if not isinstance(holder, SimpleNamespace):
+                    # real object from column - has own attributes
+                    break
+            else:
+                setattr(holder, bits[-1], _get_row_value(self.columns[var_name], index))
+
+        # DataVars are loaded on first read as in EvaluationContext, values
+        # not depending on the row are evaluated once for all rows
+        data_var_names = [component_name for component_name, component in self.container.components.items()
+                          if isinstance(component, DataVar)]
+
+        def load_data_var_value(data_var_name: str) -> Any:
+            data_var = self.container.components[data_var_name]
+            if isinstance(data_var.value, ValueExpression) or data_var.cache_key is not None:
+                value = get_data_var_value(data_var, ctx)
+            else:
+                value = self._get_data_var_value(data_var, this_column)
+            setattr(ctx.DataProviders, data_var_name, value)
+            setattr(ctx.Fields, data_var_name, value)
+            return value
+
+        ctx = SimpleNamespace(Models=models,
+                              Fields=LazyValues(load_data_var_value, data_var_names),
+                              DataProviders=LazyValues(load_data_var_value, data_var_names),
+                              Context=SimpleNamespace(), Utils=SimpleNamespace(), This=SimpleNamespace(),
+                              shared_values={}, async_values=None)
+        for component_name, component in self.container.components.items():
+            if isinstance(component, Field):
+                column = self._get_field_column(component)
+                if column is not None:
+                    setattr(ctx.Fields, component_name, _get_row_value(column, index))
+
+        bound_model_name = self.container.bound_model.name
+        ctx.This.value = (_get_row_value(this_column, index) if this_column is not None
+                          else getattr(models, bound_model_name, None))
+        return ctx
+
+
+def _get_row_value(column: np.ndarray, index: int) -> Any:
+    # numpy scalars to python values - operations behave as in row
+    # evaluation (e.g. 1 / 0 raises, not inf)
+    value = column[index]
+    return value.item() if isinstance(value, np.generic) else value
+
+# ------------------------------------------------------------
+
+def validate_columns(container: ContainerBase, columns: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    return ColumnsEvaluator(container=container, columns=columns).evaluate()
+
+
+# ------------------------------------------------------------
+# ValidationMatrix
+# ------------------------------------------------------------
+
+# rows per block in co-failure counting - float64 block products are exact
+CO_FAILURE_BLOCK_SIZE = 1 << 16
+
+# ValidationMatrix column - owner component and FailureCodeEnum
+Check = namedtuple("Check", ["owner", "code"])
+
+
+class ValidationMatrix:
+    """
+    Boolean matrix records x checks, True where check failed. Checks are
+    Validations, required Fields, ChoiceFields and extension children
+    validations (cardinality, unique), column per Check (see
+    get_checks()). Stored column-wise (Fortran order) - statistics are
+    computed per column. 1 byte per cell instead of error objects per
+    record.
+    """
+
+    def __init__(self, names: List[str], failed: np.ndarray, checks: Optional[List[Check]] = None):
+        if np is None:
+            raise RuleSetupError(msg="Package numpy is required for ValidationMatrix.")
+        if failed.ndim!=2 or failed.shape[1]!=len(names):
+            raise RuleInternalError(msg=f"Matrix shape {failed.shape} does not match number of names {len(names)}")
+        self.names = list(names)
+        self.failed = np.asarray(failed, dtype=bool, order="F")
+        # None when made from masks - only names are known
+        self.checks = list(checks) if checks is not None else None
+        self._positions = {name: nr for nr, name in enumerate(self.names)}
+
+    def __str__(self):
+        return f"ValidationMatrix(records={self.failed.shape[0]}, checks={len(self.names)})"
+    __repr__ = __str__
+
+    def __len__(self):
+        return self.failed.shape[0]
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        " failed mask of check name "
+        return self.failed[:, self._get_position(name)]
+
+    def _get_position(self, name: str) -> int:
+        if name not in self._positions:
+            raise RuleNameNotFoundError(msg=f"Check '{name}' not found, available: {self.names}")
+        return self._positions[name]
+
+    # ------------------------------------------------------------
+
+    @classmethod
+    def from_masks(cls, masks: Dict[str, np.ndarray]) -> ValidationMatrix:
+        " masks - check name -> boolean mask, True where passed, see validate_columns() "
+        names = list(masks)
+        size = len(next(iter(masks.values()))) if masks else 0
+        failed = np.empty((size, len(names)), dtype=bool, order="F")
+        for nr, name in enumerate(names):
+            np.logical_not(masks[name], out=failed[:, nr])
+        return cls(names, failed)
+
+    @classmethod
+    def from_results(cls, checks: Dict[str, Check], results: Iterable[ValidationResult],
+                     size: Optional[int] = None) -> ValidationMatrix:
+        """ checks - check name -> Check, see get_checks().
+            results - ValidationResult in any order, e.g. iter_validate(),
+            validate_batch(ordered=False). Errors can be RuleError or
+            ValidationFailure - error is matched to Check by its owner and
+            failure code (by error class for RuleError). When size is not
+            given the matrix grows as needed.
+        """
+        positions = {(id(check.owner), check.code): nr for nr, check in enumerate(checks.values())}
+        failed = np.zeros((size or 0, len(checks)), dtype=bool, order="F")
+        records_count = size or 0
+        for index, errors in results:
+            if index>=failed.shape[0]:
+                # double the capacity - amortized O(1) per record
+                grown = np.zeros((max(index + 1, 2 * failed.shape[0], 16), len(checks)), dtype=bool, order="F")
+                grown[:failed.shape[0]] = failed
+                failed = grown
+            records_count = max(records_count, index + 1)
+            for error in errors:
+                position = positions.get((id(error.owner), get_failure_code(error)), None)
+                if position is None:
+                    raise RuleInternalError(owner=error.owner, msg=f"Check of {error} not found in: {list(checks)}")
+                failed[index, position] = True
+        return cls(list(checks), failed[:records_count], list(checks.values()))
+
+    # ------------------------------------------------------------
+
+    def get_failure_counts(self) -> Dict[str, int]:
+        " check name -> number of records where it failed "
+        return dict(zip(self.names, self.failed.sum(axis=0).tolist()))
+
+    def get_top_failing(self, k: int) -> List[Tuple[str, int]]:
+        " k checks with most failures, (name, count) - ties in names order "
+        counts = self.failed.sum(axis=0)
+        order = np.argsort(-counts, kind="stable")[:k]
+        return [(self.names[nr], int(counts[nr])) for nr in order]
+
+    def get_co_failure_counts(self) -> np.ndarray:
+        """ checks x checks matrix - number of records where both checks
+            failed, diagonal holds failure counts. Order is self.names.
+        """
+        checks_count = len(self.names)
+        counts = np.zeros((checks_count, checks_count), dtype=np.int64)
+        # matrix product per block of rows - temporary is float64 block only
+        for start in range(0, self.failed.shape[0], CO_FAILURE_BLOCK_SIZE):
+            block = self.failed[start:start + CO_FAILURE_BLOCK_SIZE].astype(np.float64)
+            counts += (block.T @ block).astype(np.int64)
+        return counts
+
+    def get_failed_rows(self, name: str) -> np.ndarray:
+        " row indexes (record positions) where check name failed "
+        return np.flatnonzero(self[name])
+
+    def get_failed_records_mask(self) -> np.ndarray:
+        " True for records with at least one failed check "
+        return self.failed.any(axis=1)
+
+
+def get_failure_code(error: Any) -> FailureCodeEnum:
+    " ValidationFailure or RuleError made from it - error classes are distinct "
+    if isinstance(error, ValidationFailure):
+        return error.code
+    for code, error_class in ValidationFailure.ERROR_CLASSES.items():
+        if type(error) is error_class:
+            return code
+    raise RuleInternalError(owner=error.owner, msg=f"Not a validation error: {error}")
+
+
+def get_checks(container: ContainerBase) -> Dict[str, Check]:
+    """ check name -> Check of all checks of the container and its
+        extensions - required Fields (name:required), ChoiceFields
+        (name:choice), Validations and extension children validations,
+        see ValidationMatrix. Name of check in extension which is already
+        used is prefixed with extension name, e.g. items_ext.qty_positive.
+    """
+    checks = {}
+    _fill_checks(container, checks, set(), is_extension=False)
+    return checks
+
+
+def _fill_checks(container: ContainerBase, checks: Dict[str, Check], seen: set, is_extension: bool):
+    def add(owner: Any, code: FailureCodeEnum, name: str):
+        # the same extension components can be found on more levels
+        if (id(owner), code) in seen:
+            return
+        seen.add((id(owner), code))
+        if name in checks:
+            name = f"{container.name}.{name}"
+        checks[name] = Check(owner, code)
+
+    if is_extension:
+        add(container.cardinality, FailureCodeEnum.CARDINALITY, container.cardinality.name)
+        for children_validation in container.children_validations:
+            add(children_validation, FailureCodeEnum.UNIQUE, children_validation.name)
+
+    # own checks first - names in extensions are prefixed
+    extensions = []
+    for component in container.components.values():
+        if isinstance(component, Field):
+            if component.required is not False and component.required is not None:
+                add(component, FailureCodeEnum.REQUIRED, f"{component.name}:{FailureCodeEnum.REQUIRED.value}")
+            if isinstance(component, ChoiceField):
+                add(component, FailureCodeEnum.CHOICE, f"{component.name}:{FailureCodeEnum.CHOICE.value}")
+        elif isinstance(component, Validation):
+            add(component, FailureCodeEnum.VALIDATION, component.name)
+        elif isinstance(component, ContainerBase) and component is not container:
+            extensions.append(component)
+
+    for extension in extensions:
+        _fill_checks(extension, checks, seen, is_extension=True)
+
+
+def get_check_names(container: ContainerBase) -> List[str]:
+    " names of get_checks() "
+    return list(get_checks(container))
+
+
+def validate_matrix(container: ContainerBase, instances: Iterable[Any]) -> ValidationMatrix:
+    """ validates instances to ValidationMatrix. Container Validations
+        which can be vectorized are evaluated over columns of Field values
+        (see ColumnsEvaluator), other checks row-wise. Instances are
+        materialized for columns.
+    """
+    if np is None:
+        raise RuleSetupError(owner=container, msg="Package numpy is required for ValidationMatrix.")
+    if not container.is_finished():
+        raise RuleError(owner=container, msg="Call .setup() first")
+    instances = list(instances)
+    checks = get_checks(container)
+
+    masks = {}
+    columns = _get_field_columns(container, instances)
+    if instances and columns:
+        masks = ColumnsEvaluator(container=container, columns=columns, row_wise=False).evaluate()
+    validations = {name: container.components[name] for name in masks}
+    skip_validations = frozenset([id(validation) for validation in validations.values()])
+
+    results = (ValidationResult(index, validate_instance_failures(container=container, instance=instance,
+                                                                  index=index, skip_validations=skip_validations))
+               for index, instance in enumerate(instances))
+    matrix = ValidationMatrix.from_results(checks=checks, results=results, size=len(instances))
+    positions = {id(check.owner): nr for nr, check in enumerate(matrix.checks)
+                 if check.code==FailureCodeEnum.VALIDATION}
+    for name, mask in masks.items():
+        np.logical_not(mask, out=matrix.failed[:, positions[id(validations[name])]])
+    return matrix
+
+
+def _get_field_columns(container: ContainerBase, instances: List[Any]) -> Dict[str, np.ndarray]:
+    " bound variable name -> values of container Fields bound to the main model "
+    bound_model_name = container.bound_model.name
+    columns = {}
+    for component in container._get_own_components():
+        if isinstance(component, Field) and component.bound_variable:
+            var_name = component.bound_variable.name
+            bits = var_name.split(".")
+            if len(bits)>1 and bits[0]==bound_model_name:
+                get_value = get_none_safe_attrgetter(".".join(bits[1:]))
+                columns[var_name] = _to_column([get_value(instance) for instance in instances])
+    return columns
+
+
+def _to_column(values: List[Any]) -> np.ndarray:
+    " one dimensional - values which are sequences are kept as objects "
+    try:
+        column = np.asarray(values)
+    except ValueError:
+        column = None
+    if column is None or column.ndim!=1:
+        column = np.empty(len(values), dtype=object)
+        for nr, value in enumerate(values):
+            column[nr] = value
+    return column
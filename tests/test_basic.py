@@ -1,9 +1,11 @@
 # unit tests for reeedwolf.rules module
+import gc
 import unittest
 
 from dataclasses import dataclass
 from datetime import date
-from typing import List, Optional
+from types import SimpleNamespace
+from typing import List, Optional, Union
 
 from reedwolf.rules import ( 
     DP,
@@ -32,6 +34,17 @@ from reedwolf.rules import (
     msg,
 )
 from reedwolf.rules.types import TransMessageType
+from reedwolf.rules.exceptions import RuleValidationValueError
+from reedwolf.rules.base import (
+    TraverseActionEnum,
+    TraverseKindEnum,
+    clear_class_meta_caches,
+    extract_py_type_hints,
+    get_class_meta_cache_stats,
+    get_traverse_kind,
+    is_type_hint_accepting,
+)
+from reedwolf.rules.expressions import ValueExpression
 
 @dataclass
 class Company:
@@ -39,6 +52,20 @@ class Company:
     vat_number: str
 
 
+@dataclass
+class Address:
+    street: str
+    city: str
+
+
+@dataclass
+class CompanyWithAddress:
+    name: str
+    hours: int
+    is_active: bool
+    address: Optional[Address]
+
+
 class TestBasic(unittest.TestCase):
 
 
@@ -82,6 +109,130 @@ class TestBasic(unittest.TestCase):
         
         self.assertEqual(rules.get_children(), [name_component]) 
 
+    def test_value_expression_read(self):
+        rules = Rules(
+            name="company_rules", label="Company rules",
+            bound_model=BoundModel(name="company", model=CompanyWithAddress),
+            contains=[
+                Field(bind=M.company.name, label="Name"),
+                Field(bind=M.company.hours, label="Hours",
+                      validations=[
+                          Validation(name="hour_value", label="Hour value",
+                                     ensure=((This.value>=0) & (This.value<=23)),
+                                     error="Need valid hour value (0-23)")]),
+                Field(bind=M.company.address.street, label="Street", available=F.hours > 8),
+            ])
+        rules.setup()
+
+        company = CompanyWithAddress(name="ACME", hours=10, is_active=True, address=Address(street="Main", city="Zagreb"))
+        ctx = SimpleNamespace(Models=SimpleNamespace(company=company),
+                              Fields=SimpleNamespace(hours=company.hours),
+                              This=SimpleNamespace(value=company.hours))
+        street = rules.get_component("address__street")
+        self.assertEqual(street.bind.Read(ctx), "Main")
+        self.assertEqual(street.available.Read(ctx), True)
+        self.assertEqual(rules.get_component("hour_value").ensure.Read(ctx), True)
+        ctx.This.value = 24
+        self.assertEqual(rules.get_component("hour_value").ensure.Read(ctx), False)
+
+        # None on the path is returned, not raised
+        company.address = None
+        self.assertEqual(street.bind.Read(ctx), None)
+
+    def test_simplify_value_expressions(self):
+        rules = Rules(
+            name="company_rules", label="Company rules",
+            bound_model=BoundModel(name="company", model=CompanyWithAddress),
+            contains=[
+                Field(bind=M.company.name, label="Name", available=F.is_active | True),
+                BooleanField(bind=M.company.is_active, label="Is active", required=F.hours & True),
+                Field(bind=M.company.hours, label="Hours",
+                      validations=[
+                          Validation(name="hour_value", label="Hour value",
+                                     ensure=~~(This.value * (2 * 3) + 0 <= 60*60),
+                                     error="Too many seconds"),
+                          Validation(name="hour_active", label="Hour active",
+                                     ensure=(F.hours & False),
+                                     error="Never ok"),
+                      ]),
+            ])
+        rules.setup()
+
+        self.assertEqual(rules.get_component("name").available, True)
+        # truth value - bool(F.hours) is not needed
+        self.assertEqual(str(rules.get_component("is_active").required), "Fields.hours")
+        # arithmetic identities are kept - x + 0 fails for None, as without simplification
+        self.assertEqual(str(rules.get_component("hour_value").ensure), "G.(G.(G.(This.value * 6) + 0) <= 3600)")
+        # ensure can not be literal, nested operands are simplified only
+        self.assertEqual(str(rules.get_component("hour_active").ensure), "G.(Fields.hours and False)")
+
+        # literal is set only to attributes which accept bool - by type hint, not its name
+        self.assertTrue(is_type_hint_accepting("Optional[Union[ValueExpression, bool]]", bool))
+        self.assertTrue(is_type_hint_accepting(Optional[Union[ValueExpression, bool]], bool))
+        self.assertFalse(is_type_hint_accepting("Optional[BoolFlag]", bool))
+        self.assertFalse(is_type_hint_accepting("Union[ValueExpression, List[bool]]", bool))
+        self.assertFalse(is_type_hint_accepting(List[bool], bool))
+
+        ctx = SimpleNamespace(This=SimpleNamespace(value=600))
+        self.assertEqual(rules.get_component("hour_value").ensure.Read(ctx), True)
+        ctx.This.value = 601
+        self.assertEqual(rules.get_component("hour_value").ensure.Read(ctx), False)
+        ctx.This.value = [1]
+        with self.assertRaisesRegex(RuleValidationValueError, "can only concatenate list"):
+            rules.get_component("hour_value").ensure.Read(ctx)
+
+    def test_class_meta_cache(self):
+        clear_class_meta_caches()
+        rules = Rules(
+            name="company_rules", label="Company rules",
+            bound_model=BoundModel(name="company", model=CompanyWithAddress),
+            contains=[
+                Field(bind=M.company.name, label="Name"),
+                Field(bind=M.company.hours, label="Hours"),
+                Field(bind=M.company.address.street, label="Street"),
+                Field(bind=M.company.address.city, label="City"),
+            ])
+        rules.setup()
+        stats = get_class_meta_cache_stats()
+        # resolved once per class, reused for other attributes
+        self.assertGreater(stats["type_hints"]["hits"], 0)
+        self.assertEqual(stats["type_hints"]["misses"], stats["type_hints"]["size"])
+
+        @dataclass
+        class Temporary:
+            name: str
+
+        self.assertEqual(extract_py_type_hints(Temporary, "test"), {"name": str})
+        # shared cached value is read-only
+        with self.assertRaises(TypeError):
+            extract_py_type_hints(Temporary, "test")["name"] = int
+        self.assertEqual(extract_py_type_hints(Temporary, "test"), {"name": str})
+        size = get_class_meta_cache_stats()["type_hints"]["size"]
+        del Temporary
+        gc.collect()
+        self.assertEqual(get_class_meta_cache_stats()["type_hints"]["size"], size - 1)
+
+    def test_traverse_plan(self):
+        rules = Rules(
+            name="company_rules", label="Company rules",
+            bound_model=BoundModel(name="company", model=CompanyWithAddress),
+            contains=[
+                Field(bind=M.company.name, label="Name"),
+                BooleanField(bind=M.company.is_active, label="Is active"),
+            ])
+        rules.setup()
+        # stored per class, not inherited
+        self.assertEqual(Field._traverse_plan["bind"].action, TraverseActionEnum.TRAVERSE)
+        self.assertEqual(Field._traverse_plan["label"].action, TraverseActionEnum.SKIP)
+        self.assertIsNot(BooleanField.__dict__["_traverse_plan"], Field.__dict__["_traverse_plan"])
+        # list / dict / scalar is decided with plan, per value only for Union of list and scalar
+        self.assertEqual(Field._traverse_plan["validations"].kind, TraverseKindEnum.LIST)
+        self.assertEqual(Field._traverse_plan["bind"].kind, TraverseKindEnum.SCALAR)
+        self.assertEqual(Rules._traverse_plan["contains"].kind, TraverseKindEnum.LIST)
+        self.assertEqual(get_traverse_kind("Optional[Dict[str, ValueExpression]]"), TraverseKindEnum.DICT)
+        self.assertEqual(get_traverse_kind(Optional[Union[ValueExpression, List[str]]]), TraverseKindEnum.ANY)
+        self.assertEqual(get_traverse_kind(Optional[ValueExpression]), TraverseKindEnum.SCALAR)
+
     # TODO: 
     # def test_dump_pydantic_models(self):
     #   rules.dump_pydantic_models()
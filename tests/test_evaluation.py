@@ -0,0 +1,1398 @@
+# unit tests for reeedwolf.rules module - runtime evaluation
+import asyncio
+import copy
+import importlib.util
+import os
+import pickle
+import sys
+import tempfile
+import time
+import unittest
+
+from dataclasses import dataclass
+from decimal import Decimal
+from fractions import Fraction
+from typing import List, Optional
+
+from reedwolf.rules import (
+    BooleanField,
+    BoundModel,
+    BoundModelHandler,
+    BoundModelWithHandlers,
+    ChoiceField,
+    ChoiceOption,
+    Cardinality,
+    DataVar,
+    DataVarCache,
+    ChoicesCache,
+    DP,
+    Extension,
+    F,
+    Field,
+    M,
+    MemoryUniqueIndex,
+    Rules,
+    Section,
+    SqliteUniqueIndex,
+    This,
+    Unique,
+    Validation,
+)
+from reedwolf.rules.exceptions import RuleError, RuleSetupError, RuleSetupValueError, RuleValidationValueError
+from reedwolf.rules.generators import dump_python_validator_to_str
+from reedwolf.rules.utils import UNDEFINED
+from reedwolf.rules.setup_cache import dump_rules, get_cache_file_path, get_rules_fingerprint, load_rules
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+@dataclass
+class Address:
+    street: str
+    city: str
+
+
+@dataclass
+class OrderItem:
+    code: str
+    qty: int
+
+
+@dataclass
+class Country:
+    code: str
+    name: str
+
+
+@dataclass
+class Person:
+    name: str
+    country: Optional[str] = None
+    size: Optional[str] = None
+
+
+def get_countries() -> List[Country]:
+    get_countries.calls += 1
+    return [Country(code="HR", name="Croatia"), Country(code="SI", name="Slovenia")]
+get_countries.calls = 0
+
+
+@dataclass
+class Company:
+    name: str
+    hours: int
+    is_active: bool
+    address: Optional[Address]
+    items: List[OrderItem]
+
+
+@dataclass
+class Branch:
+    name: str
+    address: Optional[Address]
+
+
+@dataclass
+class Network:
+    name: str
+    branches: List[Branch]
+
+
+def get_max_hours() -> int:
+    return 23
+
+
+def get_max_hours_counted() -> int:
+    get_max_hours_counted.calls += 1
+    return 23
+get_max_hours_counted.calls = 0
+
+
+def get_max_hours_slow() -> int:
+    time.sleep(0.1)
+    return 23
+
+
+def create_rules() -> Rules:
+    return Rules(
+        name="company_rules", label="Company rules",
+        bound_model=BoundModel(name="company", model=Company),
+        dataproviders=[
+            DataVar(name="max_hours", label="Max hours", value=get_max_hours),
+        ],
+        validations=[
+            Validation(name="active_has_address", label="Active company has address",
+                       ensure=(~F.is_active | (M.company.address.city != None)), # noqa: E711
+                       error="Active company needs address"),
+        ],
+        contains=[
+            Field(bind=M.company.name, label="Name", required=True),
+            BooleanField(bind=M.company.is_active, label="Is active"),
+            Field(bind=M.company.hours, label="Hours",
+                  validations=[
+                      Validation(name="hour_value", label="Hour value",
+                                 ensure=((This.value>=0) & (This.value<=DP.max_hours)),
+                                 error="Need valid hour value (0-23)")]),
+            Section(name="address", label="Address", available=F.is_active, contains=[
+                Field(bind=M.company.address.street, label="Street", required=F.is_active),
+            ]),
+            Extension(name="items_ext", label="Items",
+                      bound_model=BoundModel(name="items", model=M.company.items),
+                      cardinality=Cardinality.Range(name="items_card", min=1, max=3),
+                      contains=[
+                          Field(bind=M.items.code, label="Code", required=True),
+                          Field(bind=M.items.qty, label="Quantity",
+                                validations=[Validation(name="qty_positive", label="Positive quantity",
+                                                        ensure=(This.value > 0), error="Quantity should be positive")]),
+                      ],
+                      children_validations=[Unique.Children(name="items_unique", fields=["code"])]),
+        ])
+
+
+def get_test_instances() -> List[Company]:
+    return [
+        Company(name="ACME", hours=10, is_active=True,
+                address=Address(street="Main", city="Zagreb"),
+                items=[OrderItem(code="A", qty=1)]),
+        Company(name="", hours=24, is_active=True,
+                address=None,
+                items=[]),
+        Company(name="Other", hours=-1, is_active=False,
+                address=None,
+                items=[OrderItem(code="", qty=0), OrderItem(code="B", qty=2),
+                       OrderItem(code="C", qty=3), OrderItem(code="D", qty=4)]),
+    ]
+
+
+class TestEvaluation(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = create_rules()
+        self.rules.setup()
+
+    def get_errors(self, instance):
+        return [(err.owner.name, err.msg) for err in self.rules.validate(instance)]
+
+    def test_validate(self):
+        ok, missing, wrong = get_test_instances()
+        self.assertEqual(self.get_errors(ok), [])
+        self.assertEqual(self.get_errors(missing), [
+            ("name", "Value is required."),
+            ("hour_value", "Need valid hour value (0-23)"),
+            ("address__street", "Value is required."),
+            ("items_card", "Expected at least 1 item(s), got 0."),
+            ("active_has_address", "Active company needs address"),
+            ])
+        self.assertEqual(self.get_errors(wrong), [
+            ("hour_value", "Need valid hour value (0-23)"),
+            ("items_card", "Expected at most 3 items, got 4."),
+            ("code", "Value is required."),
+            ("qty_positive", "Quantity should be positive"),
+            ])
+
+    def test_dump_python_validator(self):
+        code = dump_python_validator_to_str(self.rules)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fname = os.path.join(tmp_dir, "company_validator.py")
+            with open(fname, "w") as fout:
+                fout.write(code)
+            spec = importlib.util.spec_from_file_location("company_validator", fname)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+
+        for instance in get_test_instances():
+            self.assertEqual(module.validate(instance), self.get_errors(instance))
+
+    def test_dump_python_validator_locals(self):
+        # values are read only in branches that use them, provider is
+        # called at most once
+        rules = Rules(
+            name="company_rules", label="Company rules",
+            bound_model=BoundModel(name="company", model=Company),
+            dataproviders=[
+                DataVar(name="max_hours", label="Max hours", value=get_max_hours_counted),
+            ],
+            contains=[
+                BooleanField(bind=M.company.is_active, label="Is active"),
+                Field(bind=M.company.hours, label="Hours", available=F.is_active,
+                      validations=[Validation(name="hour_value", label="Hour value",
+                                              ensure=(This.value <= DP.max_hours), error="Too many hours")]),
+                Section(name="address", label="Address", available=F.is_active, contains=[
+                    Field(bind=M.company.address.street, label="Street",
+                          validations=[Validation(name="street_hours", label="Street hours",
+                                                  available=(M.company.address.city != "Split"),
+                                                  ensure=(F.hours < DP.max_hours), error="Street")]),
+                ]),
+            ])
+        rules.setup()
+        namespace = {}
+        exec(dump_python_validator_to_str(rules), namespace)
+        validate = namespace["validate"]
+
+        inactive = Company(name="ACME", hours=30, is_active=False, address=None, items=[])
+        active = Company(name="ACME", hours=30, is_active=True,
+                         address=Address(street="Main", city="Zagreb"), items=[])
+        for instance, calls in ((inactive, 0), (active, 1)):
+            get_max_hours_counted.calls = 0
+            errors = validate(instance)
+            self.assertEqual(get_max_hours_counted.calls, calls)
+            self.assertEqual(errors, [(err.owner.name, err.msg) for err in rules.validate(instance)])
+        self.assertEqual([name for name, _ in errors], ["hour_value", "street_hours"])
+
+    def test_unique_children(self):
+        instance = Company(name="ACME", hours=10, is_active=False, address=None,
+                           items=[OrderItem(code="A", qty=1), OrderItem(code="B", qty=1),
+                                  OrderItem(code="A", qty=-1), OrderItem(code=None, qty=1)])
+        self.assertEqual(self.get_errors(instance), [
+            ("items_card", "Expected at most 3 items, got 4."),
+            ("items_unique", "Values of code should be unique, duplicates at item position(s): 2."),
+            ("qty_positive", "Quantity should be positive"),
+            ("code", "Value is required."),
+        ])
+
+        # None values are ignored, or compared as any other value
+        unique = self.rules.components["items_ext"].children_validations[0]
+        self.assertIs(unique.get_key(OrderItem(code=None, qty=1)), UNDEFINED)
+        unique.ignore_none = False
+        self.assertIsNone(unique.get_key(OrderItem(code=None, qty=1)))
+        instance.items.append(OrderItem(code=None, qty=1))
+        self.assertIn(("items_unique", "Values of code should be unique, duplicates at item position(s): 2, 4."),
+                      self.get_errors(instance))
+
+        # generated python validator
+        code = dump_python_validator_to_str(self.rules)
+        namespace = {}
+        exec(compile(code, "company_validator", "exec"), namespace)
+        self.assertEqual(namespace["validate"](instance), self.get_errors(instance))
+
+    def test_unique_global(self):
+        from reedwolf.rules.unique_index import BloomFilter
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for index in (MemoryUniqueIndex(),
+                          SqliteUniqueIndex(os.path.join(tmp_dir, "keys.db"), bloom_capacity=100)):
+                rules = create_rules()
+                extension = rules.contains[-1]
+                unique = Unique.Global(name="items_global", fields=["code"], index=index)
+                extension.children_validations.append(unique)
+                rules.setup()
+
+                unique.rebuild_index([OrderItem(code="A", qty=1), OrderItem(code=None, qty=1)])
+                self.assertEqual(len(index), 1)
+                instance = Company(name="ACME", hours=10, is_active=False, address=None,
+                                   items=[OrderItem(code="B", qty=1), OrderItem(code="A", qty=1)])
+                self.assertEqual(self.get_errors(instance), [])
+                self.assertEqual([(err.owner.name, err.msg) for err in rules.validate(instance)], [
+                    ("items_global", "Values of code should be globally unique, duplicates at item position(s): 1."),
+                ])
+                unique.add_saved([OrderItem(code="B", qty=1)])
+                self.assertEqual(rules.validate_failures(instance)[0].args, ((0, 1),))
+
+                # the same record (id) is not a duplicate
+                index.add("C", record_id=1)
+                self.assertFalse(index.contains("C", exclude_record_id=1))
+                self.assertTrue(index.contains("C", exclude_record_id=2))
+                index.add("D", record_id=1)
+                self.assertFalse(index.contains("C"))
+                self.assertTrue(index.contains("D"))
+                index.discard("D")
+                self.assertEqual(len(index), 2)
+
+                # the same key normalization in all indexes - equal python values
+                index.add(1, record_id=10)
+                self.assertTrue(index.contains(1.0) and index.contains(True) and index.contains(Decimal(1)))
+                self.assertFalse(index.contains("1"))
+                self.assertFalse(index.contains(1, exclude_record_id=10.0))
+                index.add((2.5, frozenset([("a", 1), ("b", 2)])))
+                self.assertTrue(index.contains((Fraction(5, 2), frozenset([("b", 2.0), ("a", 1)]))))
+                index.discard(1.0)
+                index.discard((2.5, frozenset([("a", 1), ("b", 2)])))
+                self.assertEqual(len(index), 2)
+
+                if isinstance(index, SqliteUniqueIndex):
+                    # keys stored by other connection are found, bloom filter is filled again
+                    other_index = SqliteUniqueIndex(index.file_path, bloom_capacity=100)
+                    self.assertFalse(index.contains("X"))
+                    other_index.add("X")
+                    other_index.close()
+                    self.assertTrue(index.contains("X"))
+                    index.discard("X")
+
+                # unpickled index works the same, sqlite connection is made again
+                index_copy = pickle.loads(pickle.dumps(index))
+                self.assertTrue(index_copy.contains("B"))
+                self.assertFalse(index_copy.contains("E"))
+                if isinstance(index, SqliteUniqueIndex):
+                    index_copy.close()
+                    index.close()
+
+        bloom_filter = BloomFilter(capacity=1000, error_rate=0.01)
+        for nr in range(1000):
+            bloom_filter.add(str(nr))
+        self.assertTrue(all([str(nr) in bloom_filter for nr in range(1000)]))
+        self.assertLess(sum([str(nr) in bloom_filter for nr in range(1000, 11000)]), 300)
+
+    def test_unique_audit(self):
+        from collections import defaultdict
+        from reedwolf.rules import unique_audit
+
+        rules = create_rules()
+        unique = Unique.Global(name="items_global", fields=["code", "qty"], ignore_none=False)
+        rules.contains[-1].children_validations.append(unique)
+        rules.setup()
+
+        items = [OrderItem(code=None if nr % 7==0 else str(nr % 50), qty=nr % 3) for nr in range(1000)]
+        expected = defaultdict(list)
+        for position, item in enumerate(items):
+            expected[(item.code, item.qty)].append(position)
+        expected = {key: positions for key, positions in expected.items() if len(positions)>1}
+
+        # in memory, spilled runs, more runs than merge fan-in
+        fan_in = unique_audit.MERGE_FAN_IN
+        try:
+            unique_audit.MERGE_FAN_IN = 4
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                for memory_budget in (None, 2000):
+                    groups = list(unique.audit(iter(items), memory_budget=memory_budget, tmp_dir=tmp_dir))
+                    self.assertEqual({group.key: group.positions for group in groups}, expected)
+                    self.assertEqual(os.listdir(tmp_dir), [])
+        finally:
+            unique_audit.MERGE_FAN_IN = fan_in
+
+    def test_unique_audit_mixed_keys(self):
+        rules = create_rules()
+        unique = Unique.Global(name="items_global", fields=["code"], ignore_none=False)
+        rules.contains[-1].children_validations.append(unique)
+        rules.setup()
+
+        # not comparable with each other: int / str / None, frozensets
+        # from dict / set values
+        codes = [1, "1", None, {"a": 1, "b": 2}, {3, 4}, "1", {"b": 2, "a": 1}, 1.0, None, {4, 3}, 2]
+        items = [OrderItem(code=code, qty=1) for code in codes]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for memory_budget in (None, 500):
+                groups = list(unique.audit(iter(items), memory_budget=memory_budget, tmp_dir=tmp_dir))
+                self.assertEqual(sorted([group.positions for group in groups]),
+                                 [[0, 7], [1, 5], [2, 8], [3, 6], [4, 9]])
+                keys = {tuple(group.positions): group.key for group in groups}
+                self.assertEqual(keys[(3, 6)], frozenset({("a", 1), ("b", 2)}))
+                self.assertEqual(keys[(4, 9)], frozenset({3, 4}))
+
+    def test_save_listener(self):
+        saved = []
+
+        def read_items() -> List[OrderItem]:
+            return []
+
+        def save_items(items: List[OrderItem]):
+            saved.extend(items)
+
+        async def save_items_async(items: List[OrderItem]):
+            if items[0].code=="FAIL":
+                raise ValueError("not saved")
+            saved.extend(items)
+
+        rules = create_rules()
+        unique = Unique.Global(name="items_global", fields=["code"])
+        rules.contains[-1].children_validations.append(unique)
+        rules.setup()
+
+        bound_model = BoundModelWithHandlers(name="items", label="Items",
+                                             read_handler=BoundModelHandler(read_items),
+                                             save_handler=BoundModelHandler(save_items, model_param_name="items"))
+        bound_model.add_save_listener(unique.add_saved)
+        bound_model.save(items=[OrderItem(code="A", qty=1)])
+        self.assertEqual(len(saved), 1)
+        self.assertTrue(unique.index.contains("A"))
+        with self.assertRaises(RuleSetupError):
+            bound_model.save(records=[OrderItem(code="B", qty=1)])
+        self.assertFalse(unique.index.contains("B"))
+
+        # async save - index is updated only after save is done
+        bound_model.save_handler = BoundModelHandler(save_items_async, model_param_name="items")
+        save = bound_model.save(items=[OrderItem(code="FAIL", qty=1)])
+        self.assertFalse(unique.index.contains("FAIL"))
+        with self.assertRaises(ValueError):
+            asyncio.run(save)
+        self.assertFalse(unique.index.contains("FAIL"))
+        asyncio.run(bound_model.save(items=[OrderItem(code="C", qty=1)]))
+        self.assertTrue(unique.index.contains("C"))
+
+    def test_unique_children_large(self):
+        # single pass over set of keys - key hashes / comparisons grow
+        # linearly with number of items
+        calls = {"hash": 0, "eq": 0}
+
+        class Code(str):
+            def __hash__(self):
+                calls["hash"] += 1
+                return str.__hash__(self)
+
+            def __eq__(self, other):
+                calls["eq"] += 1
+                return str.__eq__(self, other)
+
+        items = [OrderItem(code=Code(nr), qty=1) for nr in range(20000)]
+        items.append(OrderItem(code=Code(7), qty=1))
+        extension = self.rules.components["items_ext"]
+        extension.cardinality.max = None
+        errors = self.rules.validate_failures(Company(name="ACME", hours=10, is_active=False, address=None, items=items))
+        self.assertEqual([(error.owner.name, error.args) for error in errors], [("items_unique", ((20000,),))])
+        self.assertLessEqual(calls["hash"], 3 * len(items))
+        self.assertLessEqual(calls["eq"], 3 * len(items))
+
+    def test_unique_unhashable(self):
+        extension = self.rules.components["items_ext"]
+        extension.cardinality.max = None
+
+        class Code:
+            " unhashable - __eq__ without __hash__ "
+            def __init__(self, value):
+                self.value = value
+
+            def __eq__(self, other):
+                return isinstance(other, Code) and self.value==other.value
+
+        codes = [["A", 1], ["A", 1], {"x": [1]}, {"x": [1]}, {"B"}, {"B"}, Code(1), Code(2), Code(1)]
+        instance = Company(name="ACME", hours=10, is_active=False, address=None,
+                           items=[OrderItem(code=code, qty=1) for code in codes])
+        unique = extension.children_validations[0]
+        self.assertEqual(unique.get_key(instance.items[0]), ("A", 1))
+        expected = [("items_unique", "Values of code should be unique, duplicates at item position(s): 1, 3, 5, 8.")]
+        self.assertEqual(self.get_errors(instance), expected)
+
+        namespace = {}
+        exec(compile(dump_python_validator_to_str(self.rules), "company_validator", "exec"), namespace)
+        self.assertEqual(namespace["validate"](instance), expected)
+
+    def test_unique_none_intermediate(self):
+        unique = Unique.Children(name="branches_unique", fields=["address__city"])
+        unique_global = Unique.Global(name="branches_global", fields=["name", "address__city"])
+        rules = Rules(
+            name="network_rules", label="Network rules",
+            bound_model=BoundModel(name="network", model=Network),
+            contains=[
+                Field(bind=M.network.name, label="Name"),
+                Extension(name="branches_ext", label="Branches",
+                          bound_model=BoundModel(name="branches", model=M.network.branches),
+                          cardinality=Cardinality.Range(name="branches_card", min=1),
+                          contains=[
+                              Field(bind=M.branches.name, label="Name"),
+                              Field(bind=M.branches.address.city, label="City"),
+                          ],
+                          children_validations=[unique, unique_global]),
+            ])
+        rules.setup()
+        branches = [Branch(name="A", address=Address(street="Main", city="Zagreb")),
+                    Branch(name="B", address=None),
+                    Branch(name="C", address=None),
+                    Branch(name="D", address=Address(street="Side", city="Zagreb"))]
+        self.assertIs(unique.get_key(branches[1]), UNDEFINED)
+        self.assertIs(unique_global.get_key(branches[1]), UNDEFINED)
+        unique_global.ignore_none = False
+        self.assertEqual(unique_global.get_key(branches[1]), ("B", None))
+        unique_global.add_saved([Branch(name="B", address=None)])
+
+        instance = Network(name="Net", branches=branches)
+        expected = [
+            ("branches_unique", "Values of address__city should be unique, duplicates at item position(s): 3."),
+            ("branches_global", "Values of name, address__city should be globally unique, duplicates at item position(s): 1."),
+        ]
+        self.assertEqual([(err.owner.name, err.msg) for err in rules.validate(instance)], expected)
+
+        rules.components["branches_ext"].children_validations.remove(unique_global)
+        namespace = {}
+        exec(compile(dump_python_validator_to_str(rules), "network_validator", "exec"), namespace)
+        self.assertEqual(namespace["validate"](instance), expected[:1])
+
+    def test_prefix_index(self):
+        from reedwolf.rules.choices import ChoiceIndex, PREFIX_KEY_LENGTH
+        long_label = "x" * PREFIX_KEY_LENGTH
+        options = [ChoiceOption(value=nr, label=f"Item {nr:03}") for nr in range(100)] \
+                + [ChoiceOption(value="off", label="Item off", available=False),
+                   ChoiceOption(value="long1", label=long_label + "a"),
+                   ChoiceOption(value="long2", label=long_label + "b")]
+        index = ChoiceIndex({option.value: option for option in options})
+        keys, _ = index.get_prefix_index()
+        # not available options are not indexed, keys are bounded
+        self.assertEqual(len(keys), 102)
+        self.assertEqual(max(map(len, keys)), PREFIX_KEY_LENGTH)
+
+        checked = []
+        def is_available(option):
+            checked.append(option.value)
+            return True
+        self.assertEqual([option.value for option in index.get_prefix_matches("item 05", 3, is_available)],
+                         [50, 51, 52])
+        self.assertEqual(checked, [])
+        self.assertEqual([option.value for option in index.get_prefix_matches(long_label.upper() + "B")],
+                         ["long2"])
+
+    def test_choice_index(self):
+        rules = Rules(
+            name="person_rules", label="Person rules",
+            bound_model=BoundModel(name="person", model=Person),
+            contains=[
+                Field(bind=M.person.name, label="Name"),
+                ChoiceField(bind=M.person.country, label="Country", choices=get_countries,
+                            choice_value=This.code, choice_label=This.name),
+                ChoiceField(bind=M.person.size, label="Size",
+                            choices=["S", "M", ChoiceOption(value="L", label="Large")]),
+            ])
+        rules.setup()
+        country, size = rules.components["country"], rules.components["size"]
+
+        calls = get_countries.calls
+        index = country.get_choice_index()
+        self.assertEqual(index.get_label("SI"), "Slovenia")
+        self.assertIn("HR", index)
+        self.assertNotIn(["HR"], index)
+        self.assertEqual(size.get_choice_index().labels, {"S": "S", "M": "M", "L": "Large"})
+        # list changed in place - length is checked, same length needs invalidation
+        size.choices.append("XL")
+        self.assertIn("XL", size.get_choice_index())
+        size.choices[-1] = "XXL"
+        self.assertNotIn("XXL", size.get_choice_index())
+        size.invalidate_choices()
+        self.assertIn("XXL", size.get_choice_index())
+        size.choices.pop()
+        self.assertNotIn("XXL", size.get_choice_index())
+
+        def get_errors(person):
+            return [(err.owner.name, err.msg) for err in rules.validate(person)]
+
+        self.assertEqual(get_errors(Person(name="A", country="HR", size="L")), [])
+        self.assertEqual(get_errors(Person(name="A", country="DE", size="XL")), [
+            ("country", "Value is not a valid choice."),
+            ("size", "Value is not a valid choice."),
+        ])
+        # choices function is called once, again only after invalidation
+        self.assertEqual(get_countries.calls, calls + 1)
+        country.invalidate_choices()
+        self.assertEqual(get_errors(Person(name="A")), [])
+        self.assertIsNot(country.get_choice_index(), index)
+        self.assertEqual(get_countries.calls, calls + 2)
+
+        # autocomplete - prefix index is shared and dropped with choice index
+        self.assertEqual([option.value for option in country.get_autocomplete("s")], ["SI"])
+        self.assertEqual([option.value for option in country.get_autocomplete("", limit=1)], ["HR"])
+        prefix_index = country.get_choice_index()._prefix_index
+        country.get_autocomplete("cro")
+        self.assertIs(country.get_choice_index()._prefix_index, prefix_index)
+        # list choices are indexed in setup
+        self.assertIsNotNone(size._choice_index._prefix_index)
+        size.get_choice_index().options["M"].available = False
+        self.assertEqual([option.label for option in size.get_autocomplete("")], ["Large", "S"])
+        size.get_choice_index().options["M"].available = True
+        country.invalidate_choices()
+        self.assertIsNot(country.get_choice_index()._prefix_index, prefix_index)
+        size.autocomplete = False
+        with self.assertRaises(RuleError):
+            size.get_autocomplete("s")
+
+        # generated python validator supports list choices only
+        with self.assertRaises(RuleSetupError):
+            dump_python_validator_to_str(rules)
+        rules.contains[1].choices = ["HR", "SI"]
+        rules.contains[1].choice_value = rules.contains[1].choice_label = None
+        country.invalidate_choices()
+        namespace = {}
+        exec(compile(dump_python_validator_to_str(rules), "person_validator", "exec"), namespace)
+        for person in (Person(name="A", country="HR", size="L"), Person(name="A", country="DE", size="XL")):
+            self.assertEqual(namespace["validate"](person), get_errors(person))
+
+    def test_choices_cache(self):
+        import pickle
+        now = [0.0]
+        cache = ChoicesCache(ttl=10, stale_while_revalidate=True, timer=lambda: now[0])
+        country = ChoiceField(bind=M.person.country, label="Country", choices=get_countries,
+                              choice_value=This.code, choice_label=This.name, choices_cache=cache)
+        rules = Rules(
+            name="person_rules", label="Person rules",
+            bound_model=BoundModel(name="person", model=Person),
+            contains=[country])
+        rules.setup()
+
+        calls = get_countries.calls
+        index = country.get_choice_index()
+        self.assertIs(country.get_choice_index(), index)
+        self.assertEqual((get_countries.calls, cache.hits, cache.misses), (calls + 1, 1, 1))
+
+        # expired - stale index is returned, new one loaded in background
+        now[0] = 10
+        self.assertIs(country.get_choice_index(), index)
+        self.assertTrue(cache.wait_refresh(timeout=5))
+        self.assertEqual((get_countries.calls, cache.refreshes), (calls + 2, 1))
+        refreshed = country.get_choice_index()
+        self.assertIsNot(refreshed, index)
+
+        # invalidation - next read loads in request
+        country.invalidate_choices()
+        self.assertIsNot(country.get_choice_index(), refreshed)
+        self.assertEqual((get_countries.calls, cache.misses), (calls + 3, 2))
+
+        # too many choices are not cached
+        cache.max_size = 1
+        country.invalidate_choices()
+        country.get_choice_index()
+        country.get_choice_index()
+        self.assertEqual(get_countries.calls, calls + 5)
+
+        # cached choices are not pickled
+        cache = ChoicesCache(ttl=10)
+        cache.get(lambda: ["HR"])
+        restored = pickle.loads(pickle.dumps(cache))
+        self.assertEqual((restored.hits, restored._item), (0, None))
+        with self.assertRaises(RuleSetupValueError):
+            ChoicesCache(stale_while_revalidate=True)
+        with self.assertRaises(RuleSetupValueError):
+            ChoiceField(bind=M.person.size, label="Size", choices=["S"], choices_cache=ChoicesCache())
+
+    def test_shared_subexpressions(self):
+        from reedwolf.rules.evaluation import EvaluationContext
+
+        rules = Rules(
+            name="company_rules", label="Company rules",
+            bound_model=BoundModel(name="company", model=Company),
+            contains=[
+                Field(bind=M.company.name, label="Name", available=(F.is_active & (F.hours > 8))),
+                BooleanField(bind=M.company.is_active, label="Is active"),
+                Field(bind=M.company.hours, label="Hours", editable=(F.is_active & (F.hours > 8)),
+                      validations=[
+                          # uses This. - not shared
+                          Validation(name="hour_value", label="Hour value",
+                                     ensure=((This.value > 8) & (F.is_active & (F.hours > 8))),
+                                     error="Hours")]),
+            ])
+        rules.setup()
+        name, hours = rules.get_component("name"), rules.get_component("hours")
+        hour_value = rules.get_component("hour_value")
+        shared = [name.available._node, hours.editable._node, hour_value.ensure._node.second._node]
+        self.assertEqual({op._shared_slot for op in shared}, {0})
+        self.assertEqual(hour_value.ensure._node._shared_slot, None)
+
+        calls = []
+        def op_function(first, second):
+            calls.append((first, second))
+            return bool(first) and bool(second)
+        for op in shared:
+            op.op_function = op_function
+
+        ctx = EvaluationContext(rules, get_test_instances()[0])
+        self.assertEqual(name.available.Read(ctx), True)
+        self.assertEqual(hours.editable.Read(ctx), True)
+        ctx.This.value = 10
+        self.assertEqual(hour_value.ensure.Read(ctx), True)
+        self.assertEqual(calls, [(True, True)])
+        self.assertEqual(ctx.shared_values, {0: True})
+
+    def test_short_circuit_and_reorder_operands(self):
+        from reedwolf.rules.evaluation import EvaluationContext
+        from reedwolf.rules.expressions import get_read_cost, READ_COST_METHOD_CALL
+
+        rules = Rules(
+            name="company_rules", label="Company rules",
+            bound_model=BoundModel(name="company", model=Company),
+            dataproviders=[
+                DataVar(name="max_hours", label="Max hours", value=get_max_hours),
+            ],
+            reorder_operands=True,
+            contains=[
+                Field(bind=M.company.name, label="Name",
+                      available=((DP.max_hours > 10) & (F.hours > 8) & F.is_active)),
+                BooleanField(bind=M.company.is_active, label="Is active"),
+                Field(bind=M.company.hours, label="Hours", editable=(~F.is_active | (F.hours > 8))),
+            ])
+        rules.setup()
+        available = rules.get_component("name").available
+        self.assertEqual(str(available),
+                         "G.(G.(G.(Fields.hours > 8) and Fields.is_active) and G.(DataProviders.max_hours > 10))")
+        self.assertEqual(get_read_cost(F.name.upper(), set()), READ_COST_METHOD_CALL)
+
+        ok, _, inactive = get_test_instances()
+        self.assertEqual(available.Read(EvaluationContext(rules, ok)), True)
+
+        calls = []
+        editable = rules.get_component("hours").editable
+        hours_op = editable._node.second._node
+        hours_op.op_function = lambda first, second: calls.append(first) or first > second
+
+        self.assertEqual(editable.Read(EvaluationContext(rules, inactive)), True)
+        self.assertEqual(calls, [])
+        self.assertEqual(editable.Read(EvaluationContext(rules, ok)), True)
+        self.assertEqual(calls, [10])
+
+    def test_structural_keys_and_interning(self):
+        self.assertTrue((F.a & (F.b > 1)).IsStructurallyEqual(F.a & (F.b > 1)))
+        self.assertFalse((F.a & (F.b > 1)).IsStructurallyEqual(F.a & (F.b > 2)))
+        self.assertFalse(M.a.b.IsStructurallyEqual(F.a.b))
+        self.assertEqual(M.a.b.upper(1).GetStructuralHash(), M.a.b.upper(1).GetStructuralHash())
+        cache = {M.a.b.GetStructuralKey(): 1}
+        self.assertIn(M.a.b.GetStructuralKey(), cache)
+
+        # Path is built on access - parent link only
+        vexp = M.company.address.street
+        self.assertEqual([bit._node for bit in vexp.Path], ["company", "address", "street"])
+        self.assertIs(vexp.Path[1], vexp._parent)
+        # parents do not cache their paths
+        self.assertIsNone(vexp._parent._path)
+        self.assertIs(vexp.Path, vexp.Path)
+
+        rules = Rules(
+            name="company_rules", label="Company rules",
+            bound_model=BoundModel(name="company", model=Company),
+            contains=[
+                Field(bind=M.company.name, label="Name", available=F.is_active & (F.hours > 8)),
+                BooleanField(bind=M.company.is_active, label="Is active"),
+                Field(bind=M.company.hours, label="Hours", editable=F.is_active & (F.hours > 8),
+                      validations=[
+                          Validation(name="hour_value", label="Hour value",
+                                     ensure=((F.hours > 8) | (This.value < 0)), error="Hours")]),
+            ])
+        rules.setup()
+        name, hours = rules.get_component("name"), rules.get_component("hours")
+        self.assertIs(name.available, hours.editable)
+        self.assertIs(rules.get_component("hour_value").ensure._node.first, name.available._node.second)
+        self.assertEqual(rules.validate(get_test_instances()[0]), [])
+
+    def test_dependency_graph_and_apply_changes(self):
+        rules = Rules(
+            name="company_rules", label="Company rules",
+            bound_model=BoundModel(name="company", model=Company),
+            dataproviders=[
+                # depends on DataVar defined later - evaluated in dependency order
+                DataVar(name="max_hours", label="Max hours", value=(DP.base_hours + 3)),
+                DataVar(name="base_hours", label="Base hours", value=(F.is_active * 20)),
+            ],
+            contains=[
+                Field(bind=M.company.name, label="Name"),
+                BooleanField(bind=M.company.is_active, label="Is active"),
+                Field(bind=M.company.hours, label="Hours",
+                      validations=[
+                          Validation(name="hour_value", label="Hour value",
+                                     ensure=(This.value <= DP.max_hours), error="Hours")]),
+                Section(name="address", label="Address", available=F.is_active, contains=[
+                    Field(bind=M.company.address.street, label="Street", required=(F.name != "")),
+                ]),
+            ])
+        rules.setup()
+        graph = rules.get_dependency_graph()
+        self.assertLess(graph.order.index("base_hours"), graph.order.index("max_hours"))
+        self.assertEqual(graph.get_affected(["is_active"]),
+                         ["address", "base_hours", "max_hours", "hour_value"])
+        self.assertEqual(graph.get_affected(["name"]), ["address__street"])
+
+        company = get_test_instances()[0]
+        evaluation = rules.create_reactive_evaluation(company)
+        self.assertEqual(evaluation.results["max_hours"], {"value": 23})
+        self.assertEqual(evaluation.results["hour_value"], {"available": True, "ensure": True})
+
+        changed = evaluation.apply_changes({"hours": 24})
+        self.assertEqual(company.hours, 24)
+        self.assertEqual(list(changed), ["hour_value"])
+        self.assertEqual(changed["hour_value"]["ensure"], False)
+
+        changed = evaluation.apply_changes({"is_active": False})
+        self.assertEqual(changed["address"]["available"], False)
+        self.assertEqual(changed["max_hours"], {"value": 3})
+        self.assertEqual(evaluation.results["address__street"]["required"], True)
+
+        # intermediate object is None - nothing is changed
+        company = Company(name="ACME", hours=10, is_active=False, address=None, items=[])
+        evaluation = rules.create_reactive_evaluation(company)
+        with self.assertRaisesRegex(RuleValidationValueError, "company.address is None"):
+            evaluation.apply_changes({"address__street": "Main"})
+        self.assertIsNone(company.address)
+        self.assertIsNone(evaluation.ctx.Fields.address__street)
+
+        # provider with cache_key is computed from the key value too
+        rules = Rules(
+            name="company_rules", label="Company rules",
+            bound_model=BoundModel(name="company", model=Company),
+            dataproviders=[
+                DataVar(name="max_hours", label="Max hours", value=(DP.name_hours + 3)),
+                DataVar(name="name_hours", label="Hours by name", value=lambda name: len(name),
+                        cache_key=F.name, pure=True),
+            ],
+            contains=[
+                Field(bind=M.company.name, label="Name"),
+                Field(bind=M.company.hours, label="Hours",
+                      validations=[
+                          Validation(name="hour_value", label="Hour value",
+                                     ensure=(This.value <= DP.max_hours), error="Hours")]),
+            ])
+        rules.setup()
+        graph = rules.get_dependency_graph()
+        self.assertLess(graph.order.index("name_hours"), graph.order.index("max_hours"))
+        self.assertEqual(graph.get_affected(["name"]), ["name_hours", "max_hours", "hour_value"])
+
+        # bound to model itself - model instance is replaced
+        rules = Rules(
+            name="company_rules", label="Company rules",
+            bound_model=BoundModel(name="company", model=Company),
+            contains=[
+                Field(name="whole", bind=M.company, label="Company"),
+                Field(bind=M.company.name, label="Name", available=(M.company.hours > 5)),
+            ])
+        rules.setup()
+        evaluation = rules.create_reactive_evaluation(get_test_instances()[0])
+        replacement = Company(name="ACME", hours=1, is_active=False, address=None, items=[])
+        changed = evaluation.apply_changes({"whole": replacement})
+        self.assertIs(evaluation.ctx.Models.company, replacement)
+        self.assertIs(evaluation.ctx.instance, replacement)
+        self.assertFalse(hasattr(replacement, "company"))
+        self.assertEqual(changed["name"]["available"], False)
+
+    def test_variable_values_cache(self):
+        from reedwolf.rules.evaluation import EvaluationContext
+
+        rules = Rules(
+            name="company_rules", label="Company rules",
+            bound_model=BoundModel(name="company", model=Company),
+            contains=[
+                Field(bind=M.company.name, label="Name",
+                      available=(M.company.address.city != None)), # noqa: E711
+                Field(bind=M.company.hours, label="Hours",
+                      available=(M.company.address.city == "Zagreb")),
+                Section(name="address", label="Address", contains=[
+                    Field(bind=M.company.address.city, label="City"),
+                ]),
+            ])
+        rules.setup()
+        # NOTE: can be the same object (interned)
+        first = rules.get_component("name").available._node.first
+        second = rules.get_component("hours").available._node.first
+
+        ctx = EvaluationContext(rules, get_test_instances()[0])
+        self.assertIn("Models.company.address.city", ctx.var_values)
+
+        calls = []
+        def read_function(ctx):
+            calls.append(ctx)
+            return ctx.Models.company.address.city
+        first._read_function = second._read_function = read_function
+
+        self.assertEqual(first.Read(ctx), "Zagreb")
+        self.assertEqual(second.Read(ctx), "Zagreb")
+        self.assertEqual(calls, [])
+
+        # bound value changed - invalidated with attributes
+        ctx.invalidate_variable("Models.company.address")
+        self.assertEqual(second.Read(ctx), "Zagreb")
+        self.assertEqual(first.Read(ctx), "Zagreb")
+        self.assertEqual(len(calls), 1)
+
+        evaluation = rules.create_reactive_evaluation(get_test_instances()[0])
+        changed = evaluation.apply_changes({"address__city": "Split"})
+        self.assertEqual(changed["hours"]["available"], False)
+        self.assertEqual(evaluation.ctx.var_values["Models.company.address.city"], "Split")
+
+    def test_circular_dependency(self):
+        rules = Rules(
+            name="company_rules", label="Company rules",
+            bound_model=BoundModel(name="company", model=Company),
+            dataproviders=[
+                DataVar(name="first", label="First", value=(DP.second + 1)),
+                DataVar(name="second", label="Second", value=(DP.first + 1)),
+            ],
+            contains=[
+                Field(bind=M.company.name, label="Name"),
+            ])
+        with self.assertRaisesRegex(RuleSetupError, "Circular dependency found: first -> second -> first"):
+            rules.setup()
+
+    def test_data_var_lazy_and_cached(self):
+        calls = []
+        now = [0.0]
+
+        def get_unused():
+            calls.append("unused")
+            return 1
+
+        def get_eager():
+            calls.append("eager")
+            return 2
+
+        def get_hours_limit(name):
+            calls.append(name)
+            return len(name) * 5
+
+        limit_cache = DataVarCache(ttl=10, max_size=2, timer=lambda: now[0])
+        rules = Rules(
+            name="company_rules", label="Company rules",
+            bound_model=BoundModel(name="company", model=Company),
+            dataproviders=[
+                DataVar(name="unused", label="Unused", value=get_unused),
+                DataVar(name="eager", label="Eager", value=get_eager, evaluate=True),
+                DataVar(name="hours_limit", label="Hours limit", value=get_hours_limit,
+                        cache_key=M.company.name, pure=True, cache=limit_cache),
+            ],
+            contains=[
+                Field(bind=M.company.name, label="Name"),
+                Field(bind=M.company.hours, label="Hours",
+                      validations=[
+                          Validation(name="hour_limit", label="Hour limit",
+                                     ensure=(This.value<=DP.hours_limit),
+                                     error="Hours over limit")]),
+            ])
+        rules.setup()
+
+        def validate(name, hours):
+            instance = Company(name=name, hours=hours, is_active=False, address=None, items=[])
+            return [err.owner.name for err in rules.validate(instance)]
+
+        self.assertEqual(validate("ACME", 10), [])
+        self.assertEqual(validate("ACME", 30), ["hour_limit"])
+        # unused is never called, eager is called for each record
+        self.assertEqual(calls, ["eager", "ACME", "eager"])
+        self.assertEqual((limit_cache.hits, limit_cache.misses), (1, 1))
+        self.assertEqual(rules.components["eager"].cache.misses, 2)
+
+        # LRU - ACME is removed as the oldest one
+        validate("Other", 1)
+        validate("Third", 1)
+        validate("ACME", 1)
+        self.assertEqual(limit_cache.misses, 4)
+
+        # TTL expired
+        now[0] = 11
+        validate("ACME", 1)
+        self.assertEqual((limit_cache.hits, limit_cache.misses), (1, 5))
+
+        with self.assertRaisesRegex(RuleSetupError, "pure=True"):
+            DataVar(name="limit", label="Limit", value=get_unused, cache=DataVarCache(ttl=10))
+
+    def test_validate_async(self):
+        running = [0, 0]    # current, max
+
+        async def get_limit(code: str) -> int:
+            running[0] += 1
+            running[1] = max(running)
+            await asyncio.sleep(0.01)
+            running[0] -= 1
+            return 2 if code=="A" else 5
+
+        async def get_max_hours_async() -> int:
+            await asyncio.sleep(0.01)
+            return 23
+
+        rules = Rules(
+            name="company_rules", label="Company rules",
+            bound_model=BoundModel(name="company", model=Company),
+            dataproviders=[
+                DataVar(name="max_hours", label="Max hours", value=get_max_hours_async),
+            ],
+            contains=[
+                Field(bind=M.company.hours, label="Hours",
+                      validations=[Validation(name="hour_value", label="Hour value",
+                                              ensure=(This.value<=DP.max_hours), error="Too many hours")]),
+                Extension(name="items_ext", label="Items",
+                          bound_model=BoundModel(name="items", model=M.company.items),
+                          cardinality=Cardinality.Range(name="items_card", min=1),
+                          dataproviders=[
+                              DataVar(name="code_key", label="Code key", value=M.items.code),
+                              DataVar(name="qty_limit", label="Quantity limit", value=get_limit,
+                                      cache_key=DP.code_key, pure=True),
+                          ],
+                          contains=[
+                              Field(bind=M.items.code, label="Code"),
+                              Field(bind=M.items.qty, label="Quantity",
+                                    validations=[Validation(name="qty_limit_ok", label="Quantity limit",
+                                                            ensure=(This.value<=DP.qty_limit), error="Over limit")]),
+                          ]),
+            ])
+        rules.setup()
+
+        instance = Company(name="ACME", hours=30, is_active=True, address=None,
+                           items=[OrderItem(code=code, qty=3) for code in "ABCDA"])
+        errors = asyncio.run(rules.validate_async(instance, max_concurrency=2))
+        self.assertEqual([err.owner.name for err in errors], ["hour_value", "qty_limit_ok", "qty_limit_ok"])
+        # distinct keys A, B, C, D - concurrent calls, limited
+        self.assertEqual(running[1], 2)
+        qty_limit = rules.components["items_ext"].components["qty_limit"]
+        self.assertEqual(qty_limit.cache.misses, 4)
+        # not pure - evaluated once per item, context is not built again
+        code_key = rules.components["items_ext"].components["code_key"]
+        self.assertEqual(code_key.cache.misses, 5)
+
+        with self.assertRaisesRegex(RuleError, "use validate_async"):
+            rules.validate(instance)
+
+    def test_setup_cache_fingerprint(self):
+        fingerprint = get_rules_fingerprint(create_rules())
+        self.assertEqual(get_rules_fingerprint(create_rules()), fingerprint)
+
+        changed = create_rules()
+        changed.contains[0].label = "Company name"
+        self.assertNotEqual(get_rules_fingerprint(changed), fingerprint)
+
+        # literals without stable str() - only expression structure counts
+        def create_rules_with_literal():
+            rules = create_rules()
+            rules.contains[0].available = (F.name != object())
+            return rules
+        self.assertEqual(get_rules_fingerprint(create_rules_with_literal()),
+                         get_rules_fingerprint(create_rules_with_literal()))
+        changed = create_rules()
+        changed.contains[0].available = (F.name != "")
+        self.assertNotEqual(get_rules_fingerprint(changed), fingerprint)
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # broken cache file - fresh setup
+            rules = create_rules()
+            file_path = get_cache_file_path(rules, cache_dir, fingerprint)
+            with open(file_path, "wb") as file_out:
+                file_out.write(b"not a pickle")
+            rules_cached = rules.setup_cached(cache_dir)
+            self.assertIs(rules_cached, rules)
+            self.assertTrue(rules_cached.is_finished())
+            ok, missing, wrong = get_test_instances()
+            self.assertEqual(rules_cached.validate(ok), [])
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            rules = create_rules().setup_cached(cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            # cache hit - loaded, finished object
+            rules_cached = create_rules().setup_cached(cache_dir)
+            self.assertIsNot(rules_cached, rules)
+            self.assertTrue(rules_cached.is_finished())
+            for instance in get_test_instances():
+                self.assertEqual([err.msg for err in rules_cached.validate(instance)],
+                                 [err.msg for err in rules.validate(instance)])
+
+        with self.assertRaisesRegex(RuleError, "before setup"):
+            get_rules_fingerprint(self.rules)
+
+    def test_pickle(self):
+        self.assertIs(pickle.loads(pickle.dumps(M)), M)
+        self.assertIs(copy.deepcopy(F), F)
+
+        # not set up expressions
+        vexp = pickle.loads(pickle.dumps((M.company.hours + 1) * 2))
+        self.assertEqual(str(vexp), "G.(G.(Models.company.hours + 1) * 2)")
+
+        rules = load_rules(dump_rules(self.rules))
+        self.assertTrue(rules.is_finished())
+        self.assertIs(rules.components["name"].bind.GetNamespace(), M)
+        for instance in get_test_instances():
+            self.assertEqual([err.msg for err in rules.validate(instance)],
+                             [err.msg for err in self.rules.validate(instance)])
+        rules_copy = copy.deepcopy(self.rules)
+        ok, missing, wrong = get_test_instances()
+        self.assertEqual(len(rules_copy.validate(wrong)), len(self.rules.validate(wrong)))
+
+    def test_pickle_derived_values(self):
+        rules = Rules(
+            name="person_rules", label="Person rules",
+            bound_model=BoundModel(name="person", model=Person),
+            contains=[
+                Field(bind=M.person.name, label="Name", available=(F.country == "HR") & (F.size == "S"),
+                      required=(F.country == "HR") & (F.size == "S")),
+                ChoiceField(bind=M.person.size, label="Size", choices=[str(nr) for nr in range(10000)] + ["S"]),
+                Field(bind=M.person.country, label="Country"),
+            ])
+        rules.setup()
+        name = rules.components["name"]
+        self.assertEqual(name.available._node._shared_slot, 0)
+        size = len(dump_rules(rules))
+        # choice index, dependency graph and shared slots are not stored
+        self.assertIn("S", rules.components["size"].get_choice_index())
+        rules.get_dependency_graph()
+        self.assertEqual(len(dump_rules(rules)), size)
+
+        loaded = load_rules(dump_rules(rules))
+        loaded_name = loaded.components["name"]
+        self.assertIsNone(loaded.components["size"]._choice_index)
+        self.assertIsNone(loaded_name.available._node._shared_slot)
+        self.assertEqual([err.owner.name for err in loaded.validate(Person(name="", country="HR", size="S"))],
+                         ["name"])
+        self.assertEqual([err.owner.name for err in loaded.validate(Person(name="", size="X"))], ["size"])
+        # made again on first use
+        self.assertEqual(loaded_name.available._node._shared_slot, 0)
+        self.assertEqual(loaded.get_dependency_graph().order, rules.get_dependency_graph().order)
+
+    def test_iter_validate(self):
+        instances = get_test_instances()
+        expected = [self.get_errors(instance) for instance in instances]
+        consumed = []
+
+        def read_records():
+            for instance in instances:
+                consumed.append(instance.name)
+                # children are iterated once, not materialized
+                yield Company(name=instance.name, hours=instance.hours, is_active=instance.is_active,
+                              address=instance.address, items=(item for item in instance.items))
+
+        results = self.rules.iter_validate(read_records())
+        self.assertEqual(consumed, [])
+        first = next(results)
+        self.assertEqual((first.index, first.errors), (0, []))
+        self.assertEqual(consumed, ["ACME"])
+        self.assertEqual([[(err.owner.name, err.msg) for err in result.errors] for result in results],
+                         expected[1:])
+        # cardinality error is reported before item errors
+        self.assertEqual([name for name, _ in expected[2]][-3:], ["items_card", "code", "qty_positive"])
+
+    def test_validation_failures(self):
+        instances = get_test_instances()
+        wrong = instances[2]
+        failures = self.rules.validate_failures(wrong)
+        self.assertEqual([(failure.to_error().__class__, failure.owner.name, failure.msg) for failure in failures],
+                         [(err.__class__, err.owner.name, err.msg) for err in self.rules.validate(wrong)])
+        self.assertFalse(hasattr(failures[0], "__dict__"))
+        self.assertEqual(failures[0].full_msg, self.rules.validate(wrong)[0].full_msg)
+
+        results = list(self.rules.iter_validate(instances, failures=True))
+        self.assertEqual([sorted({failure.index for failure in result.errors}) for result in results],
+                         [[], [1], [2]])
+
+        # cardinality error is formatted from error code and items count
+        cardinality = self.rules.components["items_ext"].cardinality
+        self.assertEqual(cardinality.get_error_code(0), "min")
+        self.assertIsNone(cardinality.get_error_code(1))
+        with self.assertRaises(RuleError):
+            cardinality.validate(0)
+
+    def test_validate_batch(self):
+        instances = get_test_instances() * 3
+        expected = [[(err.__class__, err.owner.name, err.msg) for err in self.rules.validate(instance)]
+                    for instance in instances]
+
+        results = list(self.rules.validate_batch(iter(instances), workers=2, chunk_size=2))
+        self.assertEqual([result.index for result in results], list(range(len(instances))))
+        self.assertEqual([[(err.__class__, err.owner.name, err.msg) for err in result.errors] for result in results],
+                         expected)
+        # owners are components of parent process rules
+        self.assertIs(results[1].errors[0].owner, self.rules.components["name"])
+
+        results = list(self.rules.validate_batch(instances, workers=2, chunk_size=2, failures=True))
+        self.assertEqual([[(failure.index, failure.owner.name, failure.msg) for failure in result.errors]
+                          for result in results],
+                         [[(index, name, msg) for name, msg in [error[1:] for error in errors]]
+                          for index, errors in enumerate(expected)])
+
+        results = list(self.rules.validate_batch(instances, workers=2, chunk_size=2, ordered=False))
+        self.assertEqual(sorted([result.index for result in results]), list(range(len(instances))))
+
+        results = list(self.rules.validate_batch(instances, workers=2, chunk_size=2, fail_fast=True))
+        self.assertEqual([(result.index, bool(result.errors)) for result in results], [(0, False), (1, True)])
+
+    @unittest.skipIf(sys.version_info<(3, 9), "cancel_futures requires python 3.9")
+    def test_validate_batch_fail_fast_cancel(self):
+        from reedwolf.rules import batch
+
+        rules = create_rules()
+        rules.dataproviders[0].value = get_max_hours_slow
+        rules.setup()
+        ok, missing, _ = get_test_instances()
+        instances = [missing] + [ok] * 30
+
+        chunks_per_worker = batch.CHUNKS_PER_WORKER
+        try:
+            batch.CHUNKS_PER_WORKER = 30
+            started = time.monotonic()
+            results = list(rules.validate_batch(instances, workers=1, chunk_size=1, fail_fast=True))
+            elapsed = time.monotonic() - started
+        finally:
+            batch.CHUNKS_PER_WORKER = chunks_per_worker
+        self.assertEqual([result.index for result in results], [0])
+        # pending chunks are cancelled - not validated on executor shutdown (3s)
+        self.assertLess(elapsed, 1.5)
+
+    def test_validate_batch_owners(self):
+        # the same name in root and in extension
+        rules = create_rules()
+        rules.validations.append(Validation(name="qty_positive", label="Hours", ensure=(F.hours >= 0), error="Hours"))
+        unique = Unique.Global(name="items_global", fields=["code"])
+        rules.contains[-1].children_validations.append(unique)
+        rules.setup()
+        unique.add_saved([OrderItem(code="A", qty=1)])
+
+        instances = get_test_instances()
+        instances[0].items[0].qty = 0
+        instances.extend([Company(name="ACME", hours=10, is_active=False, address=None,
+                                  items=[OrderItem(code=code, qty=1)]) for code in ("Z", "Z", "B")])
+        results = rules.validate_batch(instances, workers=2, chunk_size=2, failures=True)
+        result = next(results)
+        # owner found by path, item is the instance of parent process
+        owners = [failure.owner for failure in result.errors]
+        self.assertEqual(len(owners), 2)
+        self.assertIs(owners[0], unique)
+        self.assertIs(owners[1], rules.components["items_ext"].components["qty_positive"])
+        self.assertIs(next(results).errors[0].item, instances[1])
+
+        # workers use index copied when batch is started, duplicates across
+        # instances are not reported (as in validate())
+        unique.add_saved([OrderItem(code="B", qty=1)])
+        errors = {result.index: [failure.owner.name for failure in result.errors] for result in results}
+        self.assertEqual([errors[index] for index in (3, 4, 5)], [[], [], []])
+        self.assertEqual([failure.owner.name for failure in rules.validate_failures(instances[5])], ["items_global"])
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class TestVectorized(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = create_rules()
+        self.rules.setup()
+        self.instances = get_test_instances()
+
+    def get_columns(self, with_city: bool):
+        columns = {
+            "company.name": [inst.name for inst in self.instances],
+            "company.hours": np.array([inst.hours for inst in self.instances]),
+            "company.is_active": np.array([inst.is_active for inst in self.instances]),
+        }
+        if with_city:
+            columns["company.address.city"] = np.array(
+                [inst.address.city if inst.address else None for inst in self.instances], dtype=object)
+        else:
+            columns["company.address"] = np.array([inst.address for inst in self.instances], dtype=object)
+        return columns
+
+    def get_expected(self, validation_name: str):
+        return [validation_name not in [err.owner.name for err in self.rules.validate(instance)]
+                for instance in self.instances]
+
+    def test_validate_columns(self):
+        masks = self.rules.validate_columns(self.get_columns(with_city=True))
+        self.assertEqual(sorted(masks), ["active_has_address", "hour_value"])
+        for name, mask in masks.items():
+            self.assertEqual(mask.dtype, bool)
+            self.assertEqual(mask.tolist(), self.get_expected(name))
+
+    def test_validation_matrix(self):
+        from reedwolf.rules.vectorized import ValidationMatrix, get_checks, get_failure_code
+        instances = self.instances * 2
+        matrix = self.rules.validate_matrix(instances)
+        checks = get_checks(self.rules)
+        self.assertEqual(matrix.names, list(checks))
+        self.assertEqual(matrix.failed.shape, (6, len(matrix.names)))
+        self.assertIn("items_card", matrix.names)
+        self.assertIn("name:required", matrix.names)
+
+        names_by_check = {(id(check.owner), check.code): name for name, check in checks.items()}
+        errors = [{names_by_check[(id(err.owner), get_failure_code(err))] for err in self.rules.validate(instance)}
+                  for instance in instances]
+        for name in matrix.names:
+            self.assertEqual(matrix[name].tolist(), [name in names for names in errors])
+            self.assertEqual(matrix.get_failed_rows(name).tolist(),
+                             [index for index, names in enumerate(errors) if name in names])
+
+        counts = matrix.get_failure_counts()
+        self.assertEqual(counts["hour_value"], 4)
+        self.assertEqual(matrix.get_top_failing(1), [("hour_value", 4)])
+        self.assertEqual(matrix.get_failed_records_mask().tolist(), [False, True, True] * 2)
+
+        co_failures = matrix.get_co_failure_counts()
+        self.assertEqual(co_failures.diagonal().tolist(), [counts[name] for name in matrix.names])
+        first, second = matrix.names.index("name:required"), matrix.names.index("hour_value")
+        self.assertEqual(co_failures[first, second],
+                         sum([{"name:required", "hour_value"} <= names for names in errors]))
+
+        # unordered batch results, from column masks
+        results = sorted(self.rules.iter_validate(instances), key=lambda result: -result.index)
+        self.assertEqual(ValidationMatrix.from_results(checks, results).failed.tolist(),
+                         matrix.failed.tolist())
+        masks = self.rules.validate_columns(self.get_columns(with_city=True))
+        self.assertEqual(ValidationMatrix.from_masks(masks)["hour_value"].tolist(),
+                         matrix["hour_value"][:3].tolist())
+
+    def test_validation_matrix_checks(self):
+        calls = []
+
+        def get_max_hours_counted() -> int:
+            calls.append(1)
+            return 23
+
+        rules = create_rules()
+        rules.dataproviders[0].value = get_max_hours_counted
+        # the same name in root and in extension
+        rules.validations.append(Validation(name="qty_positive", label="Hours", ensure=(F.hours >= 0), error="Hours"))
+        rules.contains.append(ChoiceField(name="company_name", bind=M.company.name, label="Company", required=True,
+                                          choices=["ACME", "Other"]))
+        rules.setup()
+        instances = self.instances * 2
+        matrix = rules.validate_matrix(iter(instances))
+
+        # required and choice failures of the same field are different checks
+        self.assertEqual(matrix["company_name:required"].tolist(), [False, True, False] * 2)
+        self.assertEqual(matrix["company_name:choice"].tolist(), [False] * 6)
+        instances[0].name = "Other company"
+        self.assertEqual(rules.validate_matrix(instances)["company_name:choice"].tolist(), [True, False, False] * 2)
+        self.assertEqual(matrix["qty_positive"].tolist(), [False, False, True] * 2)
+        self.assertEqual(matrix["items_ext.qty_positive"].tolist(), [False, False, True] * 2)
+
+        # hour_value is evaluated over columns - provider is called once,
+        # not for each record
+        calls.clear()
+        matrix = rules.validate_matrix(instances)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(matrix["hour_value"].tolist(), [False, True, True] * 2)
+
+    def test_floating_point_errors(self):
+        from reedwolf.rules.vectorized import ColumnsEvaluator
+        rules = Rules(
+            name="company_rules", label="Company rules",
+            bound_model=BoundModel(name="company", model=Company),
+            contains=[
+                BooleanField(bind=M.company.is_active, label="Is active"),
+                Field(bind=M.company.hours, label="Hours", available=F.is_active,
+                      validations=[Validation(name="ratio", label="Ratio",
+                                              ensure=(F.is_active / This.value < 1), error="Ratio")]),
+            ])
+        rules.setup()
+        # division by zero only in not applicable row - the same as row evaluation
+        evaluator = ColumnsEvaluator(rules, {"company.is_active": np.array([True, False]),
+                                             "company.hours": np.array([2, 0])})
+        self.assertEqual(evaluator.evaluate()["ratio"].tolist(), [True, True])
+        self.assertEqual(evaluator.row_wise_names, ["ratio"])
+        # in applicable row - row evaluation error, no inf in mask
+        with self.assertRaisesRegex(RuleValidationValueError, "division by zero"):
+            rules.validate(Company(name="ACME", hours=0, is_active=True, address=None, items=[]))
+        with self.assertRaisesRegex(RuleValidationValueError, "division by zero"):
+            rules.validate_columns({"company.is_active": np.array([True, True]),
+                                    "company.hours": np.array([2, 0])})
+        # underflow is not an error - stays vectorized
+        evaluator = ColumnsEvaluator(rules, {"company.is_active": np.array([True, True]),
+                                             "company.hours": np.array([1e308, 0.5])})
+        self.assertEqual(evaluator.evaluate()["ratio"].tolist(), [True, False])
+        self.assertEqual(evaluator.row_wise_names, [])
+
+    def test_row_wise_fallback(self):
+        from reedwolf.rules.vectorized import ColumnsEvaluator
+        # no column for M.company.address.city - read from address objects
+        evaluator = ColumnsEvaluator(self.rules, self.get_columns(with_city=False))
+        masks = evaluator.evaluate()
+        self.assertEqual(evaluator.row_wise_names, ["active_has_address"])
+        for name, mask in masks.items():
+            self.assertEqual(mask.tolist(), self.get_expected(name))
+
+    def test_row_wise_fallback_data_var(self):
+        from reedwolf.rules.vectorized import ColumnsEvaluator
+        rules = Rules(
+            name="company_rules", label="Company rules",
+            bound_model=BoundModel(name="company", model=Company),
+            dataproviders=[
+                DataVar(name="limit", label="Limit", value=M.company.is_active * 20),
+            ],
+            contains=[
+                BooleanField(bind=M.company.is_active, label="Is active"),
+                Field(bind=M.company.hours, label="Hours",
+                      validations=[Validation(name="hours_limit", label="Hours limit",
+                                              ensure=((This.value <= DP.limit) | (M.company.address.city == "Zagreb")),
+                                              error="Over limit")]),
+            ])
+        rules.setup()
+        self.rules = rules
+        evaluator = ColumnsEvaluator(rules, self.get_columns(with_city=False))
+        masks = evaluator.evaluate()
+        self.assertEqual(evaluator.row_wise_names, ["hours_limit"])
+        self.assertEqual(masks["hours_limit"].tolist(), self.get_expected("hours_limit"))
+        self.assertEqual(masks["hours_limit"].tolist(), [True, False, True])
+
+
+if __name__ == '__main__':
+    unittest.main()